@@ -0,0 +1,88 @@
+"""
+Input file for a scalar linear elliptic problem solved with several FFT
+backends (see homogenize.fft_backends); the backend 'pyfftw' requires pyFFTW.
+
+The scheme Ga combines transforms of several sizes and directions (including
+the real transforms) with the reused output buffers of GaMatrix and GAOper,
+so the results of all backends have to agree. Run as a script from the base
+directory, e.g. 'python examples/scalar/fft_backends.py', it checks that
+the homogenized matrices and the numbers of iterations agree with the
+backend 'numpy'.
+"""
+
+import numpy as np
+
+dim = 2
+N = 5*np.ones(dim, dtype=np.int32)
+
+materials = {'square': {'inclusions': ['square', 'otherwise'],
+                        'positions': [np.zeros(dim), ''],
+                        'params': [0.6*np.ones(dim), ''], # size of sides
+                        'vals': [11*np.eye(dim), 1.*np.eye(dim)],
+                        'Y': np.ones(dim),
+                        },
+             }
+
+backends = ['numpy', 'scipy', 'pyfftw']
+
+problems = []
+for backend in backends:
+    problems += [
+        {'name': 'GaNi_%s' % backend,
+         'physics': 'scalar',
+         'material': 'square',
+         'solve': {'kind': 'GaNi',
+                   'N': N,
+                   'primaldual': ['primal', 'dual']},
+         'postprocess': [{'kind': 'GaNi'},
+                         {'kind': 'Ga',
+                          'order': 1,
+                          'P': 27*N}],
+         'solver': {'kind': 'CG',
+                    'fft': backend,
+                    'tol': 1e-6,
+                    'maxiter': 1e3}
+         },
+        {'name': 'Ga_%s' % backend,
+         'physics': 'scalar',
+         'material': 'square',
+         'solve': {'kind': 'Ga',
+                   'N': N,
+                   'primaldual': ['primal', 'dual']},
+         'postprocess': [{'kind': 'Ga'}],
+         'solver': {'kind': 'CG',
+                    'fft': backend,
+                    'tol': 1e-6,
+                    'maxiter': 1e3}
+         },
+                 ]
+
+if __name__ == '__main__':
+    import os
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from homogenize.problem import Problem
+
+    conf = sys.modules[__name__]
+    outputs = {}
+    for conf_problem in problems:
+        prob = Problem(conf_problem, conf)
+        prob.calculate()
+        outputs[prob.name] = prob.output
+
+    for name in outputs:
+        kind, backend = name.split('_')
+        ref = outputs['%s_numpy' % kind]
+        for primaldual in ['primal', 'dual']:
+            for key, AH in outputs[name]['mat_' + primaldual].items():
+                AHref = ref['mat_' + primaldual][key]
+                if not np.allclose(AH, AHref, rtol=1e-10, atol=1e-12):
+                    raise AssertionError("The backend (%s) differs from "
+                                         "numpy in %s!" % (backend, key))
+            iters = [res['cb'].iter for res in outputs[name]['res_' + primaldual]]
+            iters_ref = [res['cb'].iter for res in ref['res_' + primaldual]]
+            if iters != iters_ref:
+                raise AssertionError("The backend (%s) differs from numpy "
+                                     "in iterations of problem %s!"
+                                     % (backend, name))
+    print '\nThe FFT backends agree.'
@@ -0,0 +1,100 @@
+"""
+Input file for a scalar linear elliptic problem with groups of inclusions,
+i.e. inclusions given by positions of shape (n, d) and params of shape (n,)
+for balls or (n, d) for cubes (see Material.get_topologies).
+
+Run as a script from the base directory, e.g.
+'python examples/scalar/inclusion_groups.py', it checks that the topologies
+of the groups agree with the sums of topologies of individual inclusions
+evaluated over the periodic images of the cell.
+"""
+
+import numpy as np
+
+dim = 2
+N = 15*np.ones(dim, dtype=np.int32)
+
+materials = {'balls': {'inclusions': ['ball', 'otherwise'],
+                       'positions': [np.array([[0.2, 0.2], [0.7, 0.25],
+                                               [0.35, 0.75], [0.95, 0.7]]),
+                                     ''],
+                       'params': [np.array([0.3, 0.2, 0.25, 0.35]), ''],
+                       'vals': [11*np.eye(dim), 1.*np.eye(dim)],
+                       'Y': np.ones(dim),
+                       },
+             'cubes': {'inclusions': ['square', 'otherwise'],
+                       'positions': [np.array([[0.2, 0.2], [0.65, 0.3],
+                                               [0.3, 0.75], [0.9, 0.85]]),
+                                     ''],
+                       'params': [np.array([[0.3, 0.2], [0.2, 0.4],
+                                            [0.4, 0.3], [0.3, 0.25]]), ''],
+                       'vals': [11*np.eye(dim), 1.*np.eye(dim)],
+                       'Y': np.ones(dim),
+                       },
+             }
+
+problems = []
+for material in ['balls', 'cubes']:
+    problems += [
+        {'name': 'GaNi_%s' % material,
+         'physics': 'scalar',
+         'material': material,
+         'solve': {'kind': 'GaNi',
+                   'N': N,
+                   'primaldual': ['primal', 'dual']},
+         'postprocess': [{'kind': 'GaNi'}],
+         'solver': {'kind': 'CG',
+                    'tol': 1e-6,
+                    'maxiter': 1e3}
+         },
+                 ]
+
+
+def get_topology(coord, Y, kind, position, size):
+    """
+    It evaluates the topology of a single inclusion as a sum of its
+    characteristic functions over the periodic images of the cell.
+    """
+    d = coord.shape[0]
+    topo = np.zeros(coord.shape[1:])
+    for Ycoef in np.ndindex(*(3*np.ones(d, dtype=np.int32))):
+        Ym = Y*(np.array(Ycoef) - 1)
+        if kind == 'square':
+            topo_loc = np.ones(coord.shape[1:])
+            for dd in np.arange(d):
+                xloc = coord[dd] - position[dd] + Ym[dd]
+                topo_loc *= (xloc > -size[dd]/2.)*(xloc <= size[dd]/2.)
+        elif kind == 'ball':
+            norm2 = 0.
+            for dd in np.arange(d):
+                norm2 += (coord[dd] - position[dd] - Ym[dd])**2
+            topo_loc = (norm2**0.5 < size/2.)
+        topo += topo_loc
+    return topo
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import copy
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+    from homogenize.materials import Material
+    from homogenize.matvec_fun import Grid
+
+    for name, material in materials.items():
+        conf = copy.deepcopy(material)
+        kind = conf['inclusions'][0]
+        for NN in [N, np.array([16, 9]), np.array([32, 32])]:
+            coord = Grid.get_coordinates(NN, conf['Y'])
+            topos = Material(copy.deepcopy(conf)).get_topologies(coord)
+            topo_ref = np.zeros(coord.shape[1:])
+            for position, size in zip(conf['positions'][0],
+                                      conf['params'][0]):
+                topo_ref += get_topology(coord, conf['Y'], kind, position,
+                                         size)
+            if not np.array_equal(topos[0], topo_ref):
+                raise AssertionError("The topology of the group (%s) differs "
+                                     "for N = %s!" % (name, str(NN)))
+            if not np.array_equal(topos[1], 1. - topo_ref):
+                raise AssertionError("The topology of 'otherwise' differs "
+                                     "for the group (%s)!" % name)
+    print 'The topologies of groups of inclusions agree.'
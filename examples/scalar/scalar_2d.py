@@ -40,6 +40,12 @@ materials = {'square': {'inclusions': ['square', 'otherwise'],
                        'vals': [11*np.eye(dim), 1.*np.eye(dim)],
                        'Y': 2.*np.ones(dim),
                        },
+             'balls': {'inclusions': ['ball', 'otherwise'], # group of balls
+                       'positions': [np.array([[0., 0.], [0.5, 0.5]]), ''],
+                       'params': [np.array([0.5, 0.3]), ''], # diameters
+                       'vals': [11*np.eye(dim), 1.*np.eye(dim)],
+                       'Y': 1.*np.ones(dim),
+                       },
              'laminate': {'inclusions': ['square', 'otherwise'],
                           'positions': [np.zeros(dim), ''],
                           'params': [np.array([1., 0.5]), ''],
@@ -0,0 +1,284 @@
+import os
+import copy
+import shutil
+import pickle
+import hashlib
+import inspect
+import tempfile
+import importlib
+import numpy as np
+
+# hashes of the source code of modules, see get_code_hash
+code_hashes = {}
+
+
+class Cache():
+    """
+    Persistent content-addressed cache of quantities, e.g. of projection
+    kernels or material coefficients, stored on disk.
+
+    The entries are addressed by a hash of the parameters, from which they
+    are evaluated (key, see get_hash). Every entry is stored in a directory
+    containing the numpy arrays of the quantity in '.npy' files, which are
+    memory-mapped (copy-on-write) when the entry is loaded, and the rest of
+    the quantity pickled. The quantities are numpy arrays, objects (e.g.
+    Matrix) with arrays in their attributes, or tuples and lists of them.
+
+    The hash includes the source code of the modules evaluating
+    the quantity (see get_code_hash), so the entries of a previous version
+    of code are not used; they are removed as the least recently used ones.
+
+    The size of cache is bounded by max_size; the least recently used
+    entries are removed when it is exceeded. The entries are written
+    to temporary directories, which are renamed at the end, so the cache
+    can be shared by several processes.
+
+    Parameters
+    ----------
+    directory : str
+        directory of cache, 'ffthompy' in the user cache directory
+        ($XDG_CACHE_HOME or ~/.cache) by default
+    max_size : int
+        maximal size of cache in bytes
+    """
+    def __init__(self, directory=None, max_size=2**30):
+        if directory is None:
+            directory = get_cache_dir()
+        self.directory = directory
+        self.max_size = max_size
+
+    def get(self, key, fun, modules=()):
+        """
+        It returns the quantity stored under the key, or it evaluates
+        the quantity as fun() and stores it, if it is not in the cache.
+
+        Parameters
+        ----------
+        key : dict
+            parameters determining the quantity
+        fun : function
+            function without arguments evaluating the quantity
+        modules : list of str
+            names of modules with the code evaluating the quantity, e.g.
+            ['homogenize.projections']
+
+        Returns
+        -------
+        value : quantity returned by fun
+        """
+        code = get_code_hash([__name__] + list(modules))
+        try:
+            name = get_hash({'key': key, 'code': code})
+        except TypeError: # the quantity cannot be addressed
+            return fun()
+
+        path = os.path.join(self.directory, name)
+        if os.path.isdir(path):
+            try:
+                value = self.load(path)
+                os.utime(path, None)
+                return value
+            except Exception: # damaged or just removed entry
+                pass
+
+        value = fun()
+        try:
+            self.store(path, value)
+        except (IOError, OSError):
+            pass
+        return value
+
+    def load(self, path):
+        """
+        It loads the quantity from the directory of an entry (path).
+        """
+        with open(os.path.join(path, 'value.pkl'), 'rb') as fil:
+            value = pickle.load(fil)
+        return restore(value, path)
+
+    def store(self, path, value):
+        """
+        It stores the quantity to the directory of an entry (path) and
+        removes the least recently used entries exceeding the size of cache.
+        """
+        arrays = []
+        value = strip(value, arrays)
+        size = sum([array.nbytes for array in arrays])
+        if size > self.max_size:
+            return
+
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError: # created by another process
+                pass
+        tmp = tempfile.mkdtemp(prefix='tmp-', dir=self.directory)
+        try:
+            for ii, array in enumerate(arrays):
+                np.save(os.path.join(tmp, 'array%d.npy' % ii), array)
+            with open(os.path.join(tmp, 'value.pkl'), 'wb') as fil:
+                pickle.dump(value, fil, 2)
+            os.rename(tmp, path)
+        finally:
+            if os.path.isdir(tmp): # stored by another process
+                shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """
+        It removes the least recently used entries, until the size of cache
+        is at most max_size.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('tmp-') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum([os.path.getsize(os.path.join(path, fil))
+                            for fil in os.listdir(path)])
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError: # removed by another process
+                continue
+
+        total = sum([entry[1] for entry in entries])
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        It removes all the entries of cache.
+        """
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __repr__(self):
+        ss = "Class : %s\n" % (self.__class__.__name__,)
+        ss += '    directory = %s\n' % (self.directory,)
+        ss += '    max_size = %d\n' % (self.max_size,)
+        return ss
+
+
+class ArrayFile():
+    """
+    Reference to a numpy array stored in the file 'array<index>.npy' of
+    an entry of Cache.
+    """
+    def __init__(self, index):
+        self.index = index
+
+
+def strip(value, arrays):
+    """
+    It returns a copy of the quantity (value), where the numpy arrays are
+    replaced by the references ArrayFile to the list of arrays (arrays).
+    """
+    if isinstance(value, (tuple, list)):
+        return type(value)([strip(val, arrays) for val in value])
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object or value.size == 0:
+            return value
+        arrays.append(value)
+        return ArrayFile(len(arrays)-1)
+    elif hasattr(value, '__dict__'):
+        value = copy.copy(value)
+        for key, val in value.__dict__.items():
+            if isinstance(val, np.ndarray):
+                setattr(value, key, strip(val, arrays))
+    return value
+
+
+def restore(value, path):
+    """
+    It replaces the references ArrayFile in the quantity (value) by the
+    memory-mapped arrays stored in the directory (path), see strip.
+    """
+    if isinstance(value, (tuple, list)):
+        return type(value)([restore(val, path) for val in value])
+    elif isinstance(value, ArrayFile):
+        return np.load(os.path.join(path, 'array%d.npy' % value.index),
+                       mmap_mode='c')
+    elif hasattr(value, '__dict__'):
+        for key, val in value.__dict__.items():
+            if isinstance(val, ArrayFile):
+                setattr(value, key, restore(val, path))
+    return value
+
+
+def get_hash(key):
+    """
+    It returns the hexadecimal SHA-1 hash of the parameters (key) consisting
+    of dicts, lists, tuples, strings, None, numbers, and numpy arrays; the
+    integer and float arrays are hashed in 64-bit precision, so the hash
+    does not depend on their dtype. TypeError is raised for other objects,
+    e.g. functions.
+    """
+    sha = hashlib.sha1()
+    update_hash(sha, key)
+    return sha.hexdigest()
+
+
+def get_code_hash(modules):
+    """
+    It returns the hexadecimal SHA-1 hash of the source code of modules
+    given by their names; the hashes of individual modules are evaluated
+    once per process.
+    """
+    sha = hashlib.sha1()
+    for name in modules:
+        if name not in code_hashes:
+            module = importlib.import_module(name)
+            with open(inspect.getsourcefile(module), 'rb') as fil:
+                code_hashes[name] = hashlib.sha1(fil.read()).hexdigest()
+        sha.update(('%s:%s' % (name, code_hashes[name])).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def get_cache_dir():
+    """
+    It returns the default directory of Cache in the user cache directory,
+    i.e. outside of the source tree.
+    """
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'ffthompy')
+
+
+def update_hash(sha, obj):
+    if isinstance(obj, dict):
+        sha.update(('dict%d' % len(obj)).encode('utf-8'))
+        for key in sorted(obj.keys()):
+            update_hash(sha, key)
+            update_hash(sha, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        sha.update(('list%d' % len(obj)).encode('utf-8'))
+        for val in obj:
+            update_hash(sha, val)
+    elif obj is None or isinstance(obj, basestring):
+        sha.update(repr(obj).encode('utf-8'))
+    elif isinstance(obj, (bool, int, long, float, complex, np.ndarray,
+                          np.number, np.bool_)):
+        val = np.asarray(obj)
+        if val.dtype == object:
+            update_hash(sha, val.tolist())
+            return
+        if val.dtype.kind in 'biu':
+            val = val.astype(np.int64)
+        elif val.dtype.kind == 'f':
+            val = val.astype(np.float64)
+        elif val.dtype.kind == 'c':
+            val = val.astype(np.complex128)
+        else:
+            raise TypeError("The parameter of type (%s) cannot be hashed!"
+                            % val.dtype)
+        sha.update(('array%s' % str(val.shape)).encode('utf-8'))
+        sha.update(np.ascontiguousarray(val).tobytes())
+    else:
+        raise TypeError("The parameter of type (%s) cannot be hashed!"
+                        % type(obj))
+
+if __name__ == '__main__':
+    execfile('../main_test.py')
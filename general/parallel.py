@@ -0,0 +1,85 @@
+import sys
+import multiprocessing
+from StringIO import StringIO
+
+# functions and read-only data of running pools; they are inherited by
+# the forked worker processes instead of being pickled for every task
+shared = {}
+
+
+def parallel_map(fun, args, processes=1, **data):
+    """
+    It returns the list [fun(arg, **data) for arg in args], where the tasks
+    are evaluated in a pool of worker processes.
+
+    The data (e.g. operators with projections and material coefficients) are
+    stored in this module before the pool is started, so the forked workers
+    share the memory of numpy arrays with the parent process (copy-on-write),
+    and only the arguments (args) and the results are pickled. The data
+    should be thus read-only in workers.
+
+    The results are gathered in the order of args, and the standard output of
+    tasks is captured and printed in the same order, so the output does not
+    depend on the scheduling of tasks. The tasks are evaluated serially for
+    one process, for one task, or in a worker process, which cannot start
+    a nested pool.
+
+    Parameters
+    ----------
+    fun : function
+        function evaluated as fun(arg, **data)
+    args : list
+        arguments of individual tasks
+    processes : int
+        no. of worker processes
+    data : dict
+        keyword arguments of fun shared by all tasks
+
+    Returns
+    -------
+    results : list
+        results of tasks in the order of args
+    """
+    args = list(args)
+    processes = min(processes, len(args))
+    if processes <= 1 or in_worker():
+        return [fun(arg, **data) for arg in args]
+
+    key = max(shared.keys() + [-1]) + 1
+    shared[key] = (fun, data)
+    pool = multiprocessing.Pool(processes)
+    try:
+        outputs = pool.map(evaluate, [(key, arg) for arg in args])
+    finally:
+        pool.close()
+        pool.join()
+        del shared[key]
+
+    results = []
+    for result, stdout in outputs:
+        sys.stdout.write(stdout)
+        results.append(result)
+    return results
+
+
+def evaluate(task):
+    """
+    It evaluates a task (key, arg) of parallel_map in a worker process; it
+    returns the result and the captured standard output.
+    """
+    key, arg = task
+    fun, data = shared[key]
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        result = fun(arg, **data)
+        return result, sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+def in_worker():
+    """
+    It returns True in a worker process of parallel_map.
+    """
+    return multiprocessing.current_process().daemon
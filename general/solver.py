@@ -1,15 +1,26 @@
 #!/usr/bin/python
 import numpy as np
 import general.dbg as dbg
-from homogenize.matvec import VecTri
+from homogenize.matvec import VecTri, GAOper, CompiledOper
 
 
 def linear_solver(Afun=None, ATfun=None, B=None, x0=None, par=None,
-                  solver=None, callback=None):
-    if callback is not None:
+                  solver=None, callback=None, precond=None, recycle=None):
+    if callback is not None and solver not in ['CG', 'PCG', 'BlockCG']:
+        # the other solvers do not report their initial state
         callback(x0)
-    if solver == 'CG':
+    if recycle is not None and solver in ['CG', 'PCG']:
+        if solver == 'CG':
+            precond = None
+        x, info = DeflatedPCG(Afun, B, x0=x0, par=par, callback=callback,
+                              precond=precond, recycle=recycle)
+    elif solver == 'CG':
         x, info = CG(Afun, B, x0=x0, par=par, callback=callback)
+    elif solver == 'PCG':
+        x, info = PCG(Afun, B, x0=x0, par=par, callback=callback,
+                      precond=precond)
+    elif solver == 'BlockCG':
+        x, info = BlockCG(Afun, B, x0=x0, par=par, callback=callback)
     elif solver == 'iterative':
         x, info = richardson(Afun, B, x0, par=par, callback=callback)
     else:
@@ -37,6 +48,159 @@ def linear_solver(Afun=None, ATfun=None, B=None, x0=None, par=None,
     return x, info
 
 
+def matvec(Afun, X, AX=None):
+    """
+    It returns the product Afun(X) of VecTri X.
+
+    The operators evaluating their products into a given array (GAOper and
+    CompiledOper with an execution plan) store the values in AX, i.e. in
+    the product of a previous call with an operand of the same shape and
+    dtype; the iterations of solvers thus allocate no vectors. The product
+    is allocated for other operators or for the first call (AX is None).
+    """
+    if (AX is None or not isinstance(X, VecTri)
+            or AX.val.shape != X.val.shape or AX.val.dtype != X.val.dtype
+            or AX.Fourier != X.Fourier):
+        return Afun(X)
+    if isinstance(Afun, GAOper) or (isinstance(Afun, CompiledOper)
+                                    and Afun.planned):
+        Afun.mul_val(X.val, out=AX.val)
+        return AX
+    return Afun(X)
+
+
+def get_state(res, R, P):
+    """
+    It returns the internal state of a Krylov solver, which is passed to the
+    callback as callback(x, state) at every iteration (including the initial
+    one); the callbacks thus need not to recompute the residual.
+
+    Parameters
+    ----------
+    res : dict
+        results of solver containing the number of iteration (kit) and
+        the norm of (recursive) residual (norm_res)
+    R : VecTri
+        residual
+    P : VecTri
+        search direction for next iteration
+
+    The vectors are work vectors of solver, which are updated in place
+    during next iterations.
+
+    Returns
+    -------
+    state : dict
+        with keys 'kit', 'norm_res', 'R', and 'P'
+    """
+    return {'kit': res['kit'],
+            'norm_res': res['norm_res'],
+            'R': R,
+            'P': P}
+
+
+def refinement(Afun, B, x0=None, par=None, solver='CG', callback=None,
+               Afun_low=None, precond=None, dtype=np.float32, recycle=None):
+    """
+    Mixed-precision iterative refinement; the corrections are solved in
+    lower precision (dtype) by a linear solver with operator Afun_low, and
+    the residuals and the solution are updated in the precision of Afun, so
+    the tolerance can be below the accuracy of lower precision.
+
+    Parameters
+    ----------
+    Afun : LinOper
+        linear operator of the system
+    B : VecTri
+        right-hand side (or a block of them for solver 'BlockCG')
+    x0 : VecTri
+        initial approximation of solution
+    par : dict
+        parameters of the method; the tolerance (tol) and maximal number of
+        iterations (maxiter) regard the residual of Afun and the total
+        number of iterations of inner solver; the inner solves reduce
+        the residual by factor tol_inner (default 1e-4) and the number of
+        refinement steps is limited by maxrefine (default 20)
+    solver : str
+        linear solver of corrections, see linear_solver
+    callback : function
+        it is called as callback(x, state) after every refinement step, see
+        get_state; the state has no search direction (P)
+    Afun_low : LinOper
+        linear operator acting on vectors of lower precision, e.g.
+        Afun.astype(numpy.float32)
+    precond : LinOper
+        preconditioner acting on vectors of lower precision
+    dtype : numpy.dtype
+        real data type of lower precision
+    recycle : Recycle
+        recycled subspace of inner solver, see DeflatedPCG
+
+    Returns
+    -------
+    x : VecTri
+        resulting unknown vector
+    res : dict
+        results; the number of iterations (kit) is the total number of
+        iterations of inner solver, the number of refinement steps is
+        stored as refine
+    """
+    if x0 is None:
+        x0 = B
+    if par is None:
+        par = dict()
+    if 'tol' not in par:
+        par['tol'] = 1e-6
+    if 'maxiter' not in par:
+        par['maxiter'] = 1e3
+    if 'tol_inner' not in par:
+        par['tol_inner'] = 1e-4
+    if 'maxrefine' not in par:
+        par['maxrefine'] = 20
+
+    if solver == 'BlockCG':
+        get_norm = block_norms
+    else:
+        get_norm = lambda R: R.norm()
+
+    res = dict()
+    res['time'] = dbg.start_time()
+    res['kit'] = 0
+    res['refine'] = 0
+    x = x0.copy(name='xIR')
+    Ax = Afun(x)
+    R = B - Ax
+    res['norm_res'] = get_norm(R)
+    if callback is not None:
+        callback(x, get_state(res, R, None))
+    while (np.max(res['norm_res']) > par['tol']
+           and res['kit'] < par['maxiter']
+           and res['refine'] < par['maxrefine']):
+        res['refine'] += 1
+        # the residual is scaled to unit norm to avoid underflow
+        scale = np.max(res['norm_res'])
+        R_low = R.astype(dtype).iscale(1./scale)
+        par_low = dict(par)
+        par_low['tol'] = max(par['tol_inner'], par['tol']/scale)
+        par_low['maxiter'] = par['maxiter'] - res['kit']
+        x0_low = R_low.copy(name='x0')
+        x0_low.val[...] = 0.
+        D, info = linear_solver(solver=solver, Afun=Afun_low, B=R_low,
+                                x0=x0_low, par=par_low, precond=precond,
+                                recycle=recycle)
+        res['kit'] += info['kit']
+        x.iaxpy(scale, D.astype(x.val.dtype))
+        Ax = matvec(Afun, x, Ax)
+        R = B - Ax
+        res['norm_res'] = get_norm(R)
+        if callback is not None:
+            callback(x, get_state(res, R, None))
+        if np.max(res['norm_res']) >= scale: # stagnation of refinement
+            break
+    res['time'] = dbg.get_time(res['time'])
+    return x, res
+
+
 def richardson(Afun, B, x0, par=None, callback=None):
     alp = 1./par['alpha']
     res = {'norm_res': 1.,
@@ -66,7 +230,8 @@ def CG(Afun, B, x0=None, par=None, callback=None):
         initial approximation of solution of linear system
     par : dict
         parameters of the method
-    callback :
+    callback : function
+        it is called as callback(x, state), see get_state
 
     Returns
     -------
@@ -86,35 +251,492 @@ def CG(Afun, B, x0=None, par=None, callback=None):
 
     res = dict()
     res['time'] = dbg.start_time()
-    xCG = x0
-    Ax = Afun(x0)
-    R = B - Ax
-    P = R
-    rr = R*R
+    # work vectors updated in place during iterations
+    xCG = x0.copy(name='xCG')
+    AP = Afun(x0) # reused for the products with search directions
+    R = B - AP
+    P = R.copy(name='P')
+    rr = R.dot(R)
     res['kit'] = 0
     res['norm_res'] = np.double(rr)**0.5 # /np.norm(E_N)
     norm_res_log = []
     norm_res_log.append(res['norm_res'])
+    if callback is not None:
+        callback(xCG, get_state(res, R, P))
     while (res['norm_res'] > par['tol']) and (res['kit'] < par['maxiter']):
         res['kit'] += 1 # number of iterations
-        AP = Afun(P)
-        alp = rr/(P*AP)
-        xCG = xCG + alp*P
-        R = R - alp*AP
-        rrnext = R*R
+        AP = matvec(Afun, P, AP)
+        alp = rr/P.dot(AP)
+        xCG.iaxpy(alp, P)
+        R.iaxpy(-alp, AP)
+        rrnext = R.dot(R)
         bet = rrnext/rr
         rr = rrnext
-        P = R + bet*P
+        P.iscale(bet).iaxpy(1., R)
         res['norm_res'] = np.double(rr)**0.5
         norm_res_log.append(res['norm_res'])
         if callback is not None:
-            callback(xCG)
+            callback(xCG, get_state(res, R, P))
     res['time'] = dbg.get_time(res['time'])
     if res['kit'] == 0:
         res['norm_res'] = 0
     return xCG, res
 
 
+def PCG(Afun, B, x0=None, par=None, callback=None, precond=None):
+    """
+    Preconditioned conjugate gradients solver.
+
+    Parameters
+    ----------
+    Afun : Matrix, LinOper, or numpy.array of shape (n, n)
+        it stores the matrix data of linear system and provides a matrix by
+        vector multiplication
+    B : VecTri or numpy.array of shape (n,)
+        it stores a right-hand side of linear system
+    x0 : VecTri or numpy.array of shape (n,)
+        initial approximation of solution of linear system
+    par : dict
+        parameters of the method
+    callback : function
+        it is called as callback(x, state), see get_state
+    precond : Matrix, LinOper
+        symmetric positive definite preconditioner, i.e. an approximation
+        of the inverse of Afun; no preconditioning for None
+
+    Returns
+    -------
+    x : VecTri or numpy.array of shape (n,)
+        resulting unknown vector
+    res : dict
+        results; the norm of residual (norm_res) is not preconditioned
+    """
+    if precond is None:
+        return CG(Afun, B, x0=x0, par=par, callback=callback)
+    if x0 is None:
+        x0 = B
+    if par is None:
+        par = dict()
+    if 'tol' not in par.keys():
+        par['tol'] = 1e-6
+    if 'maxiter' not in par.keys():
+        par['maxiter'] = 1e3
+
+    res = dict()
+    res['time'] = dbg.start_time()
+    # work vectors updated in place during iterations
+    xCG = x0.copy(name='xCG')
+    AP = Afun(x0) # reused for the products with search directions
+    R = B - AP
+    Z = precond(R)
+    P = Z.copy(name='P')
+    rz = R.dot(Z)
+    res['kit'] = 0
+    res['norm_res'] = np.double(R.dot(R))**0.5
+    if callback is not None:
+        callback(xCG, get_state(res, R, P))
+    while (res['norm_res'] > par['tol']) and (res['kit'] < par['maxiter']):
+        res['kit'] += 1 # number of iterations
+        AP = matvec(Afun, P, AP)
+        alp = rz/P.dot(AP)
+        xCG.iaxpy(alp, P)
+        R.iaxpy(-alp, AP)
+        res['norm_res'] = np.double(R.dot(R))**0.5
+        if res['norm_res'] <= par['tol']:
+            if callback is not None:
+                callback(xCG, get_state(res, R, P))
+            break
+        Z = precond(R)
+        rznext = R.dot(Z)
+        bet = rznext/rz
+        rz = rznext
+        P.iscale(bet).iaxpy(1., Z)
+        if callback is not None:
+            callback(xCG, get_state(res, R, P))
+    res['time'] = dbg.get_time(res['time'])
+    return xCG, res
+
+
+def DeflatedPCG(Afun, B, x0=None, par=None, callback=None, precond=None,
+                recycle=None):
+    """
+    Deflated (preconditioned) conjugate gradients with recycling of Krylov
+    subspace, i.e. the search directions are kept A-orthogonal to
+    the recycled subspace W of Recycle, which is updated by the first search
+    directions of the solve; the subspace approximates the eigenvectors of
+    the smallest eigenvalues, which are thus removed from the following
+    solves with the same (or similar) operator.
+
+    Parameters
+    ----------
+    Afun : Matrix, LinOper
+        it stores the matrix data of linear system and provides a matrix by
+        vector multiplication
+    B : VecTri
+        it stores a right-hand side of linear system
+    x0 : VecTri
+        initial approximation of solution of linear system
+    par : dict
+        parameters of the method
+    callback : function
+        it is called as callback(x, state), see get_state
+    precond : Matrix, LinOper
+        symmetric positive definite preconditioner; no preconditioning for
+        None
+    recycle : Recycle
+        recycled subspace, which is updated in place
+
+    Returns
+    -------
+    x : VecTri
+        resulting unknown vector
+    res : dict
+        results; the norm of residual (norm_res) is not preconditioned
+    """
+    if x0 is None:
+        x0 = B
+    if par is None:
+        par = dict()
+    if 'tol' not in par:
+        par['tol'] = 1e-6
+    if 'maxiter' not in par:
+        par['maxiter'] = 1e3
+    if recycle is None:
+        recycle = Recycle(0)
+
+    res = dict()
+    res['time'] = dbg.start_time()
+    recycle.set_operator(Afun)
+    # work vectors updated in place during iterations
+    xCG = x0.copy(name='xCG')
+    AP = Afun(x0) # reused for the products with search directions
+    R = B - AP
+    if recycle.W is not None:
+        # the residual is made orthogonal to the recycled subspace
+        c = recycle.get_coef(recycle.W, R)
+        xCG.val += recycle.combine(recycle.W, c)
+        R.val -= recycle.combine(recycle.AW, c)
+    if precond is None:
+        Z = R
+    else:
+        Z = precond(R)
+    P = Z.copy(name='P')
+    recycle.deflate(P, Z)
+    rz = R.dot(Z)
+    res['kit'] = 0
+    res['norm_res'] = np.double(R.dot(R))**0.5
+    if callback is not None:
+        callback(xCG, get_state(res, R, P))
+    Ps, APs = [], [] # search directions for update of recycled subspace
+    while (res['norm_res'] > par['tol']) and (res['kit'] < par['maxiter']):
+        res['kit'] += 1 # number of iterations
+        AP = matvec(Afun, P, AP)
+        if len(Ps) < recycle.m:
+            Ps.append(P.copy())
+            APs.append(AP.copy())
+        alp = rz/P.dot(AP)
+        xCG.iaxpy(alp, P)
+        R.iaxpy(-alp, AP)
+        res['norm_res'] = np.double(R.dot(R))**0.5
+        if res['norm_res'] <= par['tol']:
+            if callback is not None:
+                callback(xCG, get_state(res, R, P))
+            break
+        if precond is not None:
+            Z = precond(R)
+        rznext = R.dot(Z)
+        bet = rznext/rz
+        rz = rznext
+        P.iscale(bet).iaxpy(1., Z)
+        recycle.deflate(P, Z)
+        if callback is not None:
+            callback(xCG, get_state(res, R, P))
+    recycle.update(Ps, APs)
+    res['time'] = dbg.get_time(res['time'])
+    return xCG, res
+
+
+class Recycle(object):
+    """
+    Recycled subspace of Krylov solver (DeflatedPCG) shared by a sequence of
+    linear systems, e.g. by the macroscopic loads. It is stored as a block of
+    k vectors W (VecTri with values of shape (d, k, N)) together with
+    the block AW = Afun(W) and the matrix W.T*A*W.
+
+    After every solve, the subspace is replaced by k Ritz vectors of
+    the smallest Ritz values from the space spanned by W and the first m
+    search directions of the solve, see ritz. For another operator,
+    the Ritz vectors are evaluated again from W (k matrix-vector
+    multiplications); the subspace can be also mapped by transform, e.g.
+    from the primal to the dual formulation.
+
+    Parameters
+    ----------
+    k : int
+        no. of recycled vectors
+    m : int
+        no. of search directions used for update (k by default)
+    """
+    def __init__(self, k, m=None):
+        self.k = int(k)
+        if m is None:
+            m = self.k
+        self.m = int(m)
+        self.W = None
+        self.AW = None
+        self.WAW = None
+        self.Afun = None
+
+    def set_operator(self, Afun):
+        if self.W is not None and Afun is not self.Afun:
+            self.ritz(self.W, block_apply(Afun, self.W))
+        self.Afun = Afun
+
+    def transform(self, fun):
+        """
+        It maps the recycled vectors by function fun, e.g. by projected
+        material coefficients GN*A, which maps the primal fields to the dual
+        ones and vice versa; the block AW is evaluated for the next operator.
+        """
+        if self.W is None:
+            return
+        self.W = block_apply(fun, self.W).astype(self.W.val.dtype)
+        self.AW = None
+        self.WAW = None
+        self.Afun = None
+
+    def clear(self):
+        self.W = None
+        self.AW = None
+        self.WAW = None
+        self.Afun = None
+
+    def get_coef(self, V, X):
+        """
+        Coefficients c = inv(W.T*A*W)*V.T*X for a block V (W or AW).
+        """
+        VX = block_dot(V, VecTri(val=X.val[:, np.newaxis], N=X.N))
+        return np.linalg.solve(self.WAW, VX[:, 0])
+
+    @staticmethod
+    def combine(V, c):
+        """
+        Values of linear combination of a block V by coefficients c.
+        """
+        return np.tensordot(c, V.val, axes=([0], [1])).astype(V.val.dtype)
+
+    def deflate(self, P, Z):
+        """
+        In-place update P = P - W*inv(W.T*A*W)*AW.T*Z, which makes P
+        A-orthogonal to W for P = Z.
+        """
+        if self.W is not None:
+            P.val -= self.combine(self.W, self.get_coef(self.AW, Z))
+        return P
+
+    def update(self, P, AP):
+        """
+        Update of the subspace by search directions P (list of VecTri) and
+        the products AP.
+        """
+        if self.k == 0 or len(P) == 0:
+            return
+        Z = np.array([X.val for X in P]).swapaxes(0, 1)
+        AZ = np.array([X.val for X in AP]).swapaxes(0, 1)
+        if self.W is not None:
+            Z = np.concatenate([self.W.val, Z], axis=1)
+            AZ = np.concatenate([self.AW.val, AZ], axis=1)
+        self.ritz(VecTri(val=Z, N=P[0].N), VecTri(val=AZ, N=P[0].N))
+
+    def ritz(self, Z, AZ):
+        """
+        Rayleigh-Ritz procedure on the space spanned by a block Z with
+        the products AZ; the subspace is replaced by k Ritz vectors of
+        the smallest Ritz values. The subspace is dropped for non-positive
+        Ritz values, because the deflation requires positive definite
+        operator (e.g. the dual scheme Ga can be indefinite).
+        """
+        G = block_dot(Z, AZ)
+        G = 0.5*(G + G.T)
+        # the vectors are scaled and orthonormalized
+        F = block_dot(Z, Z)
+        scal = np.diag(F)**-0.5
+        F = F*np.outer(scal, scal)
+        lam, V = np.linalg.eigh(F)
+        tol = max(1e-12, np.finfo(Z.val.dtype).eps)
+        ind = lam > tol*lam[-1]
+        Q = scal[:, np.newaxis]*V[:, ind]/lam[ind]**0.5
+        theta, Y = np.linalg.eigh(np.dot(Q.T, np.dot(G, Q)))
+        if theta[0] <= tol*np.max(np.abs(theta)):
+            self.W, self.AW, self.WAW = None, None, None
+            return
+        C = np.dot(Q, Y[:, :self.k])
+        self.W = block_mul(Z, C)
+        self.AW = block_mul(AZ, C)
+        WAW = np.dot(C.T, np.dot(G, C))
+        self.WAW = 0.5*(WAW + WAW.T)
+
+
+def block_apply(fun, X):
+    """
+    It applies function fun (e.g. linear operator) on the individual vectors
+    of a block X.
+    """
+    val = np.array([fun(VecTri(val=X.val[:, ii], N=X.N)).val
+                    for ii in np.arange(X.val.shape[1])]).swapaxes(0, 1)
+    return VecTri(name=X.name, val=np.ascontiguousarray(val), N=X.N,
+                  Fourier=X.Fourier)
+
+
+def BlockCG(Afun, B, x0=None, par=None, callback=None):
+    """
+    Block conjugate gradients solver for multiple right-hand sides, which
+    are stored in VecTri of values with shape (d, s, N); all s systems are
+    advanced together, i.e. the operator is applied once per iteration on
+    the whole block, and the Krylov subspace is shared by all of them.
+
+    It is the breakdown-free variant of block CG, where the block of search
+    directions is orthonormalized and its (numerically) dependent columns
+    are dropped.
+
+    Parameters
+    ----------
+    Afun : LinOper
+        it stores the matrix data of linear system and provides a matrix by
+        vector multiplication acting on blocks of vectors
+    B : VecTri with values of shape (d, s, N)
+        it stores s right-hand sides of linear system
+    x0 : VecTri with values of shape (d, s, N)
+        initial approximations of solutions
+    par : dict
+        parameters of the method; the tolerance (tol) is required for
+        the residual of every right-hand side
+    callback : function
+        it is called as callback(x, state), see get_state; the norm of
+        residual is an array of norms for individual right-hand sides
+
+    Returns
+    -------
+    x : VecTri with values of shape (d, s, N)
+        resulting unknown vectors
+    res : dict
+        results
+    """
+    if x0 is None:
+        x0 = B
+    if par is None:
+        par = dict()
+    if 'tol' not in par:
+        par['tol'] = 1e-6
+    if 'maxiter' not in par:
+        par['maxiter'] = 1e3
+    if 'tol_rank' not in par:
+        par['tol_rank'] = 1e-12
+
+    res = dict()
+    res['time'] = dbg.start_time()
+    # work blocks updated in place during iterations
+    xCG = x0.copy(name='xCG')
+    AP = Afun(x0) # reused for the products with search directions
+    R = B - AP
+    W = None # reused for the linear combinations of blocks
+    res['kit'] = 0
+    res['norm_res'] = block_norms(R)
+    P = block_orth(R, par['tol_rank'])
+    if callback is not None:
+        callback(xCG, get_state(res, R, P))
+    while (np.max(res['norm_res']) > par['tol']
+           and res['kit'] < par['maxiter'] and P is not None):
+        res['kit'] += 1 # number of iterations
+        AP = matvec(Afun, P, AP)
+        PAP = block_dot(P, AP)
+        alp = np.linalg.solve(PAP, block_dot(P, R))
+        W = block_mul(P, alp, out=W)
+        xCG.iaxpy(1., W)
+        W = block_mul(AP, alp, out=W)
+        R.iaxpy(-1., W)
+        bet = -np.linalg.solve(PAP, block_dot(AP, R))
+        W = block_mul(P, bet, out=W).iaxpy(1., R)
+        P = block_orth(W, par['tol_rank'], out=P)
+        res['norm_res'] = block_norms(R)
+        if callback is not None:
+            callback(xCG, get_state(res, R, P))
+    res['time'] = dbg.get_time(res['time'])
+    return xCG, res
+
+
+def block_dot(X, Y):
+    """
+    Matrix of inner products X[:, a]*Y[:, b] of two blocks of vectors; it is
+    summed over the components of vectors without copies of the blocks,
+    the complex values are multiplied as their real views, i.e.
+    Re(x*conj(y)) = x.real*y.real + x.imag*y.imag.
+    """
+    Xm = np.reshape(X.val, X.val.shape[:2] + (-1,))
+    Ym = np.reshape(Y.val, Y.val.shape[:2] + (-1,))
+    if np.iscomplexobj(Xm) or np.iscomplexobj(Ym):
+        ctype = np.result_type(Xm, Ym)
+        Xm = np.ascontiguousarray(Xm, dtype=ctype)
+        Ym = np.ascontiguousarray(Ym, dtype=ctype)
+        rtype = np.finfo(ctype).dtype
+        Xm = Xm.view(rtype)
+        Ym = Ym.view(rtype)
+    XY = 0.
+    for ii in np.arange(Xm.shape[0]):
+        XY = XY + np.dot(Xm[ii], Ym[ii].T)
+    if not X.Fourier:
+        XY = XY/np.prod(X.N)
+    return XY
+
+
+def block_mul(X, c, out=None):
+    """
+    Linear combinations of a block of vectors X by coefficients c of shape
+    (s, t); it returns a block of t vectors in the precision of X.
+
+    The values are stored in the block out (not sharing memory with X),
+    i.e. in the result of a previous call of the same shape and dtype, so
+    that the iterations allocate no blocks; a new block is allocated for
+    out=None or for a block of other shape.
+    """
+    shape = X.val.shape[:1] + (c.shape[1],) + X.val.shape[2:]
+    if (out is None or out.val.shape != shape
+            or out.val.dtype != X.val.dtype
+            or not out.val.flags.c_contiguous):
+        out = VecTri(name=X.name, val=np.empty(shape, dtype=X.val.dtype),
+                     N=X.N, Fourier=X.Fourier)
+    # products of (t, s) coefficients with (s, n) values of components
+    cT = np.asarray(c.T, dtype=X.val.dtype, order='C')
+    Xval = np.reshape(X.val, X.val.shape[:2] + (-1,))
+    outval = np.reshape(out.val, shape[:2] + (-1,))
+    for ii in np.arange(shape[0]):
+        np.dot(cT, Xval[ii], out=outval[ii])
+    return out
+
+
+def block_norms(X):
+    """
+    Norms of individual vectors of a block.
+    """
+    return np.diag(block_dot(X, X))**0.5
+
+
+def block_orth(X, tol=1e-12, out=None):
+    """
+    It orthonormalizes a block of vectors, the (numerically) linearly
+    dependent vectors are dropped; it returns None for a zero block.
+    The result is stored in out if possible, see block_mul.
+    """
+    XX = block_dot(X, X)
+    # the tolerance cannot be below the precision of vectors
+    tol = max(tol, np.finfo(XX.dtype).eps)
+    lam, V = np.linalg.eigh(XX)
+    if lam[-1] <= 0:
+        return None
+    ind = lam > tol*lam[-1]
+    return block_mul(X, V[:, ind]/lam[ind]**0.5, out=out)
+
+
 def BiCG(Afun, ATfun, B, x0=None, par=None, callback=None):
     """
     BiConjugate gradient solver.
@@ -130,7 +752,8 @@ def BiCG(Afun, ATfun, B, x0=None, par=None, callback=None):
         initial approximation of solution of linear system
     par : dict
         parameters of the method
-    callback :
+    callback : function
+        it is called as callback(x, state), see get_state
 
     Returns
     -------
@@ -154,14 +777,17 @@ def BiCG(Afun, ATfun, B, x0=None, par=None, callback=None):
     Ax = Afun(x0)
     R = B - Ax
     P = R
+    AP = None
     rr = R*R
     res['kit'] = 0
     res['norm_res'] = np.double(rr)**0.5 # /np.norm(E_N)
     norm_res_log = []
     norm_res_log.append(res['norm_res'])
+    if callback is not None:
+        callback(xCG, get_state(res, R, P))
     while (res['norm_res'] > par['tol']) and (res['kit'] < par['maxiter']):
         res['kit'] += 1 # number of iterations
-        AP = Afun(P)
+        AP = matvec(Afun, P, AP)
         alp = rr/(P*AP)
         xCG = xCG + alp*P
         R = R - alp*AP
@@ -172,7 +798,7 @@ def BiCG(Afun, ATfun, B, x0=None, par=None, callback=None):
         res['norm_res'] = np.double(rr)**0.5
         norm_res_log.append(res['norm_res'])
         if callback is not None:
-            callback(xCG)
+            callback(xCG, get_state(res, R, P))
     res['time'] = dbg.get_time(res['time'])
     if res['kit'] == 0:
         res['norm_res'] = 0
@@ -3,18 +3,40 @@ from homogenize.matvec import VecTri
 
 
 class CallBack():
-    def __init__(self, A=None, B=None, E2N=None, **kwargs):
+    """
+    Callback of linear solvers recording the norms of residuals.
+
+    By default, it is light, i.e. it records the norm of (recursive)
+    residual passed by the solver in its state without any additional
+    matrix-vector multiplication; the residual B - A(x) is evaluated
+    explicitly only for verify=True or for solvers that do not pass their
+    state (e.g. from scipy).
+
+    Parameters
+    ----------
+    A : LinOper
+        linear operator of the system
+    B : VecTri
+        right-hand side
+    verify : boolean
+        if True, the true residual B - A(x) is evaluated at every iteration
+    """
+    def __init__(self, A=None, B=None, E2N=None, verify=False, **kwargs):
         self.iter = -1
         self.res_norm = []
         self.energy_norm = []
         self.A = A
         self.B = B
+        self.verify = verify
         if 'Aener' in kwargs.keys():
             self.Aener = kwargs['Aener']
         self.E2N = E2N
 
-    def __call__(self, x):
+    def __call__(self, x, state=None):
         self.iter += 1
+        if state is not None and not self.verify:
+            self.res_norm.append(state['norm_res'])
+            return
         if not isinstance(x, VecTri):
             X = VecTri(val=nm.reshape(x, self.B.dN()))
         else:
@@ -23,11 +45,22 @@ class CallBack():
         self.res_norm.append(res.norm())
         return
 
+    def detach(self):
+        """
+        It drops the references to the operator and vectors of the system,
+        e.g. before the callback is sent to another process; the recorded
+        norms are kept.
+        """
+        self.A = None
+        self.B = None
+        self.E2N = None
+        return self
+
     def __repr__(self):
         try:
             ss = ''
             ss += '    iterations : %d\n' % self.iter
-            ss += '    res_norm : %g' % self.res_norm[-1]
+            ss += '    res_norm : %g' % nm.max(self.res_norm[-1])
             ss += '\n'
         except:
             ss = 'the results are not initialized yet'
@@ -47,7 +80,7 @@ class CallBack_GA():
         self.GN = kwargs['GN']
         self.primal = True
 
-    def __call__(self, x):
+    def __call__(self, x, state=None):
         self.iter += 1
         if not isinstance(x, VecTri):
             X = VecTri(val=nm.reshape(x, self.E2N.dN()))
@@ -67,6 +100,18 @@ class CallBack_GA():
         self.in_subspace_norm.append((GeN-eN).norm())
         return
 
+    def detach(self):
+        """
+        It drops the references to the operators and vectors of the system,
+        see CallBack.detach.
+        """
+        self.A = None
+        self.B = None
+        self.E2N = None
+        self.Aex = None
+        self.GN = None
+        return self
+
     def __repr__(self):
         try:
             ss = ''
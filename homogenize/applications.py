@@ -1,9 +1,13 @@
 import numpy as np
 import homogenize.projections as proj
-from general.solver import linear_solver
+from general.solver import linear_solver, refinement, Recycle
 from general.solver_pp import CallBack, CallBack_GA
-from homogenize.matvec import (VecTri, Matrix, DFT, LinOper)
+from general.parallel import parallel_map, in_worker
+from general.cache import Cache
+from homogenize.matvec import (VecTri, Matrix, DFT, LinOper, GAOper,
+                               GaMatrix)
 from homogenize.materials import Material
+from homogenize.matvec_fun import Grid
 import general.dbg as dbg
 from homogenize.postprocess import postprocess, add_macro2minimizer
 
@@ -19,76 +23,64 @@ def scalar(problem):
     pb = problem
     print pb
 
-    # Fourier projections
-    _, hG1N, hG2N = proj.scalar(pb.solve['N'], pb.Y, centered=True,
-                                NyqNul=True)
-
-    if pb.solve['kind'] is 'GaNi':
-        Nbar = pb.solve['N']
-    elif pb.solve['kind'] is 'Ga':
-        Nbar = 2*pb.solve['N'] - 1
-        hG1N = hG1N.enlarge(Nbar)
-        hG2N = hG2N.enlarge(Nbar)
-
-    FN = DFT(name='FN', inverse=False, N=Nbar)
-    FiN = DFT(name='FiN', inverse=True, N=Nbar)
-
-    G1N = LinOper(name='G1', mat=[[FiN, hG1N, FN]])
-    G2N = LinOper(name='G2', mat=[[FiN, hG2N, FN]])
-
+    # operators depending only on the grid
+    ops = get_operators(pb)
+    Nbar, Nsol = ops['Nbar'], ops['Nsol']
+    hG1N, hG2N = ops['hG1N'], ops['hG2N']
+    FN, FiN = ops['FN'], ops['FiN']
+    G1N, G2N = ops['G1N'], ops['G2N']
+
+    recycle = get_recycle(pb)
+    together = solve_together(pb, recycle)
+    # material coefficients (memoized for both formulations)
+    mat = Material(pb.material, cache=get_cache(pb))
+    pending = [] # formulations solved together
     for primaldual in pb.solve['primaldual']:
         tim = dbg.start_time()
         print '\nproblem: ' + primaldual
-        solutions = np.zeros(pb.shape).tolist()
-        results = np.zeros(pb.shape).tolist()
-
-        # material coefficients
-        mat = Material(pb.material)
 
         if pb.solve['kind'] is 'GaNi':
-            A = mat.get_A_GaNi(pb.solve['N'], primaldual)
+            A = mat.get_A_GaNi(pb.solve['N'], primaldual,
+                               coord=ops['coord'])
         elif pb.solve['kind'] is 'Ga':
             A = mat.get_A_Ga(Nbar=Nbar, primaldual=primaldual)
+        Asol = get_material_operator(pb, A, Nsol)
 
         if primaldual is 'primal':
-            GN = G1N
+            GN, hGN = G1N, hG1N
         else:
-            GN = G2N
-
-        Afun = LinOper(name='FiGFA', mat=[[GN, A]])
-
-        for iL in np.arange(pb.dim): # iteration over unitary loads
-            E = np.zeros(pb.dim)
-            E[iL] = 1
-            print 'macroscopic load E = ' + str(E)
-            EN = VecTri(name='EN', macroval=E, N=Nbar, Fourier=False)
-            # initial approximation for solvers
-            x0 = VecTri(name='x0', N=Nbar, Fourier=False)
-
-            B = Afun(-EN) # RHS
-
-            if not hasattr(pb.solver, 'callback'):
-                cb = CallBack(A=Afun, B=B)
-            elif pb.solver['callback'] == 'detailed':
-                cb = CallBack_GA(A=Afun, B=B, EN=EN, A_Ga=A, GN=GN)
-            else:
-                raise NotImplementedError("The solver callback (%s) is not \
-                    implemented" % (pb.solver['callback']))
-
-            print 'solver : %s' % pb.solver['kind']
-            X, info = linear_solver(solver=pb.solver['kind'], Afun=Afun, B=B,
-                                    x0=x0, par=pb.solver, callback=cb)
-
-            solutions[iL] = add_macro2minimizer(X, E)
-            results[iL] = {'cb': cb, 'info': info}
-            print cb
+            GN, hGN = G2N, hG2N
+
+        Afun = GAOper(name='FiGFA', A=Asol, hGN=hGN, FN=FN, FiN=FiN)
+
+        precond = get_preconditioner(pb, Asol, mat, hGN, FN, FiN, Nsol,
+                                     primaldual)
+        initial = get_initial(pb, GN, Nsol, pb.dim, primaldual)
+        system = get_system(pb, Afun, Asol, GN, Nsol, pb.dim,
+                            precond=precond, initial=initial)
+        if together:
+            pending.append((primaldual, A, mat, system))
+            continue
+        [(solutions, results)] = solve_loads(pb, [system], recycle=recycle)
         tim = dbg.get_time(tim)
         print 'calculation times for each load:\n', tim
 
+        if primaldual != pb.solve['primaldual'][-1]:
+            switch_formulation(pb, Asol, solutions, G1N, G2N, primaldual,
+                               recycle=recycle)
+
         # POSTPROCESSING
-        del Afun, B, E, EN, GN, X
+        del Afun, GN, system
         postprocess(pb, A, mat, solutions, results, primaldual)
 
+    if pending:
+        tim = dbg.start_time()
+        solved = solve_loads(pb, [system for _, _, _, system in pending])
+        tim = dbg.get_time(tim)
+        print 'calculation times for all formulations:\n', tim
+        for (primaldual, A, mat, _), (solutions, results) in zip(pending,
+                                                                 solved):
+            postprocess(pb, A, mat, solutions, results, primaldual)
 
 
 def elasticity(problem):
@@ -103,77 +95,618 @@ def elasticity(problem):
     pb = problem
     print pb
 
-    # Fourier projections
-    _, hG1hN, hG1sN, hG2hN, hG2sN = proj.elasticity(pb.solve['N'], pb.Y,
-                                                    centered=True, NyqNul=True)
-    del _
-
-    if pb.solve['kind'] is 'GaNi':
-        Nbar = pb.solve['N']
-    elif pb.solve['kind'] is 'Ga':
-        Nbar = 2*pb.solve['N'] - 1
-        hG1hN = hG1hN.enlarge(Nbar)
-        hG1sN = hG1sN.enlarge(Nbar)
-        hG2hN = hG2hN.enlarge(Nbar)
-        hG2sN = hG2sN.enlarge(Nbar)
-
-    FN = DFT(name='FN', inverse=False, N=Nbar)
-    FiN = DFT(name='FiN', inverse=True, N=Nbar)
-
-    G1N = LinOper(name='G1', mat=[[FiN, hG1hN + hG1sN, FN]])
-    G2N = LinOper(name='G2', mat=[[FiN, hG2hN + hG2sN, FN]])
-
+    # operators depending only on the grid
+    ops = get_operators(pb)
+    Nbar, Nsol = ops['Nbar'], ops['Nsol']
+    hG1N, hG2N = ops['hG1N'], ops['hG2N']
+    FN, FiN = ops['FN'], ops['FiN']
+    G1N, G2N = ops['G1N'], ops['G2N']
+
+    recycle = get_recycle(pb)
+    together = solve_together(pb, recycle)
+    # material coefficients (memoized for both formulations)
+    mat = Material(pb.material, cache=get_cache(pb))
+    pending = [] # formulations solved together
     for primaldual in pb.solve['primaldual']:
         print '\nproblem: ' + primaldual
-        solutions = np.zeros(pb.shape).tolist()
-        results = np.zeros(pb.shape).tolist()
-
-        # material coefficients
-        mat = Material(pb.material)
 
         if pb.solve['kind'] is 'GaNi':
-            A = mat.get_A_GaNi(pb.solve['N'], primaldual)
+            A = mat.get_A_GaNi(pb.solve['N'], primaldual,
+                               coord=ops['coord'])
         elif pb.solve['kind'] is 'Ga':
             A = mat.get_A_Ga(Nbar=Nbar, primaldual=primaldual)
+        Asol = get_material_operator(pb, A, Nsol)
 
         if primaldual is 'primal':
-            GN = G1N
+            GN, hGN = G1N, hG1N
         else:
-            GN = G2N
+            GN, hGN = G2N, hG2N
 
-        Afun = LinOper(name='FiGFA', mat=[[GN, A]])
+        Afun = GAOper(name='FiGFA', A=Asol, hGN=hGN, FN=FN, FiN=FiN)
 
         D = pb.dim*(pb.dim+1)/2
-        for iL in np.arange(D): # iteration over unitary loads
-            E = np.zeros(D)
-            E[iL] = 1
-            print 'macroscopic load E = ' + str(E)
-            EN = VecTri(name='EN', macroval=E, N=Nbar, Fourier=False)
-            # initial approximation for solvers
-            x0 = VecTri(N=Nbar, d=D, Fourier=False)
-
-            B = Afun(-EN) # RHS
-
-            if not hasattr(pb.solver, 'callback'):
-                cb = CallBack(A=Afun, B=B)
-            elif pb.solver['callback'] == 'detailed':
-                cb = CallBack_GA(A=Afun, B=B, EN=EN, A_Ga=A, GN=GN)
-            else:
-                raise NotImplementedError("The solver callback (%s) is not \
-                    implemented" % (pb.solver['callback']))
-
-            print 'solver : %s' % pb.solver['kind']
-            X, info = linear_solver(solver=pb.solver['kind'], Afun=Afun, B=B,
-                                    x0=x0, par=pb.solver, callback=cb)
-
-            solutions[iL] = add_macro2minimizer(X, E)
-            results[iL] = {'cb': cb, 'info': info}
-            print cb
+        precond = get_preconditioner(pb, Asol, mat, hGN, FN, FiN, Nsol,
+                                     primaldual)
+        initial = get_initial(pb, GN, Nsol, D, primaldual)
+        system = get_system(pb, Afun, Asol, GN, Nsol, D, precond=precond,
+                            initial=initial)
+        if together:
+            pending.append((primaldual, A, mat, system))
+            continue
+        [(solutions, results)] = solve_loads(pb, [system], recycle=recycle)
+
+        if primaldual != pb.solve['primaldual'][-1]:
+            switch_formulation(pb, Asol, solutions, G1N, G2N, primaldual,
+                               recycle=recycle)
 
         # POSTPROCESSING
-        del Afun, B, E, EN, GN, X
+        del Afun, GN, system
         postprocess(pb, A, mat, solutions, results, primaldual)
 
+    if pending:
+        solved = solve_loads(pb, [system for _, _, _, system in pending])
+        for (primaldual, A, mat, _), (solutions, results) in zip(pending,
+                                                                 solved):
+            postprocess(pb, A, mat, solutions, results, primaldual)
+
+
+def get_system(pb, Afun, A, GN, Nbar, D, precond=None, initial=None):
+    """
+    It returns the system of a formulation (primal or dual) for D unitary
+    macroscopic loads, which is solved by solve_loads.
+
+    Parameters
+    ----------
+    pb : Problem
+    Afun : LinOper
+        linear operator of the problem
+    A : Matrix
+        material coefficients
+    GN : LinOper
+        projection
+    Nbar : numpy.ndarray
+        size of grid
+    D : int
+        no. of macroscopic loads
+    precond : LinOper
+        preconditioner for solver 'PCG'
+    initial : list of VecTri
+        initial approximations for individual loads, see get_initial;
+        zero vectors are used for None
+
+    Returns
+    -------
+    system : dict
+        the parameters together with the operator (Afun) and preconditioner
+        (precond) acting on vectors of single precision (lowprec), see
+        solve_system
+    """
+    if get_precision(pb) == 'double':
+        lowprec = None
+    else: # operators acting on vectors of single precision
+        lowprec = {'Afun': Afun.astype(np.float32),
+                   'precond': None}
+        if precond is not None:
+            lowprec['precond'] = precond.astype(np.float32)
+    return {'Afun': Afun, 'A': A, 'GN': GN, 'Nbar': Nbar, 'D': D,
+            'precond': precond, 'initial': initial, 'lowprec': lowprec}
+
+
+def solve_loads(pb, systems, recycle=None):
+    """
+    It solves the systems (see get_system) for D unitary macroscopic loads.
+
+    The loads of all systems are solved in parallel processes, see
+    get_processes; the loads are solved sequentially for the recycled
+    subspace of solver (recycle, see get_recycle), and the solver 'BlockCG'
+    solves all loads of a system together.
+
+    Returns
+    -------
+    list of (solutions, results) for individual systems, where
+    solutions : list of VecTri
+        minimizers including the macroscopic loads
+    results : list of dict
+        solver results for individual loads
+    """
+    if pb.solver['kind'] == 'BlockCG':
+        return [solve_block(pb, **system) for system in systems]
+
+    if recycle is None:
+        processes = get_processes(pb)
+    else:
+        processes = 1
+    tasks = [(ii, iL) for ii, system in enumerate(systems)
+             for iL in np.arange(system['D'])]
+    outputs = parallel_map(solve_load, tasks, processes=processes, pb=pb,
+                           systems=systems, recycle=recycle)
+
+    solved = []
+    for ii in np.arange(len(systems)):
+        solutions = [sol for (jj, _), (sol, _) in zip(tasks, outputs)
+                     if jj == ii]
+        results = [res for (jj, _), (_, res) in zip(tasks, outputs)
+                   if jj == ii]
+        solved.append((solutions, results))
+    return solved
+
+
+def solve_load(task, pb, systems, recycle=None):
+    """
+    It solves the system systems[ii] for the iL-th unitary macroscopic load,
+    where task = (ii, iL), see solve_loads.
+
+    Returns
+    -------
+    solution : VecTri
+        minimizer including the macroscopic load
+    result : dict
+        solver results
+    """
+    ii, iL = task
+    system = systems[ii]
+    D, Nbar = system['D'], system['Nbar']
+    E = np.zeros(D)
+    E[iL] = 1
+    print 'macroscopic load E = ' + str(E)
+    EN = VecTri(name='EN', macroval=E, N=Nbar, Fourier=False)
+    # initial approximation for solvers
+    if system['initial'] is None:
+        x0 = VecTri(name='x0', N=Nbar, d=D, Fourier=False)
+    else:
+        x0 = system['initial'][iL]
+    X, cb, info = solve_system(pb, system['Afun'], EN, x0, system['A'],
+                               system['GN'], precond=system['precond'],
+                               lowprec=system['lowprec'], recycle=recycle)
+    print cb
+    if in_worker(): # the operators are not sent back
+        cb.detach()
+    return add_macro2minimizer(X, E), {'cb': cb, 'info': info}
+
+
+def solve_block(pb, Afun, A, GN, Nbar, D, precond=None, initial=None,
+                lowprec=None):
+    """
+    It solves the system for all D unitary macroscopic loads together as
+    a block of right-hand sides (solver 'BlockCG'), see solve_loads.
+    """
+    solutions = np.zeros(D).tolist()
+    results = np.zeros(D).tolist()
+    print 'macroscopic loads E = identity(%d)' % D
+    EN = VecTri(name='EN', val=np.einsum('ij,...->ij...', np.eye(D),
+                                         np.ones(Nbar)), N=Nbar)
+    if initial is None:
+        x0 = VecTri(name='x0', val=np.zeros(EN.val.shape), N=Nbar)
+    else:
+        val = np.array([x.val for x in initial]).swapaxes(0, 1)
+        x0 = VecTri(name='x0', val=np.ascontiguousarray(val), N=Nbar)
+    X, cb, info = solve_system(pb, Afun, EN, x0, A, GN, precond=precond,
+                               lowprec=lowprec)
+    for iL in np.arange(D):
+        E = np.zeros(D)
+        E[iL] = 1
+        XiL = VecTri(name='X', val=X.val[:, iL].copy(), N=Nbar)
+        solutions[iL] = add_macro2minimizer(XiL, E)
+        results[iL] = {'cb': cb, 'info': info}
+    print cb
+    if in_worker(): # the operators are not sent back
+        cb.detach()
+    return solutions, results
+
+
+def solve_system(pb, Afun, EN, x0, A, GN, precond=None, lowprec=None,
+                 recycle=None):
+    """
+    It solves the system Afun(X) = -Afun(EN) for the macroscopic load EN in
+    the precision according to pb.solve['precision'], see get_precision;
+    lowprec stores the operator (Afun) and preconditioner (precond) acting
+    on vectors of single precision, and recycle is the recycled subspace of
+    solver, see get_recycle.
+
+    Returns
+    -------
+    X : VecTri
+        solution in double precision
+    cb : CallBack
+        callback of solver
+    info : dict
+        results of solver
+    """
+    precision = get_precision(pb)
+    if precision == 'single':
+        Afun, precond = lowprec['Afun'], lowprec['precond']
+        EN = EN.astype(np.float32)
+        x0 = x0.astype(np.float32)
+    B = Afun(-EN) # RHS
+    cb = get_callback(pb, Afun, B, EN, A, GN)
+
+    print 'solver : %s' % pb.solver['kind']
+    par = pb.solver
+    if precision != 'double':
+        print 'precision : %s' % precision
+    if precision == 'single':
+        # the residual cannot be reduced below round-off of single precision
+        tol = 1e2*np.finfo(np.float32).eps*B.norm()
+        if 'tol' in par and par['tol'] < tol:
+            print 'tolerance is limited by single precision to %g' % tol
+            par = dict(par, tol=tol)
+    if precision == 'mixed':
+        X, info = refinement(solver=pb.solver['kind'], Afun=Afun, B=B,
+                             x0=x0, par=par, callback=cb,
+                             Afun_low=lowprec['Afun'],
+                             precond=lowprec['precond'], dtype=np.float32,
+                             recycle=recycle)
+    else:
+        X, info = linear_solver(solver=pb.solver['kind'], Afun=Afun, B=B,
+                                x0=x0, par=par, callback=cb,
+                                precond=precond, recycle=recycle)
+    if precision != 'double':
+        # round-off of single precision out of the range of projection GN
+        # would affect the homogenized matrices linearly
+        X = GN(X.astype(np.float64))
+    return X, cb, info
+
+
+def get_initial(pb, GN, N, D, primaldual):
+    """
+    It returns the initial approximations of solvers for D macroscopic loads
+    from the solutions pb.initial, i.e. from coarse grids or from previous
+    problem (see Problem.solve_coarse and Problem.get_solutions), or None.
+    The solutions are transferred to N-sized grid by Fourier zero-padding
+    (VecTri.enlarge) or truncation (VecTri.decrease) and projected by GN,
+    which also omits the macroscopic loads.
+    """
+    if pb.initial is None or primaldual not in pb.initial:
+        return None
+    print 'initial approximations from grid %s' % \
+        str(pb.initial[primaldual][0].N)
+    initial = []
+    for X in pb.initial[primaldual]:
+        if X.d != D:
+            raise ValueError("The initial approximation of dimension %d "
+                             "does not fit the problem!" % X.d)
+        X = X.decrease(np.minimum(X.N, N)).enlarge(N)
+        x0 = GN(X)
+        x0.name = 'x0'
+        initial.append(x0)
+    return initial
+
+
+def switch_formulation(pb, A, solutions, G1N, G2N, primaldual,
+                       recycle=None):
+    """
+    It transfers the solutions of formulation primaldual (with material
+    coefficients A) to the other formulation, which is solved next.
+
+    For pb.solve['x0'] = 'primaldual', the fluxes A*X of solutions X
+    (strains for the dual formulation) combined to unit mean values are
+    the initial approximations of the other formulation, see get_initial;
+    they are exact for the scheme GaNi, where the primal and dual solutions
+    coincide. The recycled subspace of solver (recycle) is mapped by GN*A,
+    where GN is the projection of the other formulation; it is cleared for
+    the scheme Ga, where the dual coefficients are not the inverse of
+    the primal ones.
+    """
+    if primaldual == 'primal':
+        other, GN = 'dual', G2N
+    else:
+        other, GN = 'primal', G1N
+
+    if 'x0' in pb.solve and pb.solve['x0'] == 'primaldual':
+        print 'initial approximations of %s from %s solutions' \
+            % (other, primaldual)
+        fluxes = [A(X) for X in solutions]
+        AH = np.array([F.mean() for F in fluxes]).T
+        C = np.linalg.inv(AH)
+        initial = []
+        for iL in np.arange(len(solutions)):
+            val = np.zeros_like(fluxes[0].val)
+            for jL in np.arange(len(solutions)):
+                val += C[jL, iL]*fluxes[jL].val
+            initial.append(VecTri(name='X', val=val, N=fluxes[0].N))
+        if pb.initial is None:
+            pb.initial = {}
+        pb.initial[other] = initial
+
+    if recycle is None:
+        pass
+    elif pb.solve['kind'] == 'GaNi':
+        recycle.transform(lambda X: GN(A(X)))
+    else:
+        recycle.clear()
+
+
+def get_processes(pb):
+    """
+    It returns the no. of processes pb.solve['processes'] (1 by default),
+    in which the loads are solved in parallel, see solve_loads.
+    """
+    if 'processes' in pb.solve:
+        return int(pb.solve['processes'])
+    return 1
+
+
+def solve_together(pb, recycle=None):
+    """
+    It returns True, if the loads of the primal and dual formulations are
+    solved together in parallel processes (see solve_loads), i.e. if none
+    of the formulations provides the initial approximations
+    (pb.solve['x0'] = 'primaldual') or the recycled subspace of solver
+    (recycle) for the other one, see switch_formulation.
+    """
+    if get_processes(pb) <= 1 or len(pb.solve['primaldual']) <= 1:
+        return False
+    if recycle is not None:
+        return False
+    return not ('x0' in pb.solve and pb.solve['x0'] == 'primaldual')
+
+
+def get_cache(pb):
+    """
+    It returns the persistent cache (see general.cache.Cache) of projection
+    kernels and of material coefficients for the scheme Ga according to
+    pb.solve['cache'], which is
+        False (default) : no cache, None is returned
+        True : the cache in the default (user cache) directory
+        dict : the parameters of cache, e.g.
+            {'directory': '/tmp/cache', 'max_size': 2**30}
+    """
+    if 'cache' not in pb.solve or not pb.solve['cache']:
+        return None
+    elif pb.solve['cache'] is True:
+        return Cache()
+    return Cache(**pb.solve['cache'])
+
+
+def get_recycle(pb):
+    """
+    It returns the recycled subspace of solvers 'CG' and 'PCG' with
+    pb.solver['recycle'] vectors (see general.solver.Recycle), which is
+    shared by the macroscopic loads and by the primal and dual formulations,
+    or None (default).
+    """
+    if 'recycle' not in pb.solver or not pb.solver['recycle']:
+        return None
+    if pb.solver['kind'] not in ['CG', 'PCG']:
+        raise NotImplementedError("The recycling is not implemented for "
+                                  "solver (%s)!" % pb.solver['kind'])
+    return Recycle(pb.solver['recycle'])
+
+
+def get_precision(pb):
+    """
+    It returns the floating point precision of solver according to
+    pb.solve['precision'], which is
+        'double' (default) : the iterations in float64/complex128
+        'single' : the iterations in float32/complex64; the solutions are
+            converted to double precision for postprocessing, so the
+            tolerance is limited by single precision
+        'mixed' : iterative refinement, i.e. the corrections are solved in
+            single precision and the residuals are evaluated in double
+            precision, see general.solver.refinement
+    """
+    if 'precision' in pb.solve:
+        precision = pb.solve['precision']
+    else:
+        precision = 'double'
+    if precision not in ['double', 'single', 'mixed']:
+        raise NotImplementedError("The precision (%s) is not implemented!"
+                                  % str(precision))
+    return precision
+
+
+def get_callback(pb, Afun, B, EN, A, GN):
+    """
+    It returns the callback of solver according to pb.solver['callback'],
+    which is
+        'light' (default) : norms of residuals provided by solver
+        'residual' : norms of true residuals B - Afun(x), which are evaluated
+            at every iteration by an additional matrix-vector multiplication
+        'detailed' : residuals, guaranteed bounds, and distance from subspace
+            of compatible fields, see CallBack_GA
+    """
+    if 'callback' not in pb.solver or pb.solver['callback'] == 'light':
+        cb = CallBack(A=Afun, B=B)
+    elif pb.solver['callback'] == 'residual':
+        cb = CallBack(A=Afun, B=B, verify=True)
+    elif pb.solver['callback'] == 'detailed':
+        cb = CallBack_GA(A=Afun, B=B, E2N=EN, Aex=A, GN=GN)
+    else:
+        raise NotImplementedError("The solver callback (%s) is not \
+            implemented" % (pb.solver['callback']))
+    return cb
+
+
+def get_preconditioner(pb, A, mat, hGN, FN, FiN, Nbar, primaldual):
+    """
+    It returns the preconditioner of the solver 'PCG' according to
+    pb.solver['precond'], which is
+        'Jacobi' (default for GaNi) : GN*inv(A)*GN with the inverse of
+            material coefficients evaluated in real space point by point,
+            where GN is the projection FiN*hGN*FN; it is only recommended for
+            high contrast with GaNi, since the coefficients of Ga are not
+            positive definite point by point
+        'Green' (default for Ga) : Green operator of reference medium with
+            coefficients equal to the geometric mean of the material
+            (Material.get_A_ref), see projections.GreenOperator; it pays off
+            for anisotropic coefficients (common to the phases) and for
+            elasticity, while for isotropic coefficients of scalar problems
+            it only rescales the system
+    None is returned for other solvers.
+    """
+    if pb.solver['kind'] != 'PCG':
+        return None
+    if 'precond' in pb.solver:
+        precond = pb.solver['precond']
+    elif pb.solve['kind'] == 'Ga':
+        precond = 'Green'
+    else:
+        precond = 'Jacobi'
+
+    if precond == 'Jacobi':
+        # the residuals are in the range of GN, so it is not applied twice
+        return GAOper(name='Jacobi', A=A.inv(), hGN=hGN, FN=FN, FiN=FiN)
+    elif precond == 'Green':
+        # the reference medium approximates A (primal) or inv(A) (dual)
+        # for both formulations, see GreenOperator
+        A0 = mat.get_A_ref(pb.solve['N'])
+        if primaldual == 'primal':
+            kind = 'G1'
+        else:
+            kind = 'G2'
+        hGreen = proj.GreenOperator(pb.solve['N'], pb.Y, A0,
+                                    physics=pb.physics, kind=kind,
+                                    centered=False, halfspec=True, NyqNul=True)
+        hGreen = hGreen.enlarge(Nbar)
+        return LinOper(name='Green', mat=[[FiN, hGreen, FN]]).compile()
+    else:
+        raise NotImplementedError("The preconditioner (%s) is not "
+                                  "implemented!" % str(precond))
+
+
+def get_operators(pb):
+    """
+    It returns the operators depending only on the grid, i.e. on the size of
+    grid pb.solve['N'], the size of PUC pb.Y, and on the physics: the sizes of
+    grids (Nbar, Nsol, see get_solution_grid), the Fourier projections (hG1N,
+    hG2N, see get_projections), the DFTs (FN, FiN) and the projections acting
+    in real space (G1N, G2N), and the coordinates of grid points for
+    the scheme GaNi (coord).
+
+    The operators shared by the problems of a parameter sweep (pb.operators,
+    see problem.sweep) are returned, if they are set.
+    """
+    if pb.operators is not None:
+        ops = pb.operators
+        if not (np.array_equal(ops['N'], pb.solve['N'])
+                and np.allclose(ops['Y'], pb.Y)
+                and ops['physics'] == pb.physics):
+            raise ValueError("The shared operators do not fit the problem!")
+        return ops
+
+    if pb.solve['kind'] == 'GaNi':
+        Nbar = pb.solve['N']
+        coord = Grid.get_coordinates(pb.solve['N'], pb.Y)
+    elif pb.solve['kind'] == 'Ga':
+        Nbar = 2*pb.solve['N'] - 1
+        coord = None
+    else:
+        raise ValueError("Not implemented kind of scheme (%s)."
+                         % pb.solve['kind'])
+    # grid of unknowns
+    Nsol = get_solution_grid(pb, Nbar)
+
+    # Fourier projections
+    hG1N, hG2N = get_projections(pb, Nsol)
+
+    FN = DFT(name='FN', inverse=False, N=Nsol, halfspec=True, centered=False,
+             **get_fft_par(pb.solver))
+    FiN = DFT(name='FiN', inverse=True, N=Nsol, halfspec=True, centered=False,
+              **get_fft_par(pb.solver))
+
+    G1N = LinOper(name='G1', mat=[[FiN, hG1N, FN]]).compile()
+    G2N = LinOper(name='G2', mat=[[FiN, hG2N, FN]]).compile()
+    return {'N': pb.solve['N'], 'Y': pb.Y, 'physics': pb.physics,
+            'Nbar': Nbar, 'Nsol': Nsol, 'hG1N': hG1N, 'hG2N': hG2N,
+            'FN': FN, 'FiN': FiN, 'G1N': G1N, 'G2N': G2N, 'coord': coord}
+
+
+def get_solution_grid(pb, Nbar):
+    """
+    It returns the size of grid of unknowns. For the scheme with exact
+    integration (Ga), the unknowns are stored on the N-sized grid by default,
+    where the material coefficients on the Nbar-sized grid act as GaMatrix;
+    pb.solve['grid'] = 'Nbar' stores the unknowns on the Nbar-sized grid.
+    """
+    if 'grid' in pb.solve:
+        grid = pb.solve['grid']
+    else:
+        grid = 'N'
+    if grid not in ['N', 'Nbar']:
+        raise NotImplementedError("The grid (%s) is not implemented!"
+                                  % str(grid))
+    if pb.solve['kind'] == 'Ga' and grid == 'N':
+        return pb.solve['N']
+    return Nbar
+
+
+def get_material_operator(pb, A, Nsol):
+    """
+    It returns the material coefficients A acting on the unknowns of
+    Nsol-sized grid, see get_solution_grid.
+    """
+    if np.allclose(A.N, Nsol):
+        return A
+    return GaMatrix(A=A, N=Nsol, **get_fft_par(pb.solver))
+
+
+def get_projections(pb, Nbar):
+    """
+    It returns the Fourier projections on compatible (hG1N) and equilibrated
+    (hG2N) fields acting on the uncentered half-spectrum of Nbar-sized grid.
+    By default, the projections are matrix-free (ProjectionOperator); the
+    kernels stored as Matrix are used for pb.solve['projection'] = 'kernel',
+    which can be stored in the persistent cache (see get_cache).
+    """
+    if 'projection' in pb.solve:
+        projection = pb.solve['projection']
+    else:
+        projection = 'operator'
+
+    if projection == 'operator':
+        hG1N = proj.ProjectionOperator(pb.solve['N'], pb.Y, physics=pb.physics,
+                                       kind='G1', centered=False,
+                                       halfspec=True, NyqNul=True)
+        hG2N = proj.ProjectionOperator(pb.solve['N'], pb.Y, physics=pb.physics,
+                                       kind='G2', centered=False,
+                                       halfspec=True, NyqNul=True)
+    elif projection == 'kernel':
+        par = {'N': pb.solve['N'], 'Y': pb.Y, 'centered': False,
+               'NyqNul': True, 'halfspec': True}
+        if pb.physics == 'scalar':
+            fun = proj.scalar
+        elif pb.physics == 'elasticity':
+            fun = proj.elasticity
+        cache = get_cache(pb)
+        if cache is None:
+            kernels = fun(**par)
+        else:
+            key = dict(par, name='projections.%s' % pb.physics)
+            kernels = cache.get(key, lambda: fun(**par),
+                                modules=['homogenize.projections',
+                                         'homogenize.matvec',
+                                         'homogenize.matvec_fun',
+                                         'homogenize.fft_backends'])
+
+        if pb.physics == 'scalar':
+            _, hG1N, hG2N = kernels
+        elif pb.physics == 'elasticity':
+            _, hG1hN, hG1sN, hG2hN, hG2sN = kernels
+            # the sums of kernels are merged into one kernel
+            hG1N = LinOper(name='hG1', mat=[[hG1hN], [hG1sN]]).compile()
+            hG2N = LinOper(name='hG2', mat=[[hG2hN], [hG2sN]]).compile()
+    else:
+        raise NotImplementedError("The projection (%s) is not implemented!"
+                                  % str(projection))
+
+    hG1N = hG1N.enlarge(Nbar)
+    hG2N = hG2N.enlarge(Nbar)
+    return hG1N, hG2N
+
+
+def get_fft_par(solver):
+    """
+    It returns the parameters of FFT backend from the solver definition, e.g.
+    solver = {'kind': 'CG', 'fft': 'pyfftw', 'threads': 4}.
+    """
+    par = {'backend': 'numpy',
+           'threads': 1}
+    if 'fft' in solver:
+        par['backend'] = solver['fft']
+    if 'threads' in solver:
+        par['threads'] = solver['threads']
+    return par
+
 
 if __name__ == '__main__':
     execfile('../main_test.py')
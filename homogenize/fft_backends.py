@@ -0,0 +1,267 @@
+"""
+This module contains the backends providing FFT routines for the class DFT.
+
+The backends create plans for particular transforms, i.e. for a shape and
+dtype of input array, a direction of transform, and a size of the transform;
+the plans are cached and reused by all DFT objects sharing the backend.
+
+The plans are called as plan(x, out=None); if the array out is provided, the
+result is stored in it. The backends with direct_out = True write the result
+into out directly, the others copy it there from a temporary array.
+"""
+
+import numpy as np
+
+
+class FFTBackend():
+    """
+    General FFT backend with a cache of plans
+
+    Parameters
+    ----------
+    threads : int
+        number of threads used by the transforms (if supported by backend)
+    """
+    name = 'general'
+    direct_out = False
+
+    def __init__(self, threads=1):
+        self.threads = int(threads)
+        self.plans = {}
+
+    def get_plan(self, shape, dtype, direction, N):
+        """
+        It returns the (cached) plan of the transform.
+
+        Parameters
+        ----------
+        shape : tuple
+            shape of input array
+        dtype : numpy.dtype
+            data type of input array
+        direction : str
+            one of 'fftn', 'ifftn', 'rfftn', 'irfftn'
+        N : numpy.ndarray
+            size of the transform over the last np.size(N) axes
+
+        Returns
+        -------
+        plan : function
+            callable plan(x, out=None) that transforms an input array of given
+            shape and dtype
+        """
+        key = (tuple(shape), np.dtype(dtype).char, direction,
+               tuple(np.array(N, dtype=np.int32)))
+        if key not in self.plans:
+            axes = tuple(range(-np.size(N), 0))
+            self.plans[key] = self.create_plan(shape, dtype, direction,
+                                               tuple(N), axes)
+        return self.plans[key]
+
+    def create_plan(self, shape, dtype, direction, N, axes):
+        raise NotImplementedError()
+
+    def empty(self, shape, dtype):
+        """
+        It returns an uninitialized array suitable as the output (out) of
+        plans, e.g. a reusable buffer.
+        """
+        return np.empty(shape, dtype=dtype)
+
+    @staticmethod
+    def get_result_dtype(dtype, direction):
+        """
+        It returns the data type of the result of transform, which keeps the
+        precision of input, e.g. complex64 for rfftn of float32.
+        """
+        ctype = np.result_type(dtype, np.complex64)
+        if direction == 'irfftn':
+            return np.finfo(ctype).dtype
+        return ctype
+
+    @staticmethod
+    def store(Fx, out):
+        """
+        It stores the result Fx of transform to out (if provided).
+        """
+        if out is None:
+            return Fx
+        out[...] = Fx
+        return out
+
+    def __getstate__(self):
+        # plans are not picklable; they are created again on demand
+        return {'threads': self.threads}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        ss = "Class : %s\n" % (self.__class__.__name__,)
+        ss += '    threads = %d\n' % self.threads
+        ss += '    no. of plans = %d\n' % len(self.plans)
+        return ss
+
+
+class NumpyFFT(FFTBackend):
+    """
+    FFT backend based on numpy.fft (single thread, no planning); the
+    transforms are computed in double precision and the results are cast
+    to the precision of input
+    """
+    name = 'numpy'
+
+    def create_plan(self, shape, dtype, direction, N, axes):
+        fun = getattr(np.fft, direction)
+        store = self.store
+        rtype = self.get_result_dtype(dtype, direction)
+
+        def plan(x, out=None):
+            return store(np.asarray(fun(x, N, axes=axes), dtype=rtype), out)
+        return plan
+
+
+class ScipyFFT(FFTBackend):
+    """
+    FFT backend based on scipy.fftpack (single thread, no planning), which
+    keeps single precision; the real transforms (rfftn, irfftn) are composed
+    of the real transform along the last axis (fftpack.rfft, fftpack.irfft)
+    and the complex transforms along the other axes
+    """
+    name = 'scipy'
+
+    def __init__(self, threads=1):
+        import scipy.fftpack
+        self.module = scipy.fftpack
+        FFTBackend.__init__(self, threads=threads)
+
+    def create_plan(self, shape, dtype, direction, N, axes):
+        fftpack = self.module
+        store = self.store
+        rtype = self.get_result_dtype(dtype, direction)
+        n = N[-1]
+        m = (n-1)//2 # no. of complex coefficients packed by fftpack.rfft
+
+        if direction in ['fftn', 'ifftn']:
+            fun = getattr(fftpack, direction)
+
+            def plan(x, out=None):
+                Fx = np.asarray(fun(x, shape=N, axes=axes), dtype=rtype)
+                return store(Fx, out)
+
+        elif direction == 'rfftn':
+            def plan(x, out=None):
+                r = fftpack.rfft(x, n, axis=-1)
+                Fx = np.empty(r.shape[:-1] + (n//2+1,), dtype=rtype)
+                Fx[..., 0] = r[..., 0]
+                Fx.real[..., 1:m+1] = r[..., 1:2*m:2]
+                Fx.imag[..., 1:m+1] = r[..., 2:2*m+1:2]
+                if n % 2 == 0:
+                    Fx[..., -1] = r[..., -1]
+                if len(N) > 1:
+                    Fx = fftpack.fftn(Fx, shape=N[:-1], axes=axes[:-1],
+                                      overwrite_x=True)
+                return store(Fx, out)
+
+        elif direction == 'irfftn':
+            def plan(x, out=None):
+                if len(N) > 1:
+                    x = fftpack.ifftn(x, shape=N[:-1], axes=axes[:-1])
+                r = np.empty(x.shape[:-1] + (n,), dtype=rtype)
+                r[..., 0] = x[..., 0].real
+                r[..., 1:2*m:2] = x[..., 1:m+1].real
+                r[..., 2:2*m+1:2] = x[..., 1:m+1].imag
+                if n % 2 == 0:
+                    r[..., -1] = x[..., n//2].real
+                return store(fftpack.irfft(r, n, axis=-1, overwrite_x=True),
+                             out)
+
+        else:
+            raise NotImplementedError("The transform (%s) is not supported!"
+                                      % direction)
+        return plan
+
+
+class PyFFTW(FFTBackend):
+    """
+    FFT backend based on planned transforms of pyFFTW
+    """
+    name = 'pyfftw'
+    direct_out = True
+
+    def __init__(self, threads=1, planner_effort='FFTW_MEASURE'):
+        try:
+            import pyfftw.builders
+        except ImportError:
+            raise ImportError("The FFT backend 'pyfftw' requires pyFFTW!")
+        self.builders = pyfftw.builders
+        self.empty_aligned = pyfftw.empty_aligned
+        self.planner_effort = planner_effort
+        FFTBackend.__init__(self, threads=threads)
+
+    def __getstate__(self):
+        return {'threads': self.threads,
+                'planner_effort': self.planner_effort}
+
+    def create_plan(self, shape, dtype, direction, N, axes):
+        x = self.empty_aligned(shape, dtype=dtype)
+        fftw = getattr(self.builders, direction)(
+            x, N, axes=axes, threads=self.threads,
+            planner_effort=self.planner_effort)
+
+        # the FFTW object is shared by all callers, so it works on its own
+        # arrays; the input is always copied, because the c2r transforms
+        # (irfftn) overwrite their input
+        own_in = fftw.input_array
+        own_out = fftw.output_array
+
+        def plan(x, out=None):
+            own_in[...] = x
+            if out is None:
+                fftw()
+                return own_out.copy()
+            try:
+                # out is aligned if it is created by method empty; it is
+                # attached only for this call
+                fftw.update_arrays(own_in, out)
+            except ValueError: # not aligned
+                fftw()
+                out[...] = own_out
+                return out
+            try:
+                fftw()
+            finally:
+                fftw.update_arrays(own_in, own_out)
+            return out
+        return plan
+
+    def empty(self, shape, dtype):
+        return self.empty_aligned(shape, dtype=dtype)
+
+
+fft_backends = {'numpy': NumpyFFT,
+                'scipy': ScipyFFT,
+                'pyfftw': PyFFTW}
+
+_backend_instances = {}
+
+
+def get_fft_backend(name='numpy', threads=1):
+    """
+    It returns a backend from the registry (fft_backends); the instances are
+    shared for the same name and number of threads, so are their plans.
+    """
+    if name not in fft_backends:
+        msg = "The FFT backend (%s) is not supported!" % str(name)
+        raise NotImplementedError(msg)
+    key = (name, int(threads))
+    if key not in _backend_instances:
+        _backend_instances[key] = fft_backends[name](threads=threads)
+    return _backend_instances[key]
+
+
+def register_fft_backend(name, backend):
+    """
+    It registers a new FFT backend, i.e. a subclass of FFTBackend.
+    """
+    fft_backends[name] = backend
@@ -1,17 +1,28 @@
 import numpy as np
 import scipy.special as sp
-from homogenize.matvec import DFT, VecTri, Matrix
-from homogenize.matvec_fun import Grid, decrease
+from collections import OrderedDict
+from homogenize.matvec import (DFT, VecTri, Matrix, SymMatrix, PhaseMatrix,
+                               DiagMatrix)
+from homogenize.matvec_fun import (Grid, decrease, get_structure,
+                                   get_sym_indices, pack_sym)
 
 
 inclusion_keys = {'ball': ['ball', 'circle'],
                   'cube': ['cube', 'square']}
 
+# modules evaluating the coefficients stored in the persistent cache
+code_modules = ['homogenize.materials', 'homogenize.matvec',
+                'homogenize.matvec_fun', 'homogenize.fft_backends']
+
 
 class Material():
 
-    def __init__(self, material_conf):
+    def __init__(self, material_conf, cache=None, max_memory=2**29):
         self.conf = material_conf
+        self.cache = cache
+        # memoized coefficients (see memoize)
+        self.memo = OrderedDict()
+        self.max_memory = max_memory
         self.Y = material_conf['Y']
 
         # control the correctness of material definition
@@ -37,7 +48,10 @@ class Material():
                 param = self.conf['params'][ii]
                 position = self.conf['positions'][ii]
                 try:
-                    if any(np.greater(param, self.Y)):
+                    if incl in inclusion_keys['ball']:
+                        # diameters of one or several balls
+                        param = np.reshape(param, (-1, 1))
+                    if np.any(np.greater(param, self.Y)):
                         raise ValueError("Improper parameters of inclusion!")
 
                     self.conf['positions'][ii] = position % self.Y
@@ -47,8 +61,33 @@ class Material():
         else:
             raise NotImplementedError("Improper material definition!")
 
-#     def get_A_Ga(self, Nbar, order=None, M=None, primaldual='primal'):
     def get_A_Ga(self, Nbar, primaldual='primal', order=None, P=None):
+        """
+        Returns stiffness matrix for scheme with exact integration; it is
+        memoized (see memoize) and loaded from the persistent cache
+        (self.cache, see general.cache.Cache) if it has been already
+        assembled (assemble_A_Ga).
+        """
+        if order is None and 'order' in self.conf:
+            order = self.conf['order']
+        if order is not None and P is None and 'P' in self.conf:
+            P = self.conf['P']
+
+        def load():
+            if self.cache is None or 'fun' in self.conf:
+                return self.assemble_A_Ga(Nbar, primaldual, order, P)
+            key = {'name': 'Material.get_A_Ga', 'material': self.conf,
+                   'Nbar': Nbar, 'primaldual': primaldual, 'order': order,
+                   'P': P}
+            return self.cache.get(key, lambda: self.assemble_A_Ga(
+                Nbar, primaldual, order, P), modules=code_modules)
+
+        key = ('Ga', tuple(np.reshape(Nbar, -1)), primaldual, order,
+               None if P is None else tuple(np.reshape(P, -1)))
+        return self.memoize(key, load)
+
+#     def get_A_Ga(self, Nbar, order=None, M=None, primaldual='primal'):
+    def assemble_A_Ga(self, Nbar, primaldual='primal', order=None, P=None):
         """ Returns stiffness matrix for scheme with exact integration."""
 
         if order is None and 'order' in self.conf:
@@ -56,14 +95,13 @@ class Material():
 
         if order is None:
             shape_funs = self.get_shape_functions(Nbar)
-            val = np.zeros(self.conf['vals'][0].shape + shape_funs[0].shape)
+            vals = []
             for ii in range(len(self.conf['inclusions'])):
                 if primaldual is 'primal':
-                    Aincl = self.conf['vals'][ii]
+                    vals.append(self.conf['vals'][ii])
                 elif primaldual is 'dual':
-                    Aincl = np.linalg.inv(self.conf['vals'][ii])
-                val += np.einsum('ij...,k...->ijk...', Aincl, shape_funs[ii])
-            return Matrix(name='A_Ga', val=val, Fourier=False)
+                    vals.append(np.linalg.inv(self.conf['vals'][ii]))
+            return sum_inclusions(vals, shape_funs, name='A_Ga')
 
         else:
             if P is None and 'P' in self.conf:
@@ -80,58 +118,159 @@ class Material():
             elif order in [1, 'bilinear']:
                 Wraw = get_weights_lin(h, Nbar, self.Y)
 
-            Aapp = np.zeros(np.hstack([dim, dim, Nbar]))
-            for m in np.arange(dim):
-                for n in np.arange(dim):
-                    hAM0 = DFT.fftnc(vals[m, n], P)
-                    if np.allclose(P, Nbar):
-                        hAM = hAM0
-                    elif np.all(np.greater_equal(P, Nbar)):
-                        hAM = decrease(hAM0, Nbar)
-                    elif np.all(np.less(P, Nbar)):
-                        factor = np.ceil(np.array(Nbar, dtype=np.float64) / P)
-                        hAM0per = np.tile(hAM0, 2*factor-1)
-                        hAM = decrease(hAM0per, Nbar)
-                    else:
-                        raise ValueError()
-
-                    pNbar = np.prod(Nbar)
-                    """ if DFT is normalized in accordance with articles there
-                    should be np.prod(M) instead of np.prod(Nbar)"""
-                    Aapp[m, n] = np.real(pNbar*DFT.ifftnc(Wraw*hAM, Nbar))
+            # only the diagonal (or the upper triangle) is approximated for
+            # diagonal (or symmetric) coefficients
+            structure = self.get_structure()
+            if structure == 'full':
+                Aapp = np.zeros(np.hstack([dim, dim, Nbar]))
+                ind = [(m, n) for m in np.arange(dim) for n in np.arange(dim)]
+            elif structure == 'symmetric':
+                ind = list(zip(*get_sym_indices(dim)))
+                Aapp = np.zeros(np.hstack([len(ind), Nbar]))
+            else:
+                if structure == 'isotropic':
+                    Aapp = np.zeros(np.hstack([1, Nbar]))
+                else:
+                    Aapp = np.zeros(np.hstack([dim, Nbar]))
+                ind = [(m, m) for m in np.arange(Aapp.shape[0])]
+
+            for k, (m, n) in enumerate(ind):
+                hAM0 = DFT.fftnc(vals[m, n], P)
+                if np.allclose(P, Nbar):
+                    hAM = hAM0
+                elif np.all(np.greater_equal(P, Nbar)):
+                    hAM = decrease(hAM0, Nbar)
+                elif np.all(np.less(P, Nbar)):
+                    factor = np.ceil(np.array(Nbar, dtype=np.float64) / P)
+                    hAM0per = np.tile(hAM0, 2*factor-1)
+                    hAM = decrease(hAM0per, Nbar)
+                else:
+                    raise ValueError()
+
+                pNbar = np.prod(Nbar)
+                """ if DFT is normalized in accordance with articles there
+                should be np.prod(M) instead of np.prod(Nbar)"""
+                hA = np.real(pNbar*DFT.ifftnc(Wraw*hAM, Nbar))
+                if structure == 'full':
+                    Aapp[m, n] = hA
+                else:
+                    Aapp[k] = hA
 
             name = 'A_Ga_o%d_P%d' % (order, P.max())
-            return Matrix(name=name, val=Aapp, Fourier=False)
+            if structure == 'full':
+                return Matrix(name=name, val=Aapp, Fourier=False)
+            elif structure == 'symmetric':
+                return SymMatrix(name=name, val=Aapp, d=dim)
+            else:
+                return DiagMatrix(name=name, val=Aapp, d=dim)
+
+    def get_structure(self):
+        """
+        It returns the structure of coefficients of inclusions (vals), i.e.
+        'isotropic', 'diagonal', 'symmetric', or 'full' (also for materials
+        given by fun).
+        """
+        if 'vals' not in self.conf:
+            return 'full'
+        return get_structure(np.array(self.conf['vals'], dtype=np.float64))
+
+    def get_A_GaNi(self, N, primaldual='primal', coord=None):
+        """
+        Returns the coefficients at grid points for the scheme with numerical
+        integration; the coordinates of grid points (coord) can be passed
+        when they are shared, e.g. by a parameter sweep.
+        """
+        def evaluate():
+            if coord is None:
+                A = self.evaluate(Grid.get_coordinates(N, self.Y))
+            else:
+                A = self.evaluate(coord)
+            if primaldual == 'dual':
+                A = A.inv()
+            return A
+
+        return self.memoize(('GaNi', tuple(np.reshape(N, -1)), primaldual),
+                            evaluate)
+
+    def get_A_ref(self, N):
+        """
+        It returns the coefficients of homogeneous reference medium, i.e.
+        the geometric mean (get_geometric_mean) of coefficients at the points
+        of N-sized grid (get_A_GaNi); it serves both formulations, since
+        the geometric mean of the inverse coefficients is the inverse of
+        the geometric mean.
+        """
+        return get_geometric_mean(self.get_A_GaNi(N, 'primal'))
+
+    def memoize(self, key, fun):
+        """
+        It returns the coefficients evaluated as fun() and stored under
+        the key, e.g. ('GaNi', N, primaldual), so that the repeated
+        evaluations (by postprocessing or for several formulations) are free.
 
-    def get_A_GaNi(self, N, primaldual='primal'):
-        coord = Grid.get_coordinates(N, self.Y)
-        A = self.evaluate(coord)
-        if primaldual is 'dual':
-            A = A.inv()
+        The least recently used coefficients are dropped when their memory
+        exceeds self.max_memory (in bytes); the coefficients are shared, so
+        they must not be modified in place.
+        """
+        if key in self.memo:
+            A = self.memo.pop(key)
+            self.memo[key] = A
+            return A
+
+        A = fun()
+        size = get_nbytes(A)
+        if size > self.max_memory:
+            return A
+        self.memo[key] = A
+        while sum([get_nbytes(val) for val in self.memo.values()]) \
+                > self.max_memory:
+            self.memo.popitem(last=False)
         return A
 
     def get_shape_functions(self, N2):
+        """
+        It evaluates the characteristic functions of inclusions as
+        trigonometric polynomials of size N2 from their exact Fourier
+        coefficients.
+
+        An inclusion can stand for a group of n inclusions sharing material
+        coefficients, with positions of shape (n, d) and params of shape
+        (n, d) for cubes or (n,) for balls.
+        """
         N2 = np.array(N2, dtype=np.int32)
         inclusions = self.conf['inclusions']
         params = self.conf['params']
         positions = self.conf['positions']
+        dim = N2.size
         chars = []
         for ii, incl in enumerate(inclusions):
-            position = positions[ii]
-            if isinstance(position, np.ndarray):
-                SS = get_shift_inclusion(N2, position, self.Y)
-
             if incl in inclusion_keys['cube']:
-                h = params[ii]
-                Wraw = get_weights_con(h, N2, self.Y)
-                chars.append(np.real(DFT.ifftnc(SS*Wraw, N2))*np.prod(N2))
+                pos = np.reshape(positions[ii], (-1, dim))
+                h = np.array(params[ii], dtype=np.float64)
+                if h.ndim == 1:
+                    SS = get_shift_inclusions(N2, pos, self.Y)
+                    Wraw = get_weights_con(h, N2, self.Y)
+                    SSW = SS*Wraw
+                else: # sizes differ, weights enter the factors of shifts
+                    ZN2l = Grid.get_ZNl(N2)
+                    factors = [h[:, dd, np.newaxis]
+                               *np.sinc(np.multiply.outer(h[:, dd], ZN2l[dd])
+                                        /self.Y[dd])
+                               for dd in np.arange(dim)]
+                    SSW = get_shift_inclusions(N2, pos, self.Y, factors)
+                    SSW /= np.prod(self.Y)
+                chars.append(np.real(DFT.ifftnc(SSW, N2))*np.prod(N2))
             elif incl in inclusion_keys['ball']:
-                r = params[ii]/2
-                if r == 0:
-                    Wraw = np.zeros(N2)
-                else:
-                    Wraw = get_weights_circ(r, N2, self.Y)
-                chars.append(np.real(DFT.ifftnc(SS*Wraw, N2))*np.prod(N2))
+                pos = np.reshape(positions[ii], (-1, dim))
+                rs = np.reshape(params[ii], -1)/2.
+                SSW = np.zeros(N2, dtype=np.complex128)
+                # balls of the same radius share the weights
+                for r in np.unique(rs):
+                    if r == 0:
+                        continue
+                    SS = get_shift_inclusions(N2, pos[rs == r], self.Y)
+                    SSW += SS*get_weights_circ(r, N2, self.Y)
+                chars.append(np.real(DFT.ifftnc(SSW, N2))*np.prod(N2))
             elif incl == 'all':
                 chars.append(np.ones(N2))
             elif incl == 'otherwise':
@@ -156,23 +295,37 @@ class Material():
 
         Returns
         -------
-        A : numpy.array
-            material coefficients at coordinates (coord)
+        A : Matrix or PhaseMatrix
+            material coefficients at coordinates (coord); PhaseMatrix is
+            returned if every grid point lies in exactly one inclusion
         """
         if 'fun' in self.conf:
             fun = self.conf['fun']
             A_val = fun(coord)
         else:
-            A_val = np.zeros(self.conf['vals'][0].shape + coord.shape[1:])
-            topos = self.get_topologies(coord)
+            topos = np.array(self.get_topologies(coord))
+            if (np.all(np.logical_or(topos == 0, topos == 1))
+                    and np.all(np.sum(topos, axis=0) == 1)):
+                return PhaseMatrix(name='A_GaNi',
+                                   phases=np.argmax(topos, axis=0),
+                                   table=np.array(self.conf['vals'],
+                                                  dtype=np.float64))
 
-            for ii in np.arange(len(self.conf['inclusions'])):
-                A_val += np.einsum('ij...,k...->ijk...', self.conf['vals'][ii],
-                                   topos[ii])
+            return sum_inclusions(self.conf['vals'], topos, name='A_GaNi')
 
         return Matrix(name='A_GaNi', val=A_val, Fourier=False)
 
     def get_topologies(self, coord):
+        """
+        It evaluates the characteristic functions of inclusions at a grid of
+        coordinates (coord) produced by Grid.get_coordinates.
+
+        An inclusion can stand for a group of n inclusions sharing material
+        coefficients, with positions of shape (n, d) and params of shape
+        (n, d) for cubes or (n,) for balls; the characteristic function
+        then counts the inclusions covering a grid point. The inclusions
+        are rasterized by rasterize_inclusions.
+        """
         inclusions = self.conf['inclusions']
         params = self.conf['params']
         positions = self.conf['positions']
@@ -180,52 +333,30 @@ class Material():
         dim = coord.shape[0]
         topos = []
 
-        # periodically enlarge coordinates
-        N = np.array(coord.shape[1:])
-        cop = np.empty(np.hstack([dim, 3*N]))
-        mapY = np.array([-1, 0, 1])
+        # coordinates along individual axes of the tensor-product grid
+        x = []
         for dd in np.arange(dim):
-            Nshape = np.ones(dim, dtype=np.int32)
-            Nshape[dd] = 3*N[dd]
-            Nrep = 3*N
-            Nrep[dd] = 1
-            vec = np.repeat(mapY*self.Y[dd], N[dd])
-            Ymat = np.tile(np.reshape(vec, Nshape), Nrep)
-            cop[dd] = np.tile(coord[dd], 3*np.ones(dim)) + Ymat
-
-        mapY = np.array([-1, 0, 1])
-        Yiter = mapY[np.newaxis]
-        for ii in np.arange(1, dim):
-            Yiter = np.vstack([np.repeat(Yiter, 3, axis=1),
-                               np.tile(mapY, Yiter.shape[1])])
+            ind = [0]*dim
+            ind[dd] = slice(None)
+            x.append(coord[dd][tuple(ind)])
 
         for ii, kind in enumerate(inclusions):
 
             if kind in inclusion_keys['cube']:
-                param = np.array(params[ii], dtype=np.float64)
-                pos = np.array(positions[ii], dtype=np.float64)
-                topos.append(np.zeros(cop.shape[1:]))
-                for Ycoef in Yiter.T:
-                    Ym = self.Y*Ycoef
-                    topo_loc = np.ones(cop.shape[1:])
-                    for dd in np.arange(dim):
-                        topo_loc *= ((cop[dd]-pos[dd]+Ym[dd]) > -param[dd]/2)
-                        topo_loc *= ((cop[dd]-pos[dd]+Ym[dd]) <= param[dd]/2)
-                    topos[ii] += topo_loc
-                topos[ii] = decrease(topos[ii], N)
+                pos = np.reshape(np.array(positions[ii], dtype=np.float64),
+                                 (-1, dim))
+                sizes = np.array(params[ii], dtype=np.float64)
+                sizes = sizes*np.ones_like(pos)
+                topos.append(rasterize_inclusions(x, self.Y, pos, sizes,
+                                                  'cube'))
 
             elif kind in inclusion_keys['ball']:
-                pos = np.array(positions[ii], dtype=np.float64)
-                topos.append(np.zeros(cop.shape[1:]))
-                for Ycoef in Yiter.T:
-                    Ym = self.Y*Ycoef
-                    topo_loc = np.ones(cop.shape[1:])
-
-                    norm2 = 0. # square of norm
-                    for dd in np.arange(dim):
-                        norm2 += (cop[dd]-pos[dd]-Ym[dd])**2
-                    topos[ii] += (norm2**0.5 < params[ii]/2)
-                topos[ii] = decrease(topos[ii], N)
+                pos = np.reshape(np.array(positions[ii], dtype=np.float64),
+                                 (-1, dim))
+                sizes = np.reshape(np.array(params[ii], dtype=np.float64),
+                                   (-1, 1))*np.ones_like(pos)
+                topos.append(rasterize_inclusions(x, self.Y, pos, sizes,
+                                                  'ball'))
 
             elif kind == 'otherwise':
                 topos.append(np.ones(coord.shape[1:]))
@@ -241,6 +372,213 @@ class Material():
         return topos
 
 
+def get_nbytes(A):
+    """
+    It returns the no. of bytes of numpy arrays stored in the attributes of
+    coefficients (A), e.g. of Matrix or PhaseMatrix including its diagonal
+    (PhaseMatrix.diag).
+    """
+    nbytes = 0
+    for val in A.__dict__.values():
+        if isinstance(val, np.ndarray):
+            nbytes += val.nbytes
+        elif isinstance(val, DiagMatrix):
+            nbytes += get_nbytes(val)
+    return nbytes
+
+
+def get_geometric_mean(A, chunk=2**16):
+    """
+    It returns the (log-Euclidean) geometric mean expm(mean(logm(A))) of
+    symmetric positive definite coefficients A (Matrix, SymMatrix,
+    PhaseMatrix, or DiagMatrix) over grid points; the logarithms of general
+    coefficients are evaluated in chunks of grid points.
+    """
+    if isinstance(A, DiagMatrix):
+        diag = A.get_diag()
+        diag = np.reshape(diag, (diag.shape[0], -1))
+        if not np.all(diag > 0):
+            raise ValueError("The coefficients are not positive definite!")
+        return np.eye(A.d)*np.exp(np.mean(np.log(diag), axis=1))
+
+    if isinstance(A, PhaseMatrix):
+        vals = A.table[np.newaxis]
+        weights = A.counts()[np.newaxis]
+    else:
+        val = np.reshape(A.get_Matrix().val, (A.d, A.d, -1))
+        vals = [np.einsum('ijk->kij', val[:, :, ii:ii+chunk])
+                for ii in np.arange(0, val.shape[2], chunk)]
+        weights = [np.ones(vv.shape[0]) for vv in vals]
+
+    logA = np.zeros((A.d, A.d))
+    for vv, ww in zip(vals, weights):
+        w, U = np.linalg.eigh(vv)
+        if not np.all(w > 0):
+            raise ValueError("The coefficients are not positive definite!")
+        logA += np.einsum('k,kij,kj,klj->il', ww, U, np.log(w), U)
+    w, U = np.linalg.eigh(logA/np.sum([np.sum(ww) for ww in weights]))
+    return np.dot(U*np.exp(w), U.T)
+
+
+def sum_inclusions(vals, chars, name='A'):
+    """
+    It sums the coefficients of inclusions (vals) multiplied by their
+    characteristic functions (chars); the sum is DiagMatrix if all vals are
+    isotropic or diagonal, SymMatrix if they are symmetric, otherwise Matrix.
+    """
+    vals = np.array(vals, dtype=np.float64)
+    dim = vals.shape[1]
+    structure = get_structure(vals)
+    if structure == 'full':
+        A_val = np.zeros(vals.shape[1:] + chars[0].shape)
+        for ii in np.arange(vals.shape[0]):
+            A_val += np.einsum('ij...,k...->ijk...', vals[ii], chars[ii])
+        return Matrix(name=name, val=A_val, Fourier=False)
+    elif structure == 'symmetric':
+        packed = pack_sym(np.einsum('kij->ijk', vals))
+        A_val = np.zeros(packed.shape[:1] + chars[0].shape)
+        for ii in np.arange(vals.shape[0]):
+            A_val += np.einsum('i,...->i...', packed[:, ii], chars[ii])
+        return SymMatrix(name=name, val=A_val, d=dim)
+
+    diags = vals[:, np.arange(dim), np.arange(dim)]
+    if structure == 'isotropic':
+        diags = diags[:, :1]
+    A_val = np.zeros(diags.shape[1:] + chars[0].shape)
+    for ii in np.arange(vals.shape[0]):
+        A_val += np.einsum('i,...->i...', diags[ii], chars[ii])
+    return DiagMatrix(name=name, val=A_val, d=dim)
+
+
+def rasterize_inclusions(x, Y, positions, sizes, kind):
+    """
+    It evaluates the no. of inclusions covering the points of a periodic
+    tensor-product grid.
+
+    Only the grid points in the bounding boxes of inclusions are visited;
+    the inclusions are processed together in batches of equal bounding
+    boxes, so that the cost is proportional to the no. of the visited
+    points rather than to the no. of inclusions times the grid size.
+
+    Parameters
+    ----------
+    x : list of numpy.array
+        coordinates of grid points along individual axes
+    Y : numpy.array of shape (d,)
+        the size of periodic unit cell
+    positions : numpy.array of shape (n, d)
+        centres of inclusions
+    sizes : numpy.array of shape (n, d)
+        sides of cubes or diameters of balls (repeated along axes)
+    kind : 'cube' or 'ball'
+
+    Returns
+    -------
+    topo : numpy.array of shape N
+        the no. of inclusions covering individual grid points
+    """
+    dim = len(x)
+    N = np.array([xx.size for xx in x])
+    h = Y/N
+    x0 = np.array([xx[0] for xx in x])
+
+    # bounding boxes: first grid index and no. of grid points along axes
+    B = np.minimum(np.ceil(sizes/h).astype(np.int64) + 3, N)
+    start = np.floor((positions - sizes/2. - x0)/h).astype(np.int64)
+    start[B == N] = 0
+
+    # groups of equal bounding boxes; the rows of B are compared as single
+    # items of a void view (np.unique with axis requires numpy >= 1.13)
+    Bv = np.ascontiguousarray(B).view(np.dtype((np.void,
+                                                B.dtype.itemsize*dim)))
+    _, first, group = np.unique(Bv.ravel(), return_index=True,
+                                return_inverse=True)
+
+    topo = np.zeros(np.prod(N))
+    for gg, Bg in enumerate(B[first]):
+        ig = np.nonzero(group == gg)[0]
+        ind = 0 # flat indices of grid points
+        if kind == 'cube':
+            vals = 1.
+        elif kind == 'ball':
+            r2 = (sizes[ig, 0]/2.)**2
+            vals = 0. # square of minimum-image distance
+        for dd in np.arange(dim):
+            Yd = Y[dd]
+            shape = np.ones(dim+1, dtype=np.int64)
+            shape[0] = ig.size
+            shape[dd+1] = Bg[dd]
+            jj = (start[ig, dd, np.newaxis] + np.arange(Bg[dd])) % N[dd]
+            xloc = x[dd][jj] - positions[ig, dd, np.newaxis]
+            if kind == 'cube':
+                # no. of periodic images containing the points
+                a = sizes[ig, dd, np.newaxis]/2.
+                mask = np.zeros(xloc.shape)
+                for Ycoef in [-1, 0, 1]:
+                    xper = xloc + Ycoef*Yd
+                    mask += (xper > -a)*(xper <= a)
+                vals = vals*np.reshape(mask, shape)
+            elif kind == 'ball':
+                dist2 = ((xloc + Yd/2.) % Yd - Yd/2.)**2
+                vals = vals + np.reshape(dist2, shape)
+            ind = ind*N[dd] + np.reshape(jj, shape)
+        if kind == 'ball':
+            vals = (vals < np.reshape(r2, (-1,) + dim*(1,)))
+        ind, vals = np.broadcast_arrays(ind, vals)
+        topo += np.bincount(ind.ravel(), weights=vals.ravel(),
+                            minlength=topo.size)
+    return np.reshape(topo, N)
+
+
+def get_shift_inclusions(N, positions, Y, factors=None):
+    """
+    It sums the Fourier shifts of inclusions (get_shift_inclusion) over
+    several positions.
+
+    The shifts are separable, so the sum is evaluated as a product of
+    matrices of one-dimensional factors, in batches of positions.
+
+    Parameters
+    ----------
+    N : numpy.array of shape (d,)
+        no. of points of regular grid where the shifts are evaluated
+    positions : numpy.array of shape (n, d)
+        positions of inclusions
+    Y : numpy.array of shape (d,)
+        the size of periodic unit cell
+    factors : list of numpy.array of shape (n, N[i])
+        one-dimensional factors multiplying the shifts of individual
+        inclusions
+
+    Returns
+    -------
+    SS : numpy.array of shape N
+    """
+    N = np.array(N, dtype=np.int32)
+    Y = np.array(Y, dtype=np.float64)
+    dim = N.size
+    ZN = Grid.get_ZNl(N)
+    n = positions.shape[0]
+    SS = np.zeros(np.prod(N[:-1])*N[-1], dtype=np.complex128)
+    SS = np.reshape(SS, (-1, N[-1]))
+    batch = max(1, 2**20//int(np.prod(N[:-1])))
+    for ib in np.arange(0, n, batch):
+        ip = slice(ib, ib+batch)
+        F = []
+        for ii in np.arange(dim):
+            Fi = np.exp(-2*np.pi*1j*(np.multiply.outer(positions[ip, ii],
+                                                       ZN[ii])/Y[ii]))
+            if factors is not None:
+                Fi *= factors[ii][ip]
+            F.append(Fi)
+        head = F[0]
+        for ii in np.arange(1, dim-1):
+            head = np.reshape(head[:, :, np.newaxis]*F[ii][:, np.newaxis, :],
+                              (head.shape[0], -1))
+        SS += np.dot(head.T, F[-1])
+    return np.reshape(SS, N)
+
+
 def get_shift_inclusion(N, h, Y):
     N = np.array(N, dtype=np.int32)
     Y = np.array(Y, dtype=np.float64)
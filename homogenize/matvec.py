@@ -5,7 +5,9 @@ relating operators for homogenization.
 """
 
 import numpy as np
+from scipy.linalg.blas import get_blas_funcs
 from homogenize.matvec_fun import *
+from homogenize.fft_backends import get_fft_backend
 
 
 class FieldFun():
@@ -79,6 +81,13 @@ class VecTri(FieldFun, Grid):
         name of a vector
     Fourier : boolean
         if True vector is in Fourier space, store Fourier coefficients
+    halfspec : boolean
+        if True (and Fourier), only the half-spectrum of a real-valued
+        polynomial is stored, i.e. the last axis keeps the non-negative
+        frequencies only (layout of numpy.fft.rfftn)
+    centered : boolean
+        if False (and Fourier), the coefficients are stored in natural order
+        of FFT (zero frequency first) as produced by DFT(centered=False)
     elas : boolean
         if True it regards elasticity (not Implemented yet)
     val : numpy.ndarray of shape = (d, N)
@@ -91,12 +100,17 @@ class VecTri(FieldFun, Grid):
             either of 'ones' or 'random'
     """
     def __init__(self, name='?', N=None, d=None, Fourier=False, valtype=None,
-                 **kwargs):
+                 halfspec=False, centered=True, **kwargs):
         self.Fourier = Fourier
+        self.halfspec = Fourier and halfspec
+        self.centered = not Fourier or centered
 
         if 'val' in kwargs:
             self.val = kwargs['val']
-            self.N = np.array(self.val.shape[1:])
+            if N is not None:
+                self.N = np.array(N, dtype=np.int32)
+            else:
+                self.N = np.array(self.val.shape[1:])
             self.d = self.val.shape[0]
         else:
             if N is not None:
@@ -145,7 +159,11 @@ class VecTri(FieldFun, Grid):
 
     def __mul__(self, x):
         if isinstance(x, VecTri):
-            scal = np.real(np.sum(self.val[:]*np.conj(x.val[:])))
+            if self.halfspec:
+                scal = np.real(np.sum(get_halfspec_weights(self.N)
+                                      * self.val*np.conj(x.val)))
+            else:
+                scal = np.real(np.sum(self.val[:]*np.conj(x.val[:])))
             if not self.Fourier:
                 scal = scal / np.prod(self.N)
             return scal
@@ -173,7 +191,9 @@ class VecTri(FieldFun, Grid):
 
         elif np.size(x) == 1:
             name = get_name('c', '*', self.name)
-            return VecTri(name=name, val=x*self.val, Fourier=self.Fourier)
+            return VecTri(name=name, val=x*self.val, Fourier=self.Fourier,
+                          N=self.N, halfspec=self.halfspec,
+                          centered=self.centered)
 
         else:
             raise ValueError()
@@ -184,21 +204,100 @@ class VecTri(FieldFun, Grid):
             name = get_name(self.name, '+', x.name)
             if self.Fourier != x.Fourier:
                 raise ValueError("Mismatch in Fourier/shape coefficients!")
-            summ = VecTri(name=name, val=self.val+x.val, Fourier=self.Fourier)
+            if self.centered != x.centered:
+                raise ValueError("Mismatch in centered/uncentered layout!")
+            summ = VecTri(name=name, val=self.val+x.val, Fourier=self.Fourier,
+                          N=self.N, halfspec=self.halfspec,
+                          centered=self.centered)
         else:
             summ = VecTri(name=self.name, val=self.val+x,
-                          Fourier=self.Fourier)
+                          Fourier=self.Fourier, N=self.N,
+                          halfspec=self.halfspec, centered=self.centered)
         return summ
 
     def __radd__(self, x):
         return self+x
 
     def __neg__(self):
-        return VecTri(name='-'+self.name, val=-self.val, Fourier=self.Fourier)
+        return VecTri(name='-'+self.name, val=-self.val, Fourier=self.Fourier,
+                      N=self.N, halfspec=self.halfspec, centered=self.centered)
 
     def __sub__(self, x):
         return self.__add__(-x)
 
+    def dot(self, x):
+        """
+        Inner product with VecTri x (same as self*x) evaluated without
+        temporary arrays.
+
+        For the half spectrum, the weights of coefficients along the last
+        axis (see get_halfspec_weights) are 2 except for the first plane and
+        the last one for even N[-1], which are weighted by 1; the sum is thus
+        evaluated as the doubled vdot of all coefficients minus the products
+        in these planes, which are summed over the real views of complex
+        values, i.e. Re(conj(x)*y) = x.real*y.real + x.imag*y.imag.
+        """
+        if self.halfspec:
+            if not (self.val.dtype == x.val.dtype
+                    and np.iscomplexobj(self.val)
+                    and self.val.flags.c_contiguous
+                    and x.val.flags.c_contiguous):
+                return self*x
+            scal = 2*np.real(np.vdot(x.val, self.val))
+            rtype = np.finfo(self.val.dtype).dtype
+            sval = self.val.view(rtype)
+            xval = x.val.view(rtype)
+            planes = [slice(0, 2)]
+            if self.N[-1] % 2 == 0:
+                planes.append(slice(-2, None))
+            ind = 'abcdefghijklmnopqrstuvwxyz'[:sval.ndim]
+            for plane in planes:
+                scal -= np.einsum('%s,%s->' % (ind, ind), sval[..., plane],
+                                  xval[..., plane])
+            return scal
+        scal = np.real(np.vdot(x.val, self.val))
+        if not self.Fourier:
+            scal = scal / np.prod(self.N)
+        return scal
+
+    def iaxpy(self, a, x):
+        """
+        In-place update self = self + a*x with scalar a and VecTri x; it uses
+        BLAS routine axpy for contiguous arrays of the same data type.
+        """
+        if (self.val.dtype == x.val.dtype and self.val.flags.c_contiguous
+                and x.val.flags.c_contiguous
+                and self.val.dtype in [np.float32, np.float64, np.complex64,
+                                       np.complex128]
+                and (np.isrealobj(a) or np.iscomplexobj(self.val))):
+            axpy = get_blas_funcs('axpy', (x.val, self.val))
+            axpy(x.val.ravel(), self.val.ravel(), a=a)
+        else:
+            self.val += a*x.val
+        return self
+
+    def iscale(self, a):
+        """
+        In-place scaling self = a*self with scalar a.
+        """
+        self.val *= a
+        return self
+
+    def copy(self, name=None):
+        if name is None:
+            name = self.name
+        return VecTri(name=name, val=self.val.copy(), Fourier=self.Fourier,
+                      N=self.N, halfspec=self.halfspec, centered=self.centered)
+
+    def astype(self, dtype):
+        """
+        It returns a copy with values in the precision of real data type
+        dtype, e.g. numpy.float32, see cast_precision.
+        """
+        return VecTri(name=self.name, val=cast_precision(self.val, dtype),
+                      Fourier=self.Fourier, N=self.N, halfspec=self.halfspec,
+                      centered=self.centered)
+
     def norm(self, ntype='L2'):
         if ntype == 'L2':
             scal = (self*self)**0.5
@@ -221,7 +320,12 @@ class VecTri(FieldFun, Grid):
     def mean(self):
         mean = np.zeros(self.d)
         if self.Fourier:
-            ind = tuple(np.round(np.array(self.N)/2))
+            if self.centered:
+                ind = tuple(np.round(np.array(self.N)/2))
+            else:
+                ind = tuple(np.zeros(self.N.size, dtype=np.int32))
+            if self.halfspec:
+                ind = ind[:-1] + (0,)
             for di in np.arange(self.d):
                 mean[di] = np.real(self.val[di][ind])
         else:
@@ -252,14 +356,64 @@ class VecTri(FieldFun, Grid):
         """
         if np.allclose(self.N, M):
             return self
-        val = np.zeros(np.hstack([self.d, M]), dtype=self.val.dtype)
+        if self.halfspec:
+            val = np.zeros(np.hstack([self.d, get_Nhalf(M)]),
+                           dtype=self.val.dtype)
+        else:
+            val = np.zeros(np.hstack([self.d, M]), dtype=self.val.dtype)
         if self.Fourier is False:
             for m in np.arange(self.d):
                 val[m] = enlargeF(self.val[m], M)
+        elif self.centered:
+            for m in np.arange(self.d):
+                val[m] = enlarge(self.val[m], M, halfspec=self.halfspec)
         else:
+            phase = get_phase_uncentered(self.N, M, halfspec=self.halfspec)
             for m in np.arange(self.d):
-                val[m] = enlarge(self.val[m], M)
-        return VecTri(name=self.name, val=val, Fourier=self.Fourier)
+                val[m] = enlarge(phase*self.val[m], M, halfspec=self.halfspec,
+                                 centered=False)
+        return VecTri(name=self.name, val=val, Fourier=self.Fourier, N=M,
+                      halfspec=self.halfspec, centered=self.centered)
+
+    def decrease(self, M):
+        """
+        It decreases a trigonometric polynomial by omitting the Fourier
+        coefficients with high frequencies.
+        """
+        M = np.array(M, dtype=np.int32)
+        if np.allclose(self.N, M):
+            return self
+        if self.Fourier is False:
+            val = np.empty(np.hstack([self.d, M]))
+            for m in np.arange(self.d):
+                FxM = decrease(DFT.fftnc(self.val[m], self.N), M)
+                val[m] = np.real(DFT.ifftnc(FxM, M))*np.prod(M)/self.pN()
+        else:
+            if self.centered:
+                xN = self.val
+            else:
+                xN = self.val*get_phase_uncentered(self.N, M, self.halfspec)
+            val = np.array([decrease(xN[m], M, halfspec=self.halfspec,
+                                     centered=self.centered)
+                            for m in np.arange(self.d)])
+        return VecTri(name=self.name, val=val, Fourier=self.Fourier, N=M,
+                      halfspec=self.halfspec, centered=self.centered)
+
+    def get_centered(self):
+        """
+        It returns the Fourier coefficients in the centered layout (the zero
+        frequency in the middle and the phase corresponding to the origin
+        in the middle of grid), which is intended for output.
+        """
+        if not self.Fourier or self.centered:
+            return self
+        axes = range(-self.N.size, 0)
+        if self.halfspec:
+            axes = axes[:-1]
+        val = self.val*get_phase_uncentered(self.N, None, self.halfspec)
+        val = np.fft.fftshift(val, axes=axes)
+        return VecTri(name=self.name, val=val, Fourier=True, N=self.N,
+                      halfspec=self.halfspec, centered=True)
 
     def mulTri(self, y, resize=True):
         if isinstance(y, VecTri):
@@ -327,6 +481,11 @@ class Matrix(FieldFun):
     parameters :
     Fourier : boolean
         information whether the values are in Fourier space or not
+    halfspec : boolean
+        if True (and Fourier), the values are stored for the half-spectrum
+        only (layout of numpy.fft.rfftn), see VecTri
+    centered : boolean
+        if False (and Fourier), the values are stored in natural order of FFT
     Id : boolean
         if True it assemble identity matrix
     kwargs['homog'] : numpy.ndarray of shape N
@@ -334,13 +493,19 @@ class Matrix(FieldFun):
     kwargs['val'] : numpy.ndarray of shape (d,d,N)
         assemble the matrix to predefined values
     """
-    def __init__(self, name='?', Fourier=False, valtype=None, **kwargs):
+    def __init__(self, name='?', Fourier=False, valtype=None, halfspec=False,
+                 centered=True, **kwargs):
         self.Fourier = Fourier
+        self.halfspec = Fourier and halfspec
+        self.centered = not Fourier or centered
         self.name = name
 
         if valtype is None:
             self.val = np.array(kwargs['val'])
-            self.N = np.array(self.val.shape[2:])
+            if 'N' in kwargs:
+                self.N = np.array(kwargs['N'], dtype=np.int32)
+            else:
+                self.N = np.array(self.val.shape[2:])
             self.d = self.val.shape[0]
             self.dtype = self.val.dtype
             if self.val.shape[1] != self.d:
@@ -374,14 +539,19 @@ class Matrix(FieldFun):
 
     def __mul__(self, x):
         if isinstance(x, VecTri): # Matrix by VecTri multiplication
+            if self.halfspec != x.halfspec:
+                raise ValueError("Mismatch in full/half spectrum!")
+            if self.centered != x.centered:
+                raise ValueError("Mismatch in centered/uncentered layout!")
             name = get_name(self.name, '*', x.name)
-            prod = VecTri(name=name,
-                          val=np.einsum('ij...,j...->i...', self.val, x.val),
-                          Fourier=x.Fourier)
+            prod = VecTri(name=name, val=self.mul_val(x.val),
+                          Fourier=x.Fourier, N=x.N, halfspec=x.halfspec,
+                          centered=x.centered)
         elif isinstance(x, Matrix): # Matrix by Matrix multiplication
             name = get_name(self.name, '*', x.name)
             prod = Matrix(name=name,
-                          val=np.einsum('ij...,jk...->ik...', self.val, x.val))
+                          val=np.einsum('ij...,jk...->ik...', self.val,
+                                        x.get_Matrix().val))
         elif isinstance(x, LinOper) or isinstance(x, DFT):
             name = get_name(self.name, '*', x.name)
             prod = LinOper(name=name, mat=[[self, x]])
@@ -401,6 +571,23 @@ class Matrix(FieldFun):
                           val=np.einsum('ij...,j...->i...', self.val, x))
         return prod
 
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri, i.e. of shape
+        (d, N) or (d, s, N) for a block of vectors; the result is stored in
+        out if provided, which must not share memory with xval.
+        """
+        if out is None:
+            out = np.empty(np.hstack([self.d, xval.shape[1:]]),
+                           dtype=np.result_type(self.val, xval))
+        if xval.ndim == self.val.ndim - 1:
+            np.einsum('ij...,j...->i...', self.val, xval, out=out)
+        else: # block of vectors of shape (d, s, N)
+            for k in np.arange(xval.shape[1]):
+                np.einsum('ij...,j...->i...', self.val, xval[:, k],
+                          out=out[:, k])
+        return out
+
     def __rmul__(self, x):
         if np.shape(x) == (self.d, self.d):
             # Matrix by (d,d)-array multiplication
@@ -425,7 +612,9 @@ class Matrix(FieldFun):
     def __add__(self, x):
         if isinstance(x, Matrix):
             name = get_name(self.name, '+', x.name)
-            summ = Matrix(name=name, val=self.val+x.val)
+            summ = Matrix(name=name, val=self.val+x.get_Matrix().val,
+                          Fourier=self.Fourier, N=self.N,
+                          halfspec=self.halfspec, centered=self.centered)
         else:
             summ = Matrix(val=self.val+x)
         return summ
@@ -449,13 +638,28 @@ class Matrix(FieldFun):
     def __getitem__(self, i):
         return self.val[i]
 
+    def get_Matrix(self):
+        return self
+
     def T(self):
         return self.transpose()
 
     def transpose(self):
         return Matrix(name=self.name,
                       val=np.einsum('ij...->ji...', self.val),
-                      Fourier=self.Fourier)
+                      Fourier=self.Fourier, N=self.N, halfspec=self.halfspec,
+                      centered=self.centered)
+
+    def astype(self, dtype):
+        """
+        It returns the matrix with values in the precision of real data type
+        dtype, e.g. numpy.float32 for the products with single precision
+        vectors; the complex values are cast to the complex type of the same
+        precision.
+        """
+        return Matrix(name=self.name, val=cast_precision(self.val, dtype),
+                      Fourier=self.Fourier, N=self.N, halfspec=self.halfspec,
+                      centered=self.centered)
 
     def inv(self):
         name = 'inv(%s)' % (self.name)
@@ -464,6 +668,16 @@ class Matrix(FieldFun):
         else:
             raise NotImplementedError("The inverse for Fourier coefficients!")
 
+    def solve(self, x):
+        """
+        It solves the systems self*y = x at grid points for VecTri x without
+        forming the inverse (for d > 3).
+        """
+        if self.Fourier or x.Fourier:
+            raise NotImplementedError("The solve for Fourier coefficients!")
+        name = 'inv(%s)*%s' % (self.name, x.name)
+        return VecTri(name=name, val=solve_pointwise(self.val, x.val), N=x.N)
+
 
     def mul_tensorR(self, val):
         if val.shape == (self.d, self.d):
@@ -495,13 +709,50 @@ class Matrix(FieldFun):
 
     def enlarge(self, M):
         if self.Fourier:
-            val = enlarge_M(self.val, M)
+            val = enlarge_M(self.val, M, halfspec=self.halfspec,
+                            centered=self.centered)
         else:
-            val = np.zeros(self.ddN())
+            val = np.zeros(self.ddN(M))
             for ii in np.arange(self.d):
                 for jj in np.arange(self.d):
                     val[ii, jj] = enlargeF(self.val[ii, jj], M)
-        return Matrix(name=self.name, val=val, Fourier=self.Fourier)
+        return Matrix(name=self.name, val=val, Fourier=self.Fourier, N=M,
+                      halfspec=self.halfspec, centered=self.centered)
+
+    def get_uncentered(self):
+        """
+        It returns the Fourier values stored in natural order of FFT
+        (zero frequency first), which suits DFT(centered=False).
+        """
+        if not self.Fourier:
+            raise ValueError("Uncentered layout is defined for Fourier values!")
+        if not self.centered:
+            return self
+        if self.halfspec:
+            axes = range(2, self.N.size+1)
+        else:
+            axes = range(2, self.N.size+2)
+        val = np.fft.ifftshift(self.val, axes=axes)
+        return Matrix(name=self.name, val=val, Fourier=True, N=self.N,
+                      halfspec=self.halfspec, centered=False)
+
+    def get_halfspec(self):
+        """
+        It returns the Fourier coefficients restricted to half-spectrum
+        (non-negative frequencies in the last axis), which is sufficient
+        for the operators acting on real-valued trigonometric polynomials.
+        """
+        if not self.Fourier:
+            raise ValueError("Half-spectrum is defined for Fourier values!")
+        if self.halfspec:
+            return self
+        if self.centered:
+            val = np.fft.ifftshift(self.val, axes=-1)[..., :self.N[-1]//2+1]
+        else:
+            val = self.val[..., :self.N[-1]//2+1]
+        return Matrix(name=self.name, val=np.ascontiguousarray(val),
+                      Fourier=True, N=self.N, halfspec=True,
+                      centered=self.centered)
 
     def get_shifted_submatrix(self, ss=None):
         if ss is None:
@@ -527,6 +778,674 @@ class Matrix(FieldFun):
         return matrix
 
 
+class SymMatrix(Matrix):
+    """
+    Symmetric matrix in packed storage, i.e. only the components (m, n) with
+    m <= n are stored (upper triangle row by row, see get_sym_indices)
+
+    parameters :
+    val : numpy.ndarray of shape (d*(d+1)/2, N)
+        packed values
+    d : int
+        dimension of matrix; it is determined from val by default
+    others : see Matrix
+    """
+    def __init__(self, name='?', val=None, d=None, Fourier=False,
+                 halfspec=False, centered=True, **kwargs):
+        self.Fourier = Fourier
+        self.halfspec = Fourier and halfspec
+        self.centered = not Fourier or centered
+        self.name = name
+
+        self.val = np.array(val)
+        D = self.val.shape[0]
+        if d is None:
+            d = int(round(((1+8*D)**0.5 - 1)/2))
+        self.d = d
+        if D != d*(d+1)//2:
+            raise ValueError("Improper dimension of packed values %s."
+                             % str(self.val.shape))
+        if 'N' in kwargs:
+            self.N = np.array(kwargs['N'], dtype=np.int32)
+        else:
+            self.N = np.array(self.val.shape[1:])
+        self.dtype = self.val.dtype
+        self.ind = get_sym_indices(self.d)
+
+    def get_Matrix(self):
+        """
+        It returns the matrix with all d*d components stored.
+        """
+        return Matrix(name=self.name, val=unpack_sym(self.val, self.d),
+                      Fourier=self.Fourier, N=self.N, halfspec=self.halfspec,
+                      centered=self.centered)
+
+    def __mul__(self, x):
+        if isinstance(x, VecTri): # SymMatrix by VecTri multiplication
+            if self.halfspec != x.halfspec:
+                raise ValueError("Mismatch in full/half spectrum!")
+            if self.centered != x.centered:
+                raise ValueError("Mismatch in centered/uncentered layout!")
+            name = get_name(self.name, '*', x.name)
+            prod = VecTri(name=name, val=self.mul_val(x.val),
+                          Fourier=x.Fourier, N=x.N, halfspec=x.halfspec,
+                          centered=x.centered)
+        elif (isinstance(x, Matrix) or isinstance(x, LinOper)
+              or isinstance(x, DFT)):
+            name = get_name(self.name, '*', x.name)
+            prod = LinOper(name=name, mat=[[self, x]])
+        elif isinstance(x, Scalar):
+            prod = self*x.val
+        elif np.size(x) == 1: # SymMatrix by Constant multiplication
+            name = get_name(self.name, '*', 'c')
+            prod = SymMatrix(name=name, val=self.val*x, d=self.d,
+                             Fourier=self.Fourier, N=self.N,
+                             halfspec=self.halfspec, centered=self.centered)
+        else:
+            prod = self.get_Matrix()*x
+        return prod
+
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri, see
+        Matrix.mul_val.
+        """
+        if out is None:
+            out = np.empty(xval.shape, dtype=np.result_type(self.val, xval))
+        # vector or block of vectors of shape (d, s, N)
+        for k, (m, n) in enumerate(zip(*self.ind)):
+            if m == n:
+                np.multiply(self.val[k], xval[m], out=out[m])
+        for k, (m, n) in enumerate(zip(*self.ind)):
+            if m != n:
+                out[m] += self.val[k]*xval[n]
+                out[n] += self.val[k]*xval[m]
+        return out
+
+    def __getitem__(self, i):
+        if (isinstance(i, tuple) and len(i) == 2
+                and all(isinstance(k, (int, np.integer)) for k in i)):
+            m, n = min(i), max(i)
+            return self.val[m*self.d - m*(m-1)//2 + n - m]
+        return self.get_Matrix()[i]
+
+    def norm(self):
+        weights = 2. - (self.ind[0] == self.ind[1])
+        norm2 = np.sum(self.val**2, axis=tuple(range(1, self.val.ndim)))
+        return np.sum(weights*norm2)**0.5
+
+    def mean(self):
+        mean = np.mean(self.val, axis=tuple(range(1, self.val.ndim)))
+        return unpack_sym(mean, self.d)
+
+    def __add__(self, x):
+        if isinstance(x, SymMatrix):
+            name = get_name(self.name, '+', x.name)
+            return SymMatrix(name=name, val=self.val+x.val, d=self.d,
+                             Fourier=self.Fourier, N=self.N,
+                             halfspec=self.halfspec, centered=self.centered)
+        return self.get_Matrix() + x
+
+    def __neg__(self):
+        return SymMatrix(name=self.name, val=-self.val, d=self.d,
+                         Fourier=self.Fourier, N=self.N,
+                         halfspec=self.halfspec, centered=self.centered)
+
+    def transpose(self):
+        return self
+
+    def astype(self, dtype):
+        """
+        It returns the matrix with values in the precision of real data type
+        dtype, see Matrix.astype.
+        """
+        return SymMatrix(name=self.name, val=cast_precision(self.val, dtype),
+                         d=self.d, Fourier=self.Fourier, N=self.N,
+                         halfspec=self.halfspec, centered=self.centered)
+
+    def inv(self):
+        name = 'inv(%s)' % (self.name)
+        if self.Fourier is False:
+            val = get_inverse(unpack_sym(self.val, self.d))
+            return SymMatrix(name=name, val=pack_sym(val), Fourier=False)
+        else:
+            raise NotImplementedError("The inverse for Fourier coefficients!")
+
+    def solve(self, x):
+        return self.get_Matrix().solve(x)
+
+    def mul_tensorR(self, val):
+        return self.get_Matrix().mul_tensorR(val)
+
+    def mul_gridwise(self, val):
+        return self.get_Matrix().mul_gridwise(val)
+
+    def matrix(self):
+        return self.get_Matrix().matrix()
+
+    def enlarge(self, M):
+        val = []
+        for k in np.arange(self.val.shape[0]):
+            if self.Fourier:
+                val.append(enlarge(self.val[k], M, halfspec=self.halfspec,
+                                   centered=self.centered))
+            else:
+                val.append(enlargeF(self.val[k], M))
+        return SymMatrix(name=self.name, val=np.array(val), d=self.d,
+                         Fourier=self.Fourier, N=M, halfspec=self.halfspec,
+                         centered=self.centered)
+
+    def get_uncentered(self):
+        """
+        It returns the Fourier values stored in natural order of FFT
+        (zero frequency first), see Matrix.get_uncentered.
+        """
+        if not self.Fourier:
+            raise ValueError("Uncentered layout is defined for Fourier values!")
+        if not self.centered:
+            return self
+        if self.halfspec:
+            axes = range(1, self.N.size)
+        else:
+            axes = range(1, self.N.size+1)
+        val = np.fft.ifftshift(self.val, axes=axes)
+        return SymMatrix(name=self.name, val=val, d=self.d, Fourier=True,
+                         N=self.N, halfspec=self.halfspec, centered=False)
+
+    def get_halfspec(self):
+        """
+        It returns the Fourier coefficients restricted to half-spectrum, see
+        Matrix.get_halfspec.
+        """
+        if not self.Fourier:
+            raise ValueError("Half-spectrum is defined for Fourier values!")
+        if self.halfspec:
+            return self
+        if self.centered:
+            val = np.fft.ifftshift(self.val, axes=-1)[..., :self.N[-1]//2+1]
+        else:
+            val = self.val[..., :self.N[-1]//2+1]
+        return SymMatrix(name=self.name, val=np.ascontiguousarray(val),
+                         d=self.d, Fourier=True, N=self.N, halfspec=True,
+                         centered=self.centered)
+
+
+class PhaseMatrix(FieldFun):
+    """
+    Matrix of material coefficients that are constant in individual phases;
+    it stores the phase of every grid point and a small table of
+    coefficients of phases instead of the values at grid points (Matrix)
+
+    parameters :
+    phases : numpy.ndarray of shape N
+        phase ids at grid points, stored as uint8 or uint16
+    table : numpy.ndarray of shape (n_phases, d, d)
+        coefficients of individual phases
+    """
+    def __init__(self, name='?', phases=None, table=None, **kwargs):
+        self.name = name
+        self.Fourier = False
+        self.halfspec = False
+        self.centered = True
+
+        self.table = np.array(table)
+        if self.table.ndim != 3 or self.table.shape[1] != self.table.shape[2]:
+            raise ValueError("Improper dimension of table %s."
+                             % str(self.table.shape))
+        self.d = self.table.shape[1]
+        self.dtype = self.table.dtype
+        if self.table.shape[0] <= 2**8:
+            ptype = np.uint8
+        elif self.table.shape[0] <= 2**16:
+            ptype = np.uint16
+        else:
+            ptype = np.uint32
+        self.phases = np.asarray(phases, dtype=ptype)
+        self.N = np.array(self.phases.shape, dtype=np.int32)
+        # 'isotropic' or 'diagonal' tables are multiplied by broadcasting
+        self.structure = get_structure(self.table)
+        # flat indices of grid points of individual phases, see get_indices
+        if 'ind' in kwargs:
+            self.ind = kwargs['ind']
+        else:
+            self.ind = None
+        # diagonal values at grid points as DiagMatrix, see mul_val
+        self.diag = None
+
+    def get_indices(self):
+        """
+        It returns (and caches) the flat indices of grid points of individual
+        phases; they are shared by the derived matrices (inv, transpose).
+        """
+        if self.ind is None:
+            phases = self.phases.ravel()
+            order = np.argsort(phases, kind='mergesort')
+            counts = np.bincount(phases, minlength=self.table.shape[0])
+            self.ind = np.split(order, np.cumsum(counts)[:-1])
+        return self.ind
+
+    def counts(self):
+        return np.array([ind.size for ind in self.get_indices()])
+
+    def get_diag(self):
+        """
+        It returns the diagonal values at grid points of shape (d, N), or of
+        shape (1, N) for isotropic tables.
+        """
+        diag = self.table[:, np.arange(self.d), np.arange(self.d)]
+        if self.structure == 'isotropic':
+            diag = diag[:, :1]
+        return np.einsum('...i->i...', diag[self.phases])
+
+    def get_Matrix(self):
+        """
+        It returns the coefficients as Matrix, i.e. with values at grid
+        points.
+        """
+        val = np.einsum('...ij->ij...', self.table[self.phases])
+        return Matrix(name=self.name, val=val, Fourier=False)
+
+    def __mul__(self, x):
+        if isinstance(x, VecTri): # PhaseMatrix by VecTri multiplication
+            if self.halfspec != x.halfspec:
+                raise ValueError("Mismatch in full/half spectrum!")
+            if self.centered != x.centered:
+                raise ValueError("Mismatch in centered/uncentered layout!")
+            name = get_name(self.name, '*', x.name)
+            prod = VecTri(name=name, val=self.mul_val(x.val),
+                          Fourier=x.Fourier, N=x.N, halfspec=x.halfspec,
+                          centered=x.centered)
+        elif (isinstance(x, Matrix) or isinstance(x, LinOper)
+              or isinstance(x, DFT)):
+            name = get_name(self.name, '*', x.name)
+            prod = LinOper(name=name, mat=[[self, x]])
+        elif isinstance(x, Scalar):
+            prod = self*x.val
+        elif np.size(x) == 1: # PhaseMatrix by Constant multiplication
+            name = get_name(self.name, '*', 'c')
+            prod = PhaseMatrix(name=name, phases=self.phases,
+                               table=self.table*x, ind=self.ind)
+        else:
+            name = get_name(self.name, '*', 'np.array')
+            prod = self*VecTri(name=name, val=np.reshape(x, self.dN()))
+            if np.size(x) == self.pdN():
+                prod = np.reshape(prod.val, self.pdN())
+        return prod
+
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri, see
+        Matrix.mul_val.
+        """
+        if self.structure in ['isotropic', 'diagonal']:
+            if self.diag is None: # evaluated once, at the first product
+                self.diag = DiagMatrix(name=self.name, val=self.get_diag(),
+                                       d=self.d)
+            return self.diag.mul_val(xval, out=out)
+        if out is None:
+            out = np.empty(xval.shape, dtype=np.result_type(self.table,
+                                                            xval))
+        # vector or block of vectors of shape (d, s, N)
+        xval = np.reshape(xval, (self.d, -1, self.pN()))
+        val = out.view()
+        val.shape = xval.shape # it raises an error for non-contiguous out
+        for table, ind in zip(self.table, self.get_indices()):
+            val[:, :, ind] = np.tensordot(table, xval[:, :, ind],
+                                          axes=(1, 0))
+        return out
+
+    def __call__(self, x):
+        return self*x
+
+    def __getitem__(self, i):
+        if (isinstance(i, tuple) and len(i) == 2
+                and all(isinstance(k, (int, np.integer)) for k in i)):
+            return self.table[:, i[0], i[1]][self.phases]
+        return self.get_Matrix()[i]
+
+    def norm(self):
+        return np.sum(self.counts()*np.sum(self.table**2, axis=(1, 2)))**0.5
+
+    def mean(self):
+        return np.einsum('k,kij->ij', self.counts(), self.table)/self.pN()
+
+    def __neg__(self):
+        return PhaseMatrix(name=self.name, phases=self.phases,
+                           table=-self.table, ind=self.ind)
+
+    def T(self):
+        return self.transpose()
+
+    def transpose(self):
+        return PhaseMatrix(name=self.name, phases=self.phases,
+                           table=np.einsum('kij->kji', self.table),
+                           ind=self.ind)
+
+    def astype(self, dtype):
+        """
+        It returns the matrix with the table of coefficients in the precision
+        of real data type dtype, see Matrix.astype; the phases are shared.
+        """
+        return PhaseMatrix(name=self.name, phases=self.phases,
+                           table=cast_precision(self.table, dtype),
+                           ind=self.ind)
+
+    def inv(self):
+        name = 'inv(%s)' % (self.name)
+        table = get_inverse(np.einsum('kij->ijk', self.table))
+        return PhaseMatrix(name=name, phases=self.phases,
+                           table=np.einsum('ijk->kij', table), ind=self.ind)
+
+    def solve(self, x):
+        """
+        It solves the systems self*y = x at grid points for VecTri x; only
+        the table of coefficients is inverted.
+        """
+        if x.Fourier:
+            raise NotImplementedError("The solve for Fourier coefficients!")
+        y = self.inv()*x
+        y.name = 'inv(%s)*%s' % (self.name, x.name)
+        return y
+
+    def __repr__(self, full=False):
+        ss = "Class : %s\n    name : %s\n" % (self.__class__.__name__,
+                                              self.name)
+        ss += '    dimension d = %g \n' % (self.d)
+        ss += '    size N = %s \n' % str(self.N)
+        ss += '    no. of phases = %d \n' % self.table.shape[0]
+        ss += '    phases.dtype = %s \n' % str(self.phases.dtype)
+        ss += '    structure = %s \n' % self.structure
+        ss += '    norm = %s\n' % str(self.norm())
+        ss += '    mean = %s\n' % str(self.mean())
+        if full:
+            ss += 'table = \n'
+            ss += str(self.table)
+        return ss
+
+
+class DiagMatrix(FieldFun):
+    """
+    Matrix of material coefficients that are diagonal at grid points; only
+    the diagonal is stored, and a single value for isotropic coefficients,
+    i.e. multiples of identity
+
+    parameters :
+    val : numpy.ndarray of shape (d, N) or (1, N)
+        diagonal values at grid points, (1, N) for isotropic coefficients
+    d : int
+        dimension of matrix, required for isotropic coefficients
+    """
+    def __init__(self, name='?', val=None, d=None, Fourier=False, **kwargs):
+        self.name = name
+        self.Fourier = Fourier
+        self.halfspec = False
+        self.centered = True
+
+        self.val = np.array(val)
+        if d is None:
+            d = self.val.shape[0]
+        self.d = d
+        if self.val.shape[0] not in [1, self.d]:
+            raise ValueError("Improper dimension of values %s."
+                             % str(self.val.shape))
+        self.isotropic = (self.val.shape[0] == 1)
+        self.N = np.array(self.val.shape[1:], dtype=np.int32)
+        self.dtype = self.val.dtype
+
+    def __mul__(self, x):
+        if isinstance(x, VecTri): # DiagMatrix by VecTri multiplication
+            if self.halfspec != x.halfspec:
+                raise ValueError("Mismatch in full/half spectrum!")
+            if self.centered != x.centered:
+                raise ValueError("Mismatch in centered/uncentered layout!")
+            name = get_name(self.name, '*', x.name)
+            prod = VecTri(name=name, val=self.mul_val(x.val),
+                          Fourier=x.Fourier, N=x.N, halfspec=x.halfspec,
+                          centered=x.centered)
+        elif (isinstance(x, Matrix) or isinstance(x, LinOper)
+              or isinstance(x, DFT)):
+            name = get_name(self.name, '*', x.name)
+            prod = LinOper(name=name, mat=[[self, x]])
+        elif isinstance(x, Scalar):
+            prod = self*x.val
+        elif np.size(x) == 1: # DiagMatrix by Constant multiplication
+            name = get_name(self.name, '*', 'c')
+            prod = DiagMatrix(name=name, val=self.val*x, d=self.d,
+                              Fourier=self.Fourier)
+        else:
+            name = get_name(self.name, '*', 'np.array')
+            prod = self*VecTri(name=name, val=np.reshape(x, self.dN()))
+            if np.size(x) == self.pdN():
+                prod = np.reshape(prod.val, self.pdN())
+        return prod
+
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri, see
+        Matrix.mul_val.
+        """
+        # vector or block of vectors of shape (d, s, N)
+        shape = ((self.val.shape[0],) + (1,)*(xval.ndim-1-self.N.size)
+                 + tuple(self.N))
+        return np.multiply(np.reshape(self.val, shape), xval, out=out)
+
+    def __call__(self, x):
+        return self*x
+
+    def __getitem__(self, i):
+        if (isinstance(i, tuple) and len(i) == 2
+                and all(isinstance(k, (int, np.integer)) for k in i)):
+            if i[0] != i[1]:
+                return np.zeros(self.N, dtype=self.dtype)
+            elif self.isotropic:
+                return self.val[0]
+            else:
+                return self.val[i[0]]
+        return self.get_Matrix()[i]
+
+    def get_diag(self):
+        """
+        It returns the diagonal values of shape (d, N).
+        """
+        return self.val*np.ones(self.dN(), dtype=self.dtype)
+
+    def get_Matrix(self):
+        """
+        It returns the coefficients as Matrix, i.e. with all components.
+        """
+        val = np.zeros(self.ddN(), dtype=self.dtype)
+        diag = self.get_diag()
+        for m in np.arange(self.d):
+            val[m, m] = diag[m]
+        return Matrix(name=self.name, val=val, Fourier=self.Fourier)
+
+    def norm(self):
+        return (np.sum(self.val**2)*self.d/self.val.shape[0])**0.5
+
+    def mean(self):
+        return np.diag(np.mean(self.get_diag(), axis=tuple(
+            range(1, self.N.size+1))))
+
+    def __neg__(self):
+        return DiagMatrix(name=self.name, val=-self.val, d=self.d,
+                          Fourier=self.Fourier)
+
+    def T(self):
+        return self.transpose()
+
+    def transpose(self):
+        return self
+
+    def astype(self, dtype):
+        """
+        It returns the matrix with values in the precision of real data type
+        dtype, see Matrix.astype.
+        """
+        return DiagMatrix(name=self.name, val=cast_precision(self.val, dtype),
+                          d=self.d, Fourier=self.Fourier)
+
+    def inv(self):
+        name = 'inv(%s)' % (self.name)
+        if self.Fourier is False:
+            return DiagMatrix(name=name, val=1./self.val, d=self.d)
+        else:
+            raise NotImplementedError("The inverse for Fourier coefficients!")
+
+    def solve(self, x):
+        """
+        It solves the systems self*y = x at grid points for VecTri x.
+        """
+        if self.Fourier or x.Fourier:
+            raise NotImplementedError("The solve for Fourier coefficients!")
+        y = self.inv()*x
+        y.name = 'inv(%s)*%s' % (self.name, x.name)
+        return y
+
+
+class GaMatrix():
+    """
+    Material coefficients of the Galerkin scheme with exact integration (Ga)
+    acting on trigonometric polynomials stored on N-sized grid, i.e. the
+    operator x -> P_N(A*x), where x is evaluated on the M-sized grid of
+    coefficients A (M = 2*N-1, see Material.get_A_Ga) by zero-padded FFT and
+    P_N omits the frequencies out of the N-sized grid; the unknowns thus stay
+    on the N-sized grid and the M-sized grid is used inside the product only
+
+    parameters :
+        A : Matrix, SymMatrix, PhaseMatrix, or DiagMatrix
+            coefficients at the points of M-sized grid
+        N : numpy.ndarray
+            size of grid of trigonometric polynomials
+        backend, threads : see DFT
+    """
+    def __init__(self, name=None, A=None, N=None, backend='numpy', threads=1):
+        if name is None:
+            name = A.name
+        self.name = name
+        self.A = A
+        self.N = np.array(N, dtype=np.int32)
+        self.M = np.array(A.N, dtype=np.int32)
+        self.d = A.d
+        self.dtype = A.dtype
+        self.Fourier = False
+        self.halfspec = False
+        self.centered = True
+        self.fft_par = {'backend': backend, 'threads': threads}
+        par = dict(halfspec=True, centered=False, **self.fft_par)
+        self.FN = DFT(name='FN', N=self.N, **par)
+        self.FiN = DFT(name='FiN', inverse=True, N=self.N, **par)
+        self.FM = DFT(name='FM', N=self.M, **par)
+        self.FiM = DFT(name='FiM', inverse=True, N=self.M, **par)
+
+        # positions of the Fourier coefficients of N-sized grid and phase
+        # factors of uncentered DFT transferring them to M-sized grid
+        ind_N, ind_M = get_index_uncentered(get_Nhalf(self.N),
+                                            get_Nhalf(self.M), halfspec=True)
+        self.ind_N = np.ix_(*ind_N)
+        self.ind_M = np.ix_(*ind_M)
+        self.phase = get_phase_uncentered(self.N, self.M,
+                                          halfspec=True)[self.ind_N]
+        self.buffers = {}
+
+    def get_buffers(self, shape, dtype):
+        """
+        It returns (and caches) the buffers for vectors of given shape and
+        dtype, i.e. the zero-padded Fourier coefficients and values on
+        M-sized grid.
+        """
+        key = (shape, np.dtype(dtype).char)
+        if key not in self.buffers:
+            lead = shape[:-self.N.size]
+            backend = self.FM.backend
+            rtype = np.result_type(dtype, self.dtype)
+            ctype = np.result_type(rtype, np.complex64)
+            # the entries out of N-sized grid stay zero
+            hxM = backend.empty(lead + tuple(get_Nhalf(self.M)), ctype)
+            hxM[...] = 0.
+            if backend.direct_out:
+                hAxM = backend.empty(hxM.shape, ctype)
+            else:
+                hAxM = None
+            self.buffers = {key: {
+                'hxM': hxM,
+                'xM': backend.empty(lead + tuple(self.M), rtype),
+                'AxM': backend.empty(lead + tuple(self.M), rtype),
+                'hAxM': hAxM,
+                'hAx': backend.empty(lead + tuple(get_Nhalf(self.N)),
+                                     ctype)}}
+        return self.buffers[key]
+
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri on N-sized grid,
+        see Matrix.mul_val; the scaling by np.prod(M)/np.prod(N) of values
+        on M-sized grid (FFT without normalization) is inverted by the
+        restriction, so it is omitted.
+        """
+        buf = self.get_buffers(xval.shape, xval.dtype)
+        # the indices are stored without the leading axes (Ellipsis cannot
+        # be pickled)
+        lead = (slice(None),)*(xval.ndim - self.N.size)
+        ind_N = lead + self.ind_N
+        ind_M = lead + self.ind_M
+        hx = self.FN.fft(xval)
+        buf['hxM'][ind_M] = self.phase*hx[ind_N]
+        xM = self.FiM.ifft(buf['hxM'], out=buf['xM'])
+        AxM = self.A.mul_val(xM, out=buf['AxM'])
+        hAxM = self.FM.fft(AxM, out=buf['hAxM'])
+        buf['hAx'][ind_N] = np.conj(self.phase)*hAxM[ind_M]
+        return self.FiN.ifft(buf['hAx'], out=out)
+
+    def __mul__(self, x):
+        if isinstance(x, VecTri):
+            name = get_name(self.name, '*', x.name)
+            return VecTri(name=name, val=self.mul_val(x.val), N=x.N)
+        elif (isinstance(x, Matrix) or isinstance(x, LinOper)
+              or isinstance(x, DFT)):
+            name = get_name(self.name, '*', x.name)
+            return LinOper(name=name, mat=[[self, x]])
+        else:
+            raise ValueError("The operand is not supported!")
+
+    def __call__(self, x):
+        return self*x
+
+    def norm(self):
+        return self.A.norm()
+
+    def mean(self):
+        return self.A.mean()
+
+    def T(self):
+        return self.transpose()
+
+    def transpose(self):
+        return GaMatrix(name=self.name, A=self.A.transpose(), N=self.N,
+                        **self.fft_par)
+
+    def astype(self, dtype):
+        """
+        It returns the operator with coefficients in the precision of real
+        data type dtype, see Matrix.astype.
+        """
+        return GaMatrix(name=self.name, A=self.A.astype(dtype), N=self.N,
+                        **self.fft_par)
+
+    def inv(self):
+        """
+        It returns the operator with the inverse of coefficients at the
+        points of M-sized grid (not the inverse of operator).
+        """
+        return GaMatrix(A=self.A.inv(), N=self.N, **self.fft_par)
+
+    def __repr__(self):
+        ss = "Class : %s\n    name : %s\n" % (self.__class__.__name__,
+                                              self.name)
+        ss += '    size N = %s ; M = %s \n' % (str(self.N), str(self.M))
+        ss += '    coefficients : %s' % self.A.__class__.__name__
+        return ss
+
+
 class ShiftMatrix():
     """
     Matrix object defining shift of Fourier coefficients.
@@ -591,8 +1510,22 @@ class DFT():
             N-sized (i)DFT,
         normalized : boolean
             version of DFT that is normalized by factor numpy.prod(N)
+        halfspec : boolean
+            if True, the real-to-complex FFT (numpy.fft.rfftn) is used and
+            only the half-spectrum of Fourier coefficients is stored
+        centered : boolean
+            if False, the FFT is applied without shifts (fftshift and
+            ifftshift) and the Fourier coefficients are stored in natural
+            order; it suits the operators that are diagonal in Fourier space,
+            e.g. FiN*hG*FN, whose kernels are then stored in the same order
+        backend : str
+            name of FFT backend from registry fft_backends
+            ('numpy', 'scipy', or 'pyfftw')
+        threads : int
+            number of threads used by FFT backend
     """
-    def __init__(self, inverse=False, N=None, normalized=True, **kwargs):
+    def __init__(self, inverse=False, N=None, normalized=True, halfspec=False,
+                 centered=True, backend='numpy', threads=1, **kwargs):
         if 'name' in kwargs.keys():
             self.name = kwargs['name']
         elif inverse:
@@ -602,6 +1535,9 @@ class DFT():
 
         self.N = np.array(N, dtype=np.int32)
         self.inverse = inverse
+        self.halfspec = halfspec
+        self.centered = centered
+        self.backend = get_fft_backend(backend, threads)
         if normalized:
             self.norm_coef = np.prod(self.N)
         else:
@@ -614,13 +1550,15 @@ class DFT():
         if isinstance(x, VecTri):
             if not self.inverse:
                 name = get_name('F', '*', x.name)
-                return VecTri(name=name,
-                              val=self.fftnc(x.val, self.N)/self.norm_coef,
-                              Fourier=not x.Fourier)
+                val = self.fft(x.val)/self.norm_coef
+                return VecTri(name=name, val=val, Fourier=not x.Fourier,
+                              N=self.N, halfspec=self.halfspec,
+                              centered=self.centered)
             else:
                 name = get_name('Fi', '*', x.name)
-                val = np.real(self.ifftnc(x.val, self.N))*self.norm_coef
-                return VecTri(name=name, val=val, Fourier=not x.Fourier)
+                val = self.ifft(x.val)*self.norm_coef
+                return VecTri(name=name, val=val, Fourier=not x.Fourier,
+                              N=self.N)
 
         elif (isinstance(x, LinOper) or isinstance(x, Matrix)
               or isinstance(x, DFT)):
@@ -632,6 +1570,8 @@ class DFT():
                 xre = np.reshape(x, np.hstack([d, self.N]))
             else:
                 xre = np.reshape(x, self.N)
+            if self.halfspec:
+                raise NotImplementedError("Half-spectrum for numpy.ndarray!")
             if not self.inverse:
                 Fxre = self.fftnc(xre, self.N)
             else:
@@ -665,10 +1605,59 @@ class DFT():
         ss += '    name : %s\n' % self.name
         ss += '    inverse = %s\n' % self.inverse
         ss += '    size N = %s\n' % str(self.N)
+        ss += '    backend = %s (threads = %d)\n' % (self.backend.name,
+                                                     self.backend.threads)
         return ss
 
     def transpose(self):
-        return DFT(name=self.name+'^T', inverse=not(self.inverse), N=self.N)
+        return DFT(name=self.name+'^T', inverse=not(self.inverse), N=self.N,
+                   halfspec=self.halfspec, centered=self.centered,
+                   backend=self.backend.name,
+                   threads=self.backend.threads)
+
+    def astype(self, dtype):
+        """
+        The transforms keep the precision of operands, see
+        fft_backends.FFTBackend.get_result_dtype, so the DFT is returned.
+        """
+        return self
+
+    def fft(self, x, out=None):
+        """
+        forward FFT over the last np.size(N) axes of x by backend;
+        the result is stored in out if provided
+        """
+        if self.halfspec:
+            direction, axes_F = 'rfftn', range(-self.N.size, -1)
+        else:
+            direction, axes_F = 'fftn', range(-self.N.size, 0)
+        plan = self.backend.get_plan(x.shape, x.dtype, direction, self.N)
+        if not self.centered:
+            return plan(x, out=out)
+        x = np.fft.ifftshift(x, axes=range(-self.N.size, 0))
+        Fx = np.fft.fftshift(plan(x), axes=axes_F)
+        return self.backend.store(Fx, out)
+
+    def ifft(self, Fx, out=None):
+        """
+        inverse FFT over the last np.size(N) axes of Fx by backend;
+        it returns real values, which are stored in out if provided
+        """
+        if self.halfspec:
+            direction, axes_F = 'irfftn', range(-self.N.size, -1)
+        else:
+            direction, axes_F = 'ifftn', range(-self.N.size, 0)
+        plan = self.backend.get_plan(Fx.shape, Fx.dtype, direction, self.N)
+        if self.halfspec and not self.centered:
+            return plan(Fx, out=out)
+        if self.centered:
+            Fx = np.fft.ifftshift(Fx, axes=axes_F)
+        x = plan(Fx)
+        if not self.halfspec:
+            x = np.real(x)
+        if self.centered:
+            x = np.fft.fftshift(x, axes=range(-self.N.size, 0))
+        return self.backend.store(x, out)
 
     @staticmethod
     def fftnc(x, N):
@@ -686,6 +1675,27 @@ class DFT():
         x = np.fft.fftshift(np.fft.ifftn(np.fft.ifftshift(Fx), N))
         return x
 
+    @staticmethod
+    def rfftnc(x, N):
+        """
+        centered n-dimensional real-to-complex FFT algorithm; it returns
+        the half-spectrum, where the last axis stores the non-negative
+        frequencies only
+        """
+        axes = range(-np.size(N), 0)
+        Fx = np.fft.rfftn(np.fft.ifftshift(x, axes=axes), N, axes=axes)
+        return np.fft.fftshift(Fx, axes=axes[:-1])
+
+    @staticmethod
+    def irfftnc(Fx, N):
+        """
+        centered n-dimensional complex-to-real inverse FFT algorithm acting
+        on the half-spectrum produced by rfftnc
+        """
+        axes = range(-np.size(N), 0)
+        x = np.fft.irfftn(np.fft.ifftshift(Fx, axes=axes[:-1]), N, axes=axes)
+        return np.fft.fftshift(x, axes=axes)
+
 
 class LinOper():
     """
@@ -793,6 +1803,487 @@ class LinOper():
         name = '(%s)^T' % self.name
         return LinOper(name=name, mat=mat)
 
+    def astype(self, dtype):
+        """
+        It returns the operator with all matrices in the precision of real
+        data type dtype, see Matrix.astype.
+        """
+        mat_rev = [[oper.astype(dtype) for oper in summand]
+                   for summand in self.mat_rev]
+        return LinOper(name=self.name, mat_rev=mat_rev, dtype=dtype)
+
+    def compile(self, name=None):
+        """
+        It returns an equivalent operator simplified for repeated evaluation,
+        i.e. CompiledOper, or the only operator the expression reduces to.
+
+        The summands are simplified as follows:
+            - nested LinOper with one summand and GAOper are flattened,
+              the other nested LinOper are compiled,
+            - pairs of forward and inverse DFT (FiN*FN) acting on real
+              values cancel each other,
+            - adjacent Fourier-space matrices are folded into one kernel,
+            - normalizations of DFT are merged into a scalar factor,
+        and then the summands that differ in one matrix only (with the same
+        layout) are merged into one summand with the sum of matrices, e.g.
+        FiN*hG1hN*FN + FiN*hG1sN*FN = FiN*(hG1hN + hG1sN)*FN.
+        """
+        if name is None:
+            name = self.name
+        mat_rev = []
+        scales = []
+        for summand in self.mat_rev:
+            summand, scale = simplify_summand(flatten_summand(summand))
+            for ii, (summand0, scale0) in enumerate(zip(mat_rev, scales)):
+                merged = merge_summands(summand0, summand)
+                if merged is not None and scale0 == scale:
+                    mat_rev[ii] = merged
+                    break
+            else:
+                mat_rev.append(summand)
+                scales.append(scale)
+
+        planned = all(is_planable(summand) for summand in mat_rev)
+        if planned: # DFT are evaluated without normalization
+            for ii, summand in enumerate(mat_rev):
+                for oper in summand:
+                    if isinstance(oper, DFT):
+                        scales[ii] *= get_dft_scale(oper)
+
+        if len(mat_rev) == 1 and len(mat_rev[0]) == 1 and scales[0] == 1.:
+            return mat_rev[0][0]
+        return CompiledOper(name=name, mat_rev=mat_rev, scales=scales,
+                            planned=planned, source=self, dtype=self.dtype)
+
+
+def flatten_summand(summand):
+    """
+    It returns the summand of LinOper (operators in order of application)
+    with nested LinOper of one summand and GAOper replaced by their factors;
+    the other nested LinOper are compiled.
+    """
+    factors = []
+    for oper in summand:
+        if isinstance(oper, CompiledOper):
+            factors.append(oper)
+        elif isinstance(oper, LinOper) and oper.no_summands == 1:
+            factors += flatten_summand(oper.mat_rev[0])
+        elif isinstance(oper, LinOper):
+            factors.append(oper.compile())
+        elif isinstance(oper, GAOper):
+            factors += [oper.A, oper.FN, oper.hGN, oper.FiN]
+        else:
+            factors.append(oper)
+    return factors
+
+
+def get_dft_scale(F):
+    """
+    It returns the normalization of DFT F with respect to the plain FFT.
+    """
+    if F.inverse:
+        return F.norm_coef
+    else:
+        return 1./F.norm_coef
+
+
+def is_kernel(oper):
+    """
+    It returns True if oper is a Matrix with Fourier coefficients.
+    """
+    return isinstance(oper, Matrix) and oper.Fourier
+
+
+def same_layout(A, B):
+    return (A.Fourier == B.Fourier and A.halfspec == B.halfspec
+            and A.centered == B.centered and np.all(A.N == B.N))
+
+
+def simplify_summand(summand):
+    """
+    It cancels pairs FiN*FN and folds adjacent kernels of a flattened
+    summand; it returns the simplified summand and the scale of cancelled
+    DFT.
+    """
+    factors = []
+    scale = 1.
+    for oper in summand:
+        prev = factors[-1] if factors else None
+        if (isinstance(prev, DFT) and isinstance(oper, DFT)
+                and not prev.inverse and oper.inverse
+                and prev.halfspec == oper.halfspec
+                and prev.centered == oper.centered
+                and np.all(prev.N == oper.N)):
+            # FFT of real values is inverted exactly
+            factors.pop()
+            scale *= get_dft_scale(prev)*get_dft_scale(oper)
+        elif is_kernel(prev) and is_kernel(oper) and same_layout(prev, oper):
+            name = get_name(oper.name, '*', prev.name)
+            val = np.einsum('ij...,jk...->ik...', oper.get_Matrix().val,
+                            prev.get_Matrix().val)
+            factors[-1] = Matrix(name=name, val=val, Fourier=True, N=oper.N,
+                                 halfspec=oper.halfspec,
+                                 centered=oper.centered)
+        else:
+            factors.append(oper)
+    return factors, scale
+
+
+def merge_summands(summand0, summand1):
+    """
+    It returns the summand with the sum of matrices if the summands differ
+    in one matrix only (with the same layout), otherwise None.
+    """
+    if len(summand0) != len(summand1):
+        return None
+    diff = [ii for ii, (A, B) in enumerate(zip(summand0, summand1))
+            if A is not B]
+    if len(diff) != 1:
+        return None
+    A, B = summand0[diff[0]], summand1[diff[0]]
+    if not (isinstance(A, Matrix) and isinstance(B, Matrix)
+            and same_layout(A, B)):
+        return None
+    return summand0[:diff[0]] + [A + B] + summand0[diff[0]+1:]
+
+
+def is_planable(summand):
+    """
+    It returns True if all operators of summand act on arrays with out
+    argument, i.e. provide mul_val or are DFT.
+    """
+    for oper in summand:
+        if isinstance(oper, CompiledOper):
+            if not oper.planned:
+                return False
+        elif not (isinstance(oper, DFT) or hasattr(oper, 'mul_val')):
+            return False
+    return True
+
+
+class GAOper():
+    """
+    Linear operator FiN*hGN*FN*A, i.e. projection hGN applied to the product
+    with material coefficients A, which is evaluated in a fused way; unlike
+    the equivalent LinOper(mat=[[FiN, hGN, FN, A]]), it creates no
+    intermediate VecTri, the normalizations of FN and FiN are merged, and
+    the Fourier coefficients are kept in buffers reused by all calls
+
+    parameters :
+        A : Matrix, SymMatrix, PhaseMatrix, or DiagMatrix
+            material coefficients at grid points
+        hGN : Matrix or SymMatrix
+            Fourier coefficients of projection in the layout of FN
+        FN, FiN : DFT
+            forward and inverse DFT
+    """
+    def __init__(self, name='GAOper', A=None, hGN=None, FN=None, FiN=None,
+                 X=None):
+        self.name = name
+        self.A = A
+        self.hGN = hGN
+        self.FN = FN
+        self.FiN = FiN
+        if (hGN.halfspec != FN.halfspec or hGN.centered != FN.centered
+                or FN.halfspec != FiN.halfspec
+                or FN.centered != FiN.centered):
+            raise ValueError("Mismatch in layouts of projection and DFT!")
+        # normalizations of FN and FiN cancel each other by default
+        self.scale = FiN.norm_coef/FN.norm_coef
+        self.buffers = {}
+        self.dtype = np.float64
+        if X is not None:
+            self.define_operand(X)
+
+    def get_buffers(self, shape, dtype):
+        """
+        It returns (and caches) the buffers for Fourier coefficients of
+        vectors of given shape and dtype, i.e. for FN*A*x and hGN*FN*A*x;
+        the former is omitted if the FFT backend does not write to buffers
+        directly.
+        """
+        key = (shape, np.dtype(dtype).char)
+        if key not in self.buffers:
+            Fshape = shape
+            if self.FN.halfspec:
+                Fshape = shape[:-1] + (self.FN.N[-1]//2+1,)
+            backend = self.FN.backend
+            ctype = np.result_type(dtype, self.A.dtype, np.complex64)
+            if backend.direct_out:
+                FAx = backend.empty(Fshape, ctype)
+            else:
+                FAx = None
+            # only the buffers for the last shape are kept
+            self.buffers = {key: (FAx, backend.empty(Fshape, ctype))}
+        return self.buffers[key]
+
+    def __call__(self, x, out=None):
+        """
+        It returns the product with VecTri x in real space; the values are
+        stored in the array out if provided, which must not share memory
+        with x.val.
+        """
+        if x.Fourier:
+            raise ValueError("The operand has to be in real space!")
+        if out is not None and np.may_share_memory(out, x.val):
+            raise ValueError("The output shares memory with the operand!")
+        FAx, GFAx = self.get_buffers(x.val.shape, x.val.dtype)
+        Ax = self.A.mul_val(x.val, out=out)
+        FAx = self.FN.fft(Ax, out=FAx)
+        self.hGN.mul_val(FAx, out=GFAx)
+        if self.scale != 1.:
+            GFAx *= self.scale
+        if out is not None or self.FiN.backend.direct_out:
+            val = self.FiN.ifft(GFAx, out=Ax)
+        else:
+            val = self.FiN.ifft(GFAx)
+        name = get_name(self.name, '*', x.name)
+        return VecTri(name=name, val=val, Fourier=False, N=x.N)
+
+    def __mul__(self, x):
+        if isinstance(x, VecTri):
+            return self(x)
+        elif (isinstance(x, Matrix) or isinstance(x, LinOper)
+              or isinstance(x, DFT)):
+            name = self.name + '*' + x.name
+            return LinOper(name=name, mat=[[self, x]])
+
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri in real space, see
+        Matrix.mul_val.
+        """
+        return self(VecTri(val=xval, N=self.FN.N), out=out).val
+
+    def get_LinOper(self):
+        """
+        It returns the operator as the composition LinOper.
+        """
+        return LinOper(name=self.name,
+                       mat=[[self.FiN, self.hGN, self.FN, self.A]])
+
+    def __repr__(self):
+        s = 'Class : %s\nname : %s\nexpression : ' % (self.__class__.__name__,
+                                                      self.name)
+        s += '%s*%s*%s*%s (fused)' % (self.FiN.name, self.hGN.name,
+                                      self.FN.name, self.A.name)
+        return s
+
+    def define_operand(self, X):
+        if isinstance(X, VecTri):
+            Y = self(X)
+            self.shape = (Y.size, X.size)
+            self.X_reshape = X.val.shape
+            self.Y_reshape = Y.val.shape
+        else:
+            print 'GAOper : This operand is not supported'
+
+    def matvec(self, x):
+        X = VecTri(val=self.revec(x))
+        AX = self.__call__(X)
+        return AX.vec()
+
+    def vec(self, X):
+        return np.reshape(X, self.shape[1])
+
+    def revec(self, x):
+        return np.reshape(x, self.Y_reshape)
+
+    def transpose(self):
+        return self.get_LinOper().transpose()
+
+    def astype(self, dtype):
+        """
+        It returns the operator with material coefficients and projection in
+        the precision of real data type dtype, see Matrix.astype.
+        """
+        oper = GAOper(name=self.name, A=self.A.astype(dtype),
+                      hGN=self.hGN.astype(dtype), FN=self.FN, FiN=self.FiN)
+        oper.dtype = dtype
+        return oper
+
+
+class CompiledOper(LinOper):
+    """
+    Linear operator simplified by LinOper.compile; it is evaluated by an
+    execution plan, which applies the operators on arrays (mul_val, fft,
+    ifft) and stores the intermediate results in buffers that are allocated
+    at the first call and reused by next calls with operands of the same
+    shape, e.g. for all macroscopic loads
+
+    parameters :
+        mat_rev : list of lists
+            summands with operators in order of application
+        scales : list of floats
+            scalar factors of summands, i.e. the merged normalizations of DFT
+        planned : boolean
+            if False, the summands are evaluated as in LinOper, because some
+            operators do not act on arrays
+        source : LinOper
+            original operator (for transpose)
+    """
+    def __init__(self, name='CompiledOper', mat_rev=None, scales=None,
+                 planned=True, source=None, dtype=None, X=None):
+        self.scales = scales
+        self.planned = planned
+        self.source = source
+        self.plan = None
+        LinOper.__init__(self, name=name, dtype=dtype, X=X, mat_rev=mat_rev)
+
+    def __call__(self, x, out=None):
+        if not isinstance(x, VecTri):
+            return LinOper.__call__(self, x)
+        if not self.planned:
+            res = 0.
+            for summand, scale in zip(self.mat_rev, self.scales):
+                prod = x
+                for oper in summand:
+                    prod = oper(prod)
+                if scale != 1.:
+                    prod = scale*prod
+                res = prod + res
+            return res
+        meta = get_output_layout(self.mat_rev[0], {
+            'Fourier': x.Fourier, 'N': x.N, 'halfspec': x.halfspec,
+            'centered': x.centered})
+        name = get_name(self.name, '*', x.name)
+        return VecTri(name=name, val=self.mul_val(x.val, out=out), **meta)
+
+    def mul_val(self, xval, out=None):
+        """
+        It returns the product with values xval of VecTri, see
+        Matrix.mul_val.
+        """
+        if not self.planned:
+            raise NotImplementedError("The operator has no execution plan!")
+        if out is not None and np.may_share_memory(out, xval):
+            raise ValueError("The output shares memory with the operand!")
+        plan = self.get_plan(xval)
+        if out is None:
+            out = np.empty(plan['shape'], dtype=plan['dtype'])
+        for k, (summand, scale, buffers) in enumerate(
+                zip(self.mat_rev, self.scales, plan['buffers'])):
+            val = xval
+            for m, (oper, buf) in enumerate(zip(summand, buffers)):
+                if k == 0 and m == len(summand) - 1:
+                    buf = out
+                val = apply_oper(oper, val, buf)
+            if k == 0:
+                if val is not out:
+                    out[...] = val
+                if scale != 1.:
+                    out *= scale
+            elif val is xval:
+                out += scale*val
+            else:
+                if scale != 1.:
+                    val *= scale
+                out += val
+        return out
+
+    def get_plan(self, xval):
+        """
+        It returns (and caches) the execution plan for operands of the shape
+        and dtype of xval, i.e. the shape and dtype of the result and the
+        buffers of individual operators.
+
+        The intermediate results are determined by one evaluation without
+        buffers; then every operator gets a buffer of its result that
+        differs from the buffer of its operand, so two buffers per shape and
+        dtype are enough. The DFT by backends that do not write to buffers
+        directly (see fft_backends) keep their own results.
+        """
+        key = (xval.shape, xval.dtype.char)
+        if self.plan is not None and self.plan['key'] == key:
+            return self.plan
+
+        empty = np.empty
+        for summand in self.mat_rev:
+            for oper in summand:
+                if isinstance(oper, DFT):
+                    empty = oper.backend.empty
+        pool = {}
+        buffers = []
+        for k, summand in enumerate(self.mat_rev):
+            val = xval
+            prev = None
+            summand_buffers = []
+            for m, oper in enumerate(summand):
+                val = apply_oper(oper, val, None)
+                if k == 0 and m == len(summand) - 1:
+                    buf = None # the result is stored in out
+                elif (isinstance(oper, DFT)
+                      and not oper.backend.direct_out):
+                    buf = None
+                else:
+                    arrays = pool.setdefault((val.shape, val.dtype.char), [])
+                    free = [a for a in arrays if a is not prev]
+                    if free:
+                        buf = free[0]
+                    else:
+                        buf = empty(val.shape, dtype=val.dtype)
+                        arrays.append(buf)
+                summand_buffers.append(buf)
+                prev = buf
+            if k == 0:
+                shape, dtype = val.shape, val.dtype
+            buffers.append(summand_buffers)
+        self.plan = {'key': key, 'shape': shape, 'dtype': dtype,
+                     'buffers': buffers}
+        return self.plan
+
+    def transpose(self):
+        return self.source.transpose().compile()
+
+    def astype(self, dtype):
+        """
+        It returns the operator with all matrices in the precision of real
+        data type dtype, see Matrix.astype.
+        """
+        mat_rev = [[oper.astype(dtype) for oper in summand]
+                   for summand in self.mat_rev]
+        return CompiledOper(name=self.name, mat_rev=mat_rev,
+                            scales=self.scales, planned=self.planned,
+                            source=self.source.astype(dtype), dtype=dtype)
+
+    def __repr__(self):
+        s = LinOper.__repr__(self)
+        s += '\nscales : %s (compiled)' % str(self.scales)
+        return s
+
+
+def apply_oper(oper, val, out):
+    """
+    It applies the operator of CompiledOper on array val; the result is
+    stored in out if provided. DFT is evaluated without normalization.
+    """
+    if isinstance(oper, DFT):
+        if oper.inverse:
+            return oper.ifft(val, out=out)
+        else:
+            return oper.fft(val, out=out)
+    return oper.mul_val(val, out=out)
+
+
+def get_output_layout(summand, meta):
+    """
+    It returns the layout of VecTri (Fourier, N, halfspec, centered)
+    resulting from the summand of CompiledOper applied on VecTri with
+    layout meta.
+    """
+    meta = dict(meta)
+    for oper in summand:
+        if isinstance(oper, DFT):
+            meta = {'Fourier': not oper.inverse, 'N': oper.N,
+                    'halfspec': oper.halfspec and not oper.inverse,
+                    'centered': oper.centered or oper.inverse}
+        elif isinstance(oper, GAOper):
+            meta = {'Fourier': False, 'N': oper.FN.N, 'halfspec': False,
+                    'centered': True}
+        elif isinstance(oper, CompiledOper):
+            meta = get_output_layout(oper.mat_rev[0], meta)
+    return meta
+
 
 class MultiVector():
     """
@@ -94,44 +94,189 @@ def get_inverse(A):
     It calculates the inverse of conductivity coefficients at grid points,
     i.e. of matrix A_GaNi
 
+    The inverse is evaluated by closed formulas for d <= 3, by the block
+    inversion with Schur complement of 3x3 blocks for d = 6 (elasticity in
+    Mandel's notation), and by batched LAPACK otherwise.
+
     Parameters
     ----------
-    A : numpy.ndarray
+    A : numpy.ndarray of shape (d, d, N)
 
     Returns
     -------
-    invA : numpy.ndarray
+    invA : numpy.ndarray of shape (d, d, N)
     """
-    B = np.copy(A)
-    N = np.array(A.shape[2:])
-    d = A.shape[0]
     if A.shape[0] != A.shape[1]:
         raise NotImplementedError("Non-square matrix!")
+    d = A.shape[0]
+
+    if d == 1:
+        return 1./A
+    elif d == 2:
+        invA = np.empty_like(A)
+        invA[0, 0] = A[1, 1]
+        invA[1, 1] = A[0, 0]
+        invA[0, 1] = -A[0, 1]
+        invA[1, 0] = -A[1, 0]
+        invA /= A[0, 0]*A[1, 1] - A[0, 1]*A[1, 0]
+        return invA
+    elif d == 3:
+        return get_inverse_3x3(A)
+    elif d == 6:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            invA = get_inverse_schur(A, 3)
+        if np.all(np.isfinite(invA)): # otherwise singular diagonal block
+            return invA
+    return get_inverse_lapack(A)
+
+
+def get_inverse_3x3(A):
+    """
+    Inverse of 3x3 matrices at grid points by the adjugate (cofactor) matrix.
+    """
+    invA = np.empty_like(A)
+    invA[0, 0] = A[1, 1]*A[2, 2] - A[1, 2]*A[2, 1]
+    invA[0, 1] = A[0, 2]*A[2, 1] - A[0, 1]*A[2, 2]
+    invA[0, 2] = A[0, 1]*A[1, 2] - A[0, 2]*A[1, 1]
+    invA[1, 0] = A[1, 2]*A[2, 0] - A[1, 0]*A[2, 2]
+    invA[1, 1] = A[0, 0]*A[2, 2] - A[0, 2]*A[2, 0]
+    invA[1, 2] = A[0, 2]*A[1, 0] - A[0, 0]*A[1, 2]
+    invA[2, 0] = A[1, 0]*A[2, 1] - A[1, 1]*A[2, 0]
+    invA[2, 1] = A[0, 1]*A[2, 0] - A[0, 0]*A[2, 1]
+    invA[2, 2] = A[0, 0]*A[1, 1] - A[0, 1]*A[1, 0]
+    invA /= A[0, 0]*invA[0, 0] + A[0, 1]*invA[1, 0] + A[0, 2]*invA[2, 0]
+    return invA
 
-    invA = np.eye(d).tolist()
-    for m in np.arange(d):
-        Bdiag = np.copy(B[m][m])
-        B[m][m] = np.ones(N)
-        for n in np.arange(m+1, d):
-            B[m][n] = B[m][n]/Bdiag
-        for n in np.arange(d):
-            invA[m][n] = invA[m][n]/Bdiag
-        for k in np.arange(m+1, d):
-            Bnull = np.copy(B[k][m])
-            for l in np.arange(d):
-                B[k][l] = B[k][l] - B[m][l]*Bnull
-                invA[k][l] = invA[k][l] - invA[m][l]*Bnull
-    for m in np.arange(d-1, -1, -1):
-        for k in np.arange(m-1, -1, -1):
-            Bnull = np.copy(B[k][m])
-            for l in np.arange(d):
-                B[k][l] = B[k][l] - B[m][l]*Bnull
-                invA[k][l] = invA[k][l] - invA[m][l]*Bnull
-    invA = np.array(invA)
+
+def get_inverse_schur(A, k):
+    """
+    Inverse of matrices at grid points by the block inversion
+        [P Q]^{-1} = [P^{-1} + P^{-1}*Q*S^{-1}*R*P^{-1}  -P^{-1}*Q*S^{-1}]
+        [R T]        [-S^{-1}*R*P^{-1}                   S^{-1}         ]
+    with the Schur complement S = T - R*P^{-1}*Q and the leading block P of
+    size (k, k); it is suitable for symmetric positive definite matrices,
+    e.g. elastic tensors in Mandel's notation.
+    """
+    P, Q = A[:k, :k], A[:k, k:]
+    R, T = A[k:, :k], A[k:, k:]
+    invP = get_inverse(P)
+    invPQ = mul_pointwise(invP, Q)
+    RinvP = mul_pointwise(R, invP)
+    invS = get_inverse(T - mul_pointwise(R, invPQ))
+    invA = np.empty_like(A)
+    invA[k:, k:] = invS
+    invA[:k, k:] = -mul_pointwise(invPQ, invS)
+    invA[k:, :k] = -mul_pointwise(invS, RinvP)
+    invA[:k, :k] = invP - mul_pointwise(invA[:k, k:], RinvP)
     return invA
 
 
-def enlarge(xN, M):
+def get_inverse_lapack(A):
+    """
+    Inverse of matrices at grid points by batched LAPACK routines acting on
+    the view of shape (N, d, d).
+    """
+    nd = A.ndim
+    invA = np.linalg.inv(np.rollaxis(np.rollaxis(A, 0, nd), 0, nd))
+    return np.ascontiguousarray(np.rollaxis(np.rollaxis(invA, -1), -1))
+
+
+def mul_pointwise(A, B):
+    """
+    Product of matrices of shapes (d, m, N) and (m, n, N) at grid points.
+    """
+    Nshape = np.broadcast(A[0, 0], B[0, 0]).shape
+    AB = np.empty((A.shape[0], B.shape[1]) + Nshape,
+                  dtype=np.result_type(A, B))
+    for ii in np.arange(A.shape[0]):
+        for jj in np.arange(B.shape[1]):
+            AB[ii, jj] = A[ii, 0]*B[0, jj]
+            for kk in np.arange(1, A.shape[1]):
+                AB[ii, jj] += A[ii, kk]*B[kk, jj]
+    return AB
+
+
+def solve_pointwise(A, b):
+    """
+    It solves the linear systems A*x = b at grid points; the matrices are
+    inverted by closed formulas for d <= 3, otherwise the systems are solved
+    by batched LAPACK without forming the inverse.
+
+    Parameters
+    ----------
+    A : numpy.ndarray of shape (d, d, N)
+    b : numpy.ndarray of shape (d, N)
+
+    Returns
+    -------
+    x : numpy.ndarray of shape (d, N)
+    """
+    d = A.shape[0]
+    if d <= 3:
+        return np.einsum('ij...,j...->i...', get_inverse(A), b)
+    nd = A.ndim
+    Ab = np.rollaxis(np.rollaxis(A, 0, nd), 0, nd)
+    bb = np.rollaxis(b, 0, b.ndim)[..., np.newaxis]
+    x = np.linalg.solve(Ab, bb)[..., 0]
+    return np.ascontiguousarray(np.rollaxis(x, -1))
+
+
+def get_structure(A):
+    """
+    It returns the structure of matrices A of shape (n, d, d), i.e.
+    'isotropic' (multiples of identity), 'diagonal', 'symmetric', or 'full'.
+    """
+    A = np.asarray(A)
+    d = A.shape[-1]
+    diag = A[..., np.arange(d), np.arange(d)]
+    if np.any(A*(1 - np.eye(d)) != 0):
+        if np.all(A == np.swapaxes(A, -1, -2)):
+            return 'symmetric'
+        return 'full'
+    elif np.all(diag == diag[..., :1]):
+        return 'isotropic'
+    else:
+        return 'diagonal'
+
+
+def get_sym_indices(d):
+    """
+    It returns the indices (m, n) with m <= n of the components of symmetric
+    matrices in packed storage, i.e. the upper triangle stored row by row.
+    """
+    return np.triu_indices(d)
+
+
+def pack_sym(A):
+    """
+    It stores the symmetric matrices A of shape (d, d, N) in packed storage
+    of shape (d*(d+1)/2, N), see get_sym_indices.
+    """
+    return A[get_sym_indices(A.shape[0])]
+
+
+def unpack_sym(Ap, d):
+    """
+    Inverse function to pack_sym.
+    """
+    ind = get_sym_indices(d)
+    A = np.empty((d, d) + Ap.shape[1:], dtype=Ap.dtype)
+    A[ind] = Ap
+    A[ind[1], ind[0]] = Ap
+    return A
+
+
+def cast_precision(val, dtype):
+    """
+    It returns the array val in the precision of real data type dtype, i.e.
+    the complex values are cast to the complex type of the same precision.
+    """
+    if np.iscomplexobj(val):
+        dtype = np.result_type(dtype, np.complex64)
+    return np.asarray(val).astype(dtype)
+
+
+def enlarge(xN, M, halfspec=False, centered=True):
     """
     Enlarge an array of Fourier coefficients by zeros.
 
@@ -139,32 +284,41 @@ def enlarge(xN, M):
     ----------
     xN : numpy.ndarray of shape = N
         input array that is to be enlarged
+    M : array like
+        number of grid points
+    halfspec : boolean
+        if True, the last axis stores only the non-negative frequencies
+        (half-spectrum of real trigonometric polynomial, see numpy.fft.rfftn)
+    centered : boolean
+        if False, the coefficients are stored in natural order of FFT
+        (zero frequency first), otherwise zero frequency is in the middle
 
     Returns
     -------
     xM : numpy.ndarray of shape = M
         output array that is enlarged
-    M : array like
-        number of grid points
     """
-    xM = np.zeros(M, dtype=xN.dtype)
-    M = np.array(M)
+    M = np.array(M, dtype=np.int32)
     N = np.array(np.shape(xN))
+    if halfspec:
+        M = get_Nhalf(M)
     if np.allclose(M, N):
         return xN
-    dim = np.size(N)
-    ibeg = (M-N+(N % 2))/2
-    iend = (M+N+(N % 2))/2
-    if dim == 2:
-        xM[ibeg[0]:iend[0], ibeg[1]:iend[1]] = xN
-    elif dim == 3:
-        xM[ibeg[0]:iend[0], ibeg[1]:iend[1], ibeg[2]:iend[2]] = xN
+    xM = np.zeros(M, dtype=xN.dtype)
+    if centered:
+        ibeg = (M-N+(N % 2))//2
+        iend = (M+N+(N % 2))//2
+        if halfspec:
+            ibeg[-1] = 0
+            iend[-1] = N[-1]
+        xM[tuple(slice(ib, ie) for ib, ie in zip(ibeg, iend))] = xN
     else:
-        raise NotImplementedError()
+        ind_N, ind_M = get_index_uncentered(N, M, halfspec)
+        xM[np.ix_(*ind_M)] = xN[np.ix_(*ind_N)]
     return xM
 
 
-def enlarge_M(xN, M):
+def enlarge_M(xN, M, halfspec=False, centered=True):
     """
     Matrix representation of enlarge function.
 
@@ -172,26 +326,36 @@ def enlarge_M(xN, M):
     ----------
     xN : numpy.ndarray of shape = (dim, dim) + N
         input matrix that is to be enlarged
+    M : array like
+        number of grid points
+    halfspec : boolean
+        if True, the last axis stores only the non-negative frequencies
+    centered : boolean
+        if False, the coefficients are stored in natural order of FFT
 
     Returns
     -------
     xM : numpy.ndarray of shape = (dim, dim) + M
         output matrix that is enlarged
-    M : array like
-        number of grid points
     """
     M = np.array(M, dtype=np.int32)
     N = np.array(xN.shape[2:])
-    if np.allclose(M, N):
+    if halfspec:
+        Mval = get_Nhalf(M)
+    else:
+        Mval = M
+    if np.allclose(Mval, N):
         return xN
-    xM = np.zeros(np.hstack([xN.shape[0], xN.shape[1], M]))
+    xM = np.zeros(np.hstack([xN.shape[0], xN.shape[1], Mval]),
+                  dtype=xN.dtype)
     for m in np.arange(xN.shape[0]):
         for n in np.arange(xN.shape[1]):
-            xM[m][n] = enlarge(xN[m][n], M)
+            xM[m][n] = enlarge(xN[m][n], M, halfspec=halfspec,
+                               centered=centered)
     return xM
 
 
-def decrease(xN, M):
+def decrease(xN, M, halfspec=False, centered=True):
     """
     Decreases an array of Fourier coefficients by omitting the highest
     frequencies.
@@ -199,27 +363,136 @@ def decrease(xN, M):
     Parameters
     ----------
     xN : numpy.ndarray of shape = N
-        input array that is to be enlarged
+        input array that is to be decreased
+    M : array like
+        number of grid points
+    halfspec : boolean
+        if True, the last axis stores only the non-negative frequencies
+    centered : boolean
+        if False, the coefficients are stored in natural order of FFT
 
     Returns
     -------
     xM : numpy.ndarray of shape = M
-        output array that is enlarged
-    M : array like
-        number of grid points
+        output array that is decreased
     """
     M = np.array(M, dtype=np.int32)
     N = np.array(xN.shape, dtype=np.int32)
-    dim = N.size
-    ibeg = (N-M+(M % 2))/2
-    iend = (N+M+(M % 2))/2
-    if dim == 2:
-        xM = xN[ibeg[0]:iend[0], ibeg[1]:iend[1]]
-    elif dim == 3:
-        xM = xN[ibeg[0]:iend[0], ibeg[1]:iend[1], ibeg[2]:iend[2]]
+    if halfspec:
+        M = get_Nhalf(M)
+    if centered:
+        ibeg = (N-M+(M % 2))//2
+        iend = (N+M+(M % 2))//2
+        if halfspec:
+            ibeg[-1] = 0
+            iend[-1] = M[-1]
+        xM = xN[tuple(slice(ib, ie) for ib, ie in zip(ibeg, iend))]
+    else:
+        ind_M, ind_N = get_index_uncentered(M, N, halfspec)
+        xM = xN[np.ix_(*ind_N)]
     return xM
 
 
+def get_index_uncentered(N, M, halfspec=False):
+    """
+    It returns the indices of frequencies of N-sized grid in the arrays of
+    Fourier coefficients stored in natural order of FFT for both N-sized
+    and M-sized grids (M >= N).
+
+    Parameters
+    ----------
+    N, M : numpy.ndarray
+        shapes of arrays of Fourier coefficients
+    halfspec : boolean
+        if True, the last axis stores only the non-negative frequencies
+
+    Returns
+    -------
+    ind_N, ind_M : list of numpy.ndarray
+        indices along individual axes
+    """
+    ind_N = []
+    ind_M = []
+    for ii in np.arange(np.size(N)):
+        if halfspec and ii == np.size(N)-1:
+            ind_N.append(np.arange(N[ii]))
+            ind_M.append(np.arange(N[ii]))
+        else:
+            ZN = np.array(np.round(np.fft.fftfreq(N[ii], 1./N[ii])),
+                          dtype=np.int32) # frequencies in natural order
+            ind_N.append(ZN % N[ii])
+            ind_M.append(ZN % M[ii])
+    return ind_N, ind_M
+
+
+def get_phase_uncentered(N, M, halfspec=False):
+    """
+    The Fourier coefficients of uncentered DFT of grid values (whose origin
+    is in the middle of the grid) differ from the centered ones by a phase
+    factor depending on grid size. It returns the factor that transfers
+    the coefficients (in natural order) of N-sized grid to M-sized grid.
+
+    Parameters
+    ----------
+    N, M : numpy.ndarray
+        sizes of (full) grids; if M is None, the factor transfers the
+        coefficients to the ones of centered DFT
+    halfspec : boolean
+        if True, the factor is returned for the half-spectrum of N-sized grid
+
+    Returns
+    -------
+    phase : numpy.ndarray of shape N (or its half-spectrum)
+    """
+    N = np.array(N, dtype=np.int32)
+    dim = N.size
+    phase = np.ones(get_Nhalf(N) if halfspec else N, dtype=np.complex128)
+    for ii in np.arange(dim):
+        if halfspec and ii == dim-1:
+            k = np.arange(N[ii]//2+1)
+        else:
+            k = np.fft.fftfreq(N[ii], 1./N[ii])
+        shift = float(N[ii]//2)/N[ii]
+        if M is not None:
+            shift -= float(M[ii]//2)/M[ii]
+        Nshape = np.ones(dim, dtype=np.int32)
+        Nshape[ii] = k.size
+        phase = phase*np.reshape(np.exp(2*np.pi*1j*k*shift), Nshape)
+    return phase
+
+
 def get_Nodd(N):
     Nodd = N - ((N + 1) % 2)
     return Nodd
+
+
+def get_Nhalf(N):
+    """
+    Shape of half-spectrum (numpy.fft.rfftn) of a real array of shape N.
+    """
+    Nhalf = np.array(N, dtype=np.int32)
+    Nhalf[-1] = Nhalf[-1]//2 + 1
+    return Nhalf
+
+
+def get_halfspec_weights(N):
+    """
+    Weights of the half-spectrum coefficients along the last axis, which
+    account for the omitted complex conjugate coefficients in sums over
+    the full spectrum.
+
+    Parameters
+    ----------
+    N : array like
+        number of grid points of the full (real) grid
+
+    Returns
+    -------
+    w : numpy.ndarray of shape = (N[-1]//2 + 1,)
+    """
+    n = int(np.array(N)[-1])
+    w = 2*np.ones(n//2 + 1)
+    w[0] = 1.
+    if n % 2 == 0:
+        w[-1] = 1.
+    return w
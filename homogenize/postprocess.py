@@ -7,6 +7,7 @@ def postprocess(pb, A, mat, solutions, results, primaldual):
     tim = dbg.start_time()
     print '\npostprocessing'
     matrices = {}
+    enlarged = {} # solutions enlarged for the scheme Ga
     for pp in pb.postprocess:
         if pp['kind'] in ['GaNi', 'gani']:
             order_name = ''
@@ -36,7 +37,7 @@ def postprocess(pb, A, mat, solutions, results, primaldual):
         name = 'AH_%s%s%s_%s' % (pp['kind'], order_name, Nname, primaldual)
         print 'calculated: ' + name
 
-        AH = assembly_matrix(A, solutions)
+        AH = assembly_matrix(A, solutions, enlarged)
 
         if primaldual is 'primal':
             matrices[name] = AH
@@ -49,21 +50,43 @@ def postprocess(pb, A, mat, solutions, results, primaldual):
                       'res_' + primaldual: results,
                       'mat_' + primaldual: matrices})
 
-def assembly_matrix(Afun, solutions):
+def assembly_matrix(Afun, solutions, enlarged=None):
+    """
+    It assembles the homogenized matrix AH[i, j] = Afun(sol[i]) * sol[j] from
+    the solutions enlarged to the grid of material coefficients (Afun).
+
+    The coefficients are applied once per solution and the inner products
+    of the resulting flux with all the solutions are evaluated as one
+    matrix-vector product. The enlarged solutions are stored in the dict
+    (enlarged) under the size of grid, so that they are shared by several
+    calls, see postprocess.
+    """
     dim = len(solutions)
-    if not np.allclose(Afun.N, solutions[0].N):
-        Nbar = Afun.N
-        sol = []
-        for ii in np.arange(dim):
-            sol.append(solutions[ii].enlarge(Nbar))
-    else:
+    Nbar = tuple(np.reshape(Afun.N, -1))
+    if np.allclose(Afun.N, solutions[0].N):
         sol = solutions
+    elif enlarged is not None and Nbar in enlarged:
+        sol = enlarged[Nbar]
+    else:
+        sol = [solutions[ii].enlarge(Afun.N) for ii in np.arange(dim)]
+        if enlarged is not None:
+            enlarged[Nbar] = sol
 
     AH = np.zeros([dim, dim])
+    if any([X.Fourier or X.halfspec for X in sol]):
+        for ii in np.arange(dim):
+            flux = Afun(sol[ii])
+            for jj in np.arange(dim):
+                AH[ii, jj] = flux * sol[jj]
+        return AH
+
+    S = np.array([np.reshape(X.val, -1) for X in sol])
+    if np.iscomplexobj(S):
+        S = np.conj(S)
     for ii in np.arange(dim):
-        for jj in np.arange(dim):
-            AH[ii, jj] = Afun(sol[ii]) * sol[jj]
-    return AH
+        flux = Afun(sol[ii])
+        AH[ii] = np.real(np.dot(S, np.reshape(flux.val, -1)))
+    return AH/np.prod(sol[0].N)
 
 
 def add_macro2minimizer(X, E):
@@ -1,12 +1,14 @@
 import numpy as np
 import homogenize.applications
 from general.base import get_base_dir
+import copy
 import os
 import sys
 import general.dbg as dbg
+from general.parallel import parallel_map, in_worker
 
 class Problem(object):
-    def __init__(self, conf_problem=None, conf=None):
+    def __init__(self, conf_problem=None, conf=None, previous=None):
         self.__dict__.update(conf_problem)
         if isinstance(self.material, str):
             conf_material = conf.materials[self.material]
@@ -25,6 +27,18 @@ class Problem(object):
 
         self.output = {}
 
+        # operators depending only on the grid shared by a parameter sweep,
+        # see applications.get_operators
+        self.operators = None
+
+        # solutions used as initial approximations of solvers, see
+        # applications.get_initial
+        self.initial = None
+        if 'x0' in self.solve and self.solve['x0'] == 'previous':
+            if previous is None:
+                raise ValueError("The previous problem is required for x0!")
+            self.initial = previous.get_solutions()
+
     @staticmethod
     def parse_material(conf_material):
         if 'fun' in conf_material:
@@ -50,6 +64,8 @@ class Problem(object):
     def calculate(self):
         print '\n=============================='
         tim = dbg.start_time()
+        if 'continuation' in self.solve:
+            self.solve_coarse()
         if self.physics == 'scalar':
             homogenize.applications.scalar(self)
         elif self.physics == 'elasticity':
@@ -58,6 +74,49 @@ class Problem(object):
             raise ValueError("Not implemented physics (%s)." % self.physics)
         tim = dbg.get_time(tim)
         print 'total time for problem', tim
+        self.output['time'] = tim
+
+    def solve_coarse(self):
+        """
+        Nested-grid continuation, i.e. the problem is solved on the coarse
+        grids self.solve['continuation'] (sizes in increasing order) first,
+        where the solutions from one grid are the initial approximations on
+        the next one; the solutions from the last coarse grid are stored to
+        self.initial.
+
+        It is only a warm start, not a speed-up: the coarse solutions reduce
+        the initial residual on the fine grid, but the remaining error lies
+        in the components not resolved by the coarse grids, so the no. of
+        iterations of CG hardly changes. The coarse solves thus usually
+        cost more than they save, e.g. for the square inclusion
+        (examples/scalar/scalar_2d.py) on grid N = 63 with tolerance 1e-8,
+        the continuation from 15 and 31 changes the fine-grid iterations from
+        25 to 25 (GaNi) and from 28 to 26 (Ga), while the total time grows
+        by a factor of 2.
+        """
+        initial = self.initial
+        for N in self.solve['continuation']:
+            coarse = copy.copy(self)
+            coarse.solve = dict(self.solve, N=np.array(N, dtype=np.int32))
+            del coarse.solve['continuation']
+            coarse.name = '%s_N%s' % (self.name, str(coarse.solve['N']))
+            coarse.postprocess = []
+            coarse.output = {}
+            coarse.operators = None
+            coarse.initial = initial
+            coarse.calculate()
+            initial = coarse.get_solutions()
+        self.initial = initial
+
+    def get_solutions(self):
+        """
+        It returns the solutions of calculated problem (including
+        the macroscopic loads) for individual formulations (primaldual).
+        """
+        solutions = {}
+        for primaldual in self.solve['primaldual']:
+            solutions[primaldual] = self.output['sol_' + primaldual]
+        return solutions
 
     def postprocessing(self):
         output = self.output
@@ -106,6 +165,101 @@ class Problem(object):
         return ss
 
 
+def calculate(ii, conf, previous=None):
+    """
+    It returns the calculated problem conf.problems[ii], e.g. in a worker
+    process, see main.py; the problem is identified by its index, so its
+    configuration is not pickled.
+    """
+    prob = Problem(conf.problems[ii], conf, previous=previous)
+    prob.calculate()
+    return prob
+
+
+def sweep(conf_problem, materials, conf=None, processes=1):
+    """
+    Parameter sweep over material variants (e.g. volume fractions, contrasts
+    or sizes of inclusions) with the same configuration of problem, i.e. with
+    the same grid (solve['N']) and the same size of PUC (Y).
+
+    The operators depending only on the grid (projections, DFTs and
+    coordinates, see applications.get_operators) are built once and shared
+    by all variants, which are calculated one by one or in parallel processes
+    (see general.parallel.parallel_map), where the operators are shared
+    with the worker processes without pickling.
+
+    Parameters
+    ----------
+    conf_problem : dict
+        configuration of problem, where the material is replaced by variants
+    materials : list or generator
+        material variants, i.e. definitions of materials or their names in
+        conf.materials
+    conf : module
+        input file with the definitions of materials (conf.materials)
+    processes : int
+        no. of processes; the generator of variants is evaluated at once for
+        more than one process
+
+    Yields
+    ------
+    prob : Problem
+        calculated problem of a variant named with its index; the time of
+        calculation is stored in prob.output['time']
+    """
+    if processes > 1:
+        materials = list(materials)
+        if len(materials) == 0:
+            return
+        operators = get_variant(conf_problem, materials, 0, conf).operators
+        problems = parallel_map(calculate_variant,
+                                range(len(materials)), processes=processes,
+                                conf_problem=conf_problem,
+                                materials=materials, conf=conf,
+                                operators=operators)
+        for prob in problems:
+            yield prob
+        return
+
+    operators = None
+    for ii, material in enumerate(materials):
+        prob = calculate_variant(0, conf_problem, [material], conf,
+                                 operators=operators, index=ii)
+        operators = prob.operators
+        prob.operators = None
+        yield prob
+
+
+def get_variant(conf_problem, materials, ii, conf=None, operators=None):
+    """
+    It returns the problem for the material variant materials[ii] of
+    a parameter sweep (see sweep) with the operators shared by the variants,
+    which are built for None.
+    """
+    prob = Problem(dict(conf_problem, material=materials[ii]), conf)
+    if operators is None:
+        operators = homogenize.applications.get_operators(prob)
+    prob.operators = operators
+    return prob
+
+
+def calculate_variant(ii, conf_problem, materials, conf=None,
+                      operators=None, index=None):
+    """
+    It returns the calculated problem of the material variant materials[ii]
+    named with its index in the sweep (ii for None), see sweep; the shared
+    operators are kept in prob.operators only in the calling process.
+    """
+    prob = get_variant(conf_problem, materials, ii, conf, operators)
+    if index is None:
+        index = ii
+    prob.name = '%s_%d' % (prob.name, index)
+    prob.calculate()
+    if in_worker(): # the operators are not sent back
+        prob.operators = None
+    return prob
+
+
 def import_file(file_name):
     base_dir = get_base_dir()
     module_path = os.path.dirname(os.path.join(base_dir, file_name))
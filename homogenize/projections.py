@@ -1,11 +1,12 @@
 import numpy as np
+import copy
 import scipy as sp
 # from homogenize.matvec_fun import TrigPolynomial, enlarge_M, get_Nodd
-from homogenize.matvec_fun import Grid
-from homogenize.matvec import Matrix, get_Nodd
+from homogenize.matvec_fun import Grid, get_sym_indices, pack_sym
+from homogenize.matvec import SymMatrix, VecTri, get_Nodd
 
 
-def scalar(N, Y, centered=True, NyqNul=True):
+def scalar(N, Y, centered=True, NyqNul=True, halfspec=False):
     """
     Assembly of discrete kernels in Fourier space for scalar elliptic problems.
 
@@ -15,18 +16,23 @@ def scalar(N, Y, centered=True, NyqNul=True):
         no. of discretization points
     Y : numpy.ndarray
         size of periodic unit cell
+    centered : boolean
+        if False, the kernels are stored in natural order of FFT, see DFT
+    halfspec : boolean
+        if True, the kernels are stored on half-spectrum only, see DFT
 
     Returns
     -------
-    G1l : numpy.ndarray
+    G1l : SymMatrix
         discrete kernel in Fourier space; provides projection
         on curl-free fields with zero mean
-    G2l : numpy.ndarray
+    G2l : SymMatrix
         discrete kernel in Fourier space; provides projection
         on divergence-free fields with zero mean
     """
     d = np.size(N)
     N = np.array(N)
+    D = d*(d+1)/2
     if NyqNul:
         Nred = get_Nodd(N)
     else:
@@ -37,9 +43,10 @@ def scalar(N, Y, centered=True, NyqNul=True):
     for m in np.arange(d):
         xi2.append(xi[m]**2)
 
-    G0l = np.zeros(np.hstack([d, d, Nred]))
-    G1l = np.zeros(np.hstack([d, d, Nred]))
-    G2l = np.zeros(np.hstack([d, d, Nred]))
+    # kernels are symmetric, so they are stored in packed storage
+    G0l = np.zeros(np.hstack([D, Nred]))
+    G1l = np.zeros(np.hstack([D, Nred]))
+    G2l = np.zeros(np.hstack([D, Nred]))
     num = np.zeros(np.hstack([d, d, Nred]))
     denom = np.zeros(Nred)
 
@@ -52,7 +59,6 @@ def scalar(N, Y, centered=True, NyqNul=True):
         a = np.reshape(xi2[m], Nshape)
         num[m][m] = np.tile(a, Nrep) # numerator
         denom = denom + num[m][m]
-        G0l[m, m][ind_center] = 1
 
     for m in np.arange(d): # upper diagonal components
         for n in np.arange(m+1, d):
@@ -71,36 +77,35 @@ def scalar(N, Y, centered=True, NyqNul=True):
     denom[ind_center] = 1
 
     # calculation of projections
-    for m in np.arange(d):
-        for n in np.arange(m, d):
-            G1l[m][n] = num[m][n]/denom
-            G2l[m][n] = (m == n)*np.ones(Nred) - G1l[m][n]
-            G2l[m][n][ind_center] = 0
-
-    # symmetrization
-    for m in np.arange(1, d):
-        for n in np.arange(m):
-            G1l[m][n] = G1l[n][m]
-            G2l[m][n] = G2l[n][m]
-
-    if not centered:
-        for m in np.arange(d):
-            for n in np.arange(d):
-                G1l[m][n] = np.fft.ifftshift(G1l[m][n])
-                G2l[m][n] = np.fft.ifftshift(G2l[m][n])
+    for k, (m, n) in enumerate(zip(*get_sym_indices(d))):
+        if m == n:
+            G0l[k][ind_center] = 1
+        G1l[k] = num[m][n]/denom
+        G2l[k] = (m == n)*np.ones(Nred) - G1l[k]
+        G2l[k][ind_center] = 0
 
-    G0l = Matrix(name='hG0', val=G0l, Fourier=True)
-    G1l = Matrix(name='hG1', val=G1l, Fourier=True)
-    G2l = Matrix(name='hG2', val=G2l, Fourier=True)
+    G0l = SymMatrix(name='hG0', val=G0l, Fourier=True)
+    G1l = SymMatrix(name='hG1', val=G1l, Fourier=True)
+    G2l = SymMatrix(name='hG2', val=G2l, Fourier=True)
 
     if NyqNul:
         G0l = G0l.enlarge(N)
         G1l = G1l.enlarge(N)
         G2l = G2l.enlarge(N)
+
+    if not centered:
+        G0l = G0l.get_uncentered()
+        G1l = G1l.get_uncentered()
+        G2l = G2l.get_uncentered()
+
+    if halfspec:
+        G0l = G0l.get_halfspec()
+        G1l = G1l.get_halfspec()
+        G2l = G2l.get_halfspec()
     return G0l, G1l, G2l
 
 
-def elasticity(N, Y, centered=True, NyqNul=True): # (N, d, D, Y):
+def elasticity(N, Y, centered=True, NyqNul=True, halfspec=False):
     """
     Projection matrix on a space of admissible strain fields
     INPUT =
@@ -108,8 +113,10 @@ def elasticity(N, Y, centered=True, NyqNul=True): # (N, d, D, Y):
         d : dimension; d = 2
         D : dimension in engineering notation; D = 3
         Y : the size of periodic unit cell
+        centered : if False, the kernels are stored in natural order of FFT
+        halfspec : if True, the kernels are stored on half-spectrum only
     OUTPUT =
-        G1h,G1s,G2h,G2s : projection matrices of size DxDxN
+        G1h,G1s,G2h,G2s : projection matrices of size DxDxN (SymMatrix)
     """
     xi = Grid.get_xil(N, Y)
     N = np.array(N)
@@ -222,19 +229,12 @@ def elasticity(N, Y, centered=True, NyqNul=True): # (N, d, D, Y):
     G2h = 1./(d-1)*(d*Lamh + G1h - W - WT)
     G2s = IS0 - G1h - G1s - G2h
 
-    if not centered:
-        for m in np.arange(d):
-            for n in np.arange(d):
-                G1h[m][n] = np.fft.ifftshift(G1h[m][n])
-                G1s[m][n] = np.fft.ifftshift(G1s[m][n])
-                G2h[m][n] = np.fft.ifftshift(G2h[m][n])
-                G2s[m][n] = np.fft.ifftshift(G2s[m][n])
-
-    G0 = Matrix(name='hG1', val=mean, Fourier=True)
-    G1h = Matrix(name='hG1', val=G1h, Fourier=True)
-    G1s = Matrix(name='hG1', val=G1s, Fourier=True)
-    G2h = Matrix(name='hG1', val=G2h, Fourier=True)
-    G2s = Matrix(name='hG1', val=G2s, Fourier=True)
+    # kernels are symmetric, so they are stored in packed storage
+    G0 = SymMatrix(name='hG1', val=pack_sym(mean), Fourier=True)
+    G1h = SymMatrix(name='hG1', val=pack_sym(G1h), Fourier=True)
+    G1s = SymMatrix(name='hG1', val=pack_sym(G1s), Fourier=True)
+    G2h = SymMatrix(name='hG1', val=pack_sym(G2h), Fourier=True)
+    G2s = SymMatrix(name='hG1', val=pack_sym(G2s), Fourier=True)
 
     if NyqNul:
         G0 = G0.enlarge(N)
@@ -242,7 +242,383 @@ def elasticity(N, Y, centered=True, NyqNul=True): # (N, d, D, Y):
         G1s = G1s.enlarge(N)
         G2h = G2h.enlarge(N)
         G2s = G2s.enlarge(N)
+
+    if not centered:
+        G1h = G1h.get_uncentered()
+        G1s = G1s.get_uncentered()
+        G2h = G2h.get_uncentered()
+        G2s = G2s.get_uncentered()
+
+    if halfspec:
+        G1h = G1h.get_halfspec()
+        G1s = G1s.get_halfspec()
+        G2h = G2h.get_halfspec()
+        G2s = G2s.get_halfspec()
     return mean, G1h, G1s, G2h, G2s
 
+
+class ProjectionOperator():
+    """
+    Matrix-free projection in Fourier space on compatible (G1) or equilibrated
+    (G2) fields with zero mean; it is an alternative to the kernels from the
+    functions scalar and elasticity, which are evaluated on the fly from
+    the frequencies instead of being stored as (d, d, N) arrays.
+
+    The projection G1 is based on the rank-one structure of the kernels,
+    i.e. for scalar problems G1(xi) = xi*xi^T/|xi|^2 and for elasticity
+    G1(xi):e = n*(e*n)^T + (e*n)*n^T - (n^T*e*n)*n*n^T with n = xi/|xi|,
+    where the strains e are stored in Mandel's notation. The projection
+    G2 = I - G1 vanishes for zero frequency. The memory requirements are
+    O(N) instead of O(d^2*N).
+
+    Parameters
+    ----------
+    N : numpy.ndarray
+        no. of discretization points (support of the projection)
+    Y : numpy.ndarray
+        size of periodic unit cell
+    physics : str
+        'scalar' or 'elasticity'
+    kind : str
+        'G1' (compatible fields) or 'G2' (equilibrated fields)
+    centered, halfspec : boolean
+        layout of Fourier coefficients, see DFT
+    NyqNul : boolean
+        if True, the projection is zero for Nyquist frequencies (even N)
+    M : numpy.ndarray
+        size of the grid of Fourier coefficients, on which the operator
+        acts; the projection is zero outside the support N, see enlarge
+    """
+    def __init__(self, N, Y, physics='scalar', kind='G1', centered=True,
+                 halfspec=False, NyqNul=True, M=None, name=None):
+        self.N = np.array(N, dtype=np.int32)
+        self.Y = np.array(Y, dtype=np.float64)
+        if M is None:
+            self.M = self.N
+        else:
+            self.M = np.array(M, dtype=np.int32)
+        self.dim = self.N.size
+        self.physics = physics
+        self.kind = kind
+        self.centered = centered
+        self.halfspec = halfspec
+        self.NyqNul = NyqNul
+        self.Fourier = True
+        if name is None:
+            self.name = 'h%s' % kind
+        else:
+            self.name = name
+
+        if physics == 'scalar':
+            self.d = self.dim
+        elif physics == 'elasticity':
+            self.d = self.dim*(self.dim+1)/2
+        else:
+            raise ValueError("Not implemented physics (%s)." % physics)
+
+        if kind not in ['G1', 'G2']:
+            raise ValueError("Not implemented projection (%s)." % kind)
+
+        # frequencies as 1D arrays ready for broadcasting
+        self.xi = []
+        weight = 1.
+        for ii in np.arange(self.dim):
+            k, supp = self.get_frequencies(ii)
+            Nshape = np.ones(self.dim, dtype=np.int32)
+            Nshape[ii] = k.size
+            self.xi.append(np.reshape(k/self.Y[ii], Nshape))
+            weight = weight*np.reshape(supp, Nshape)
+
+        norm2_xi = 0.
+        for ii in np.arange(self.dim):
+            norm2_xi = norm2_xi + self.xi[ii]**2
+        self.mask = np.logical_and(weight, norm2_xi > 0)
+        norm2_xi[np.logical_not(self.mask)] = 1.
+        # inverse of the square of frequency norm; zero out of the support
+        self.weight = self.mask/norm2_xi
+
+    def get_frequencies(self, ii):
+        """
+        It returns the frequencies along the axis (ii) in the layout of
+        Fourier coefficients and the indicator of the support of projection.
+        """
+        N = self.N[ii]
+        M = self.M[ii]
+        if self.halfspec and ii == self.dim-1:
+            k = np.arange(M//2+1)
+            supp = k <= N//2
+        else:
+            if self.centered:
+                k = np.array(Grid.get_ZNl([M])[0])
+            else:
+                k = np.round(np.fft.fftfreq(M, 1./M))
+            supp = np.logical_and(k >= -(N//2), k <= (N-1)//2)
+        if self.NyqNul and N % 2 == 0:
+            supp = np.logical_and(supp, np.abs(k) != N/2)
+        return k, supp
+
+    def __call__(self, x):
+        if isinstance(x, VecTri):
+            if not x.Fourier:
+                raise ValueError("The projection acts on Fourier coefficients!")
+            if x.halfspec != self.halfspec or x.centered != self.centered:
+                raise ValueError("Mismatch in layout of Fourier coefficients!")
+            name = '%s*%s' % (self.name, x.name)
+            return VecTri(name=name, val=self.apply(x.val), Fourier=True,
+                          N=x.N, halfspec=x.halfspec, centered=x.centered)
+        else:
+            return self.apply(x)
+
+    def __mul__(self, x):
+        return self.__call__(x)
+
+    def mul_val(self, x, out=None):
+        """
+        It applies the operator on the values x of VecTri, see
+        Matrix.mul_val.
+        """
+        return self.apply(x, out=out)
+
+    def apply(self, x, out=None):
+        """
+        It applies the projection on an array of Fourier coefficients
+        of shape (d, ..., M); the result is stored in out if provided.
+        """
+        if self.physics == 'scalar':
+            Gx = self.apply_scalar(x, out=out)
+        else:
+            Gx = self.apply_elasticity(x, out=out)
+        if self.kind == 'G2':
+            np.subtract(self.mask*x, Gx, out=Gx)
+        return Gx
+
+    def apply_scalar(self, x, out=None):
+        xi = self.xi
+        s = xi[0]*x[0]
+        for ii in np.arange(1, self.dim):
+            s += xi[ii]*x[ii]
+        s *= self.weight
+        if out is None:
+            Gx = np.empty_like(x)
+        else:
+            Gx = out
+        for ii in np.arange(self.dim):
+            np.multiply(xi[ii], s, out=Gx[ii])
+        return Gx
+
+    def apply_elasticity(self, x, out=None):
+        xi = self.xi
+        d = self.dim
+        pairs = get_mandel_pairs(d)
+        # a = e*xi, where e is the strain in Mandel's notation
+        a = [0.]*d
+        for m, (ii, jj) in enumerate(pairs):
+            if ii == jj:
+                a[ii] = a[ii] + x[m]*xi[ii]
+            else:
+                a[ii] = a[ii] + x[m]*xi[jj]/2**.5
+                a[jj] = a[jj] + x[m]*xi[ii]/2**.5
+        q = xi[0]*a[0]
+        for ii in np.arange(1, d):
+            q += xi[ii]*a[ii]
+        q *= self.weight**2
+        for ii in np.arange(d):
+            a[ii] *= self.weight
+        if out is None:
+            Gx = np.empty_like(x)
+        else:
+            Gx = out
+        for m, (ii, jj) in enumerate(pairs):
+            if ii == jj:
+                Gx[m] = 2*xi[ii]*a[ii] - xi[ii]**2*q
+            else:
+                Gx[m] = 2**.5*(xi[ii]*a[jj] + xi[jj]*a[ii] - xi[ii]*xi[jj]*q)
+        return Gx
+
+    def enlarge(self, M):
+        """
+        It returns the projection acting on the Fourier coefficients of
+        M-sized grid, which is zero out of the original support N.
+        """
+        return ProjectionOperator(self.N, self.Y, physics=self.physics,
+                                  kind=self.kind, centered=self.centered,
+                                  halfspec=self.halfspec, NyqNul=self.NyqNul,
+                                  M=M, name=self.name)
+
+    def transpose(self):
+        return self
+
+    def astype(self, dtype):
+        """
+        It returns the operator with frequencies stored in the real data type
+        dtype, e.g. numpy.float32 for the products with complex64
+        coefficients.
+        """
+        oper = copy.copy(self)
+        oper.xi = [xi.astype(dtype) for xi in self.xi]
+        oper.weight = self.weight.astype(dtype)
+        return oper
+
+    def __repr__(self):
+        ss = "Class : %s\n" % (self.__class__.__name__,)
+        ss += '    name : %s\n' % self.name
+        ss += '    physics = %s ; kind = %s\n' % (self.physics, self.kind)
+        ss += '    size N = %s ; M = %s\n' % (str(self.N), str(self.M))
+        ss += '    centered = %s ; halfspec = %s\n' % (self.centered,
+                                                      self.halfspec)
+        return ss
+
+
+class GreenOperator(ProjectionOperator):
+    """
+    Matrix-free Green operator of a homogeneous reference medium with
+    coefficients A0, which is used as a preconditioner.
+
+    For compatible fields (kind='G1'), it is the operator
+    Gamma0(xi) = B(xi)*K(xi)^{-1}*B(xi)^T with the acoustic tensor
+    K(xi) = B(xi)^T*A0*B(xi), where B(xi)*v stores the symmetrized gradient
+    sym(v*xi^T) in Mandel's notation (elasticity) or v*xi (scalar problems);
+    it is the pseudo-inverse of G1*A0*G1 on compatible fields.
+    For equilibrated fields (kind='G2'), it is the operator
+    Delta0 = A0 - A0*Gamma0*A0, which is the pseudo-inverse of G2*A0^{-1}*G2.
+    For A0 = I, the operators coincide with the projections G1 and G2.
+
+    Parameters
+    ----------
+    A0 : numpy.ndarray of shape (d, d)
+        coefficients of reference medium (for kind='G2', it is the inverse
+        of the reference coefficients of the dual formulation)
+    others : see ProjectionOperator
+    """
+    def __init__(self, N, Y, A0, physics='scalar', kind='G1', centered=True,
+                 halfspec=False, NyqNul=True, M=None, name=None):
+        ProjectionOperator.__init__(self, N, Y, physics=physics, kind=kind,
+                                    centered=centered, halfspec=halfspec,
+                                    NyqNul=NyqNul, M=M, name=name)
+        if name is None:
+            self.name = 'hGreen%s' % kind
+        self.A0 = np.array(A0, dtype=np.float64)
+        if self.A0.shape != (self.d, self.d):
+            raise ValueError("Reference medium of shape %s is expected!"
+                             % str((self.d, self.d)))
+
+        # acoustic tensor K = B^T*A0*B and its inverse
+        if physics == 'scalar':
+            self.dk = 1
+        else:
+            self.dk = self.dim
+        shape = np.broadcast(*self.xi).shape
+        K = np.zeros(np.hstack([self.dk, self.dk, shape]))
+        for k in np.arange(self.dk):
+            v = np.zeros(np.hstack([self.dk, shape]))
+            v[k] = 1.
+            Bv = self.mul_B(v)
+            K[:, k] = self.mul_BT(np.einsum('ij,j...->i...', self.A0, Bv))
+        K[:, :, np.logical_not(self.mask)] = np.eye(self.dk)[:, :, np.newaxis]
+        if self.dk == 1:
+            Kinv = 1./K
+        else:
+            Kinv = np.linalg.inv(np.rollaxis(np.rollaxis(K, 0, K.ndim), 0,
+                                             K.ndim))
+            Kinv = np.rollaxis(np.rollaxis(Kinv, -1), -1)
+        self.Kinv = Kinv*self.mask
+
+    def mul_B(self, v):
+        """
+        It returns the symmetrized gradient B*v of shape (d, ..., M) for
+        v of shape (dk, ..., M).
+        """
+        xi = self.xi
+        shape = np.broadcast(v[0], *xi).shape
+        Bv = np.empty(np.hstack([self.d, shape]), dtype=v.dtype)
+        if self.physics == 'scalar':
+            for ii in np.arange(self.dim):
+                Bv[ii] = xi[ii]*v[0]
+        else:
+            for m, (ii, jj) in enumerate(get_mandel_pairs(self.dim)):
+                if ii == jj:
+                    Bv[m] = xi[ii]*v[ii]
+                else:
+                    Bv[m] = (xi[jj]*v[ii] + xi[ii]*v[jj])/2**.5
+        return Bv
+
+    def mul_BT(self, x):
+        """
+        It returns the divergence B^T*x of shape (dk, ..., M) for x of shape
+        (d, ..., M).
+        """
+        xi = self.xi
+        if self.physics == 'scalar':
+            s = xi[0]*x[0]
+            for ii in np.arange(1, self.dim):
+                s = s + xi[ii]*x[ii]
+            return s[np.newaxis]
+        else:
+            a = [0.]*self.dim
+            for m, (ii, jj) in enumerate(get_mandel_pairs(self.dim)):
+                if ii == jj:
+                    a[ii] = a[ii] + x[m]*xi[ii]
+                else:
+                    a[ii] = a[ii] + x[m]*xi[jj]/2**.5
+                    a[jj] = a[jj] + x[m]*xi[ii]/2**.5
+            return np.array(np.broadcast_arrays(*a))
+
+    def apply(self, x, out=None):
+        """
+        It applies the Green operator on an array of Fourier coefficients
+        of shape (d, ..., M); the result is stored in out if provided.
+        """
+        if self.kind == 'G1':
+            Gx = self.apply_gamma(x)
+        else:
+            A0x = np.einsum('ij,j...->i...', self.A0, x)
+            Gx = self.mask*(A0x - np.einsum('ij,j...->i...', self.A0,
+                                            self.apply_gamma(A0x)))
+        if out is None:
+            return Gx
+        out[...] = Gx
+        return out
+
+    def apply_gamma(self, x):
+        BTx = self.mul_BT(x)
+        if self.dk == 1:
+            z = self.Kinv[0]*BTx
+        else:
+            z = np.einsum('ij...,j...->i...', self.Kinv, BTx)
+        return self.mul_B(z)
+
+    def astype(self, dtype):
+        """
+        It returns the operator with frequencies, reference medium, and
+        inverse of acoustic tensor stored in the real data type dtype.
+        """
+        oper = ProjectionOperator.astype(self, dtype)
+        oper.A0 = self.A0.astype(dtype)
+        oper.Kinv = self.Kinv.astype(dtype)
+        return oper
+
+    def enlarge(self, M):
+        """
+        It returns the Green operator acting on the Fourier coefficients of
+        M-sized grid, which is zero out of the original support N.
+        """
+        return GreenOperator(self.N, self.Y, self.A0, physics=self.physics,
+                             kind=self.kind, centered=self.centered,
+                             halfspec=self.halfspec, NyqNul=self.NyqNul,
+                             M=M, name=self.name)
+
+
+def get_mandel_pairs(dim):
+    """
+    It returns the indices (ii, jj) of the strain components in Mandel's
+    notation, see mechanics.matcoef.ElasticTensor.create_mandel.
+    """
+    if dim == 2:
+        return [(0, 0), (1, 1), (0, 1)]
+    elif dim == 3:
+        return [(0, 0), (1, 1), (2, 2), (1, 2), (0, 2), (0, 1)]
+    else:
+        raise ValueError("Incorrect dimension (%d)" % dim)
+
 if __name__ == '__main__':
     execfile('../main_test.py')
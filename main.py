@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
-from homogenize.problem import Problem, import_file
+from homogenize.problem import calculate, import_file
+from general.parallel import parallel_map
 from optparse import OptionParser
 
 parser = OptionParser()
@@ -19,9 +20,22 @@ else:
 
 conf = import_file(input_file)
 
-for conf_problem in conf.problems:
-    prob = Problem(conf_problem, conf)
-    prob.calculate()
-    prob.postprocessing()
+# no. of processes for problems, which are calculated in parallel unless
+# the previous problem provides initial approximations (solve['x0'])
+processes = getattr(conf, 'processes', 1)
+independent = not any('x0' in conf_problem['solve']
+                      and conf_problem['solve']['x0'] == 'previous'
+                      for conf_problem in conf.problems)
+
+if processes > 1 and independent:
+    problems = parallel_map(calculate, range(len(conf.problems)),
+                            processes=processes, conf=conf)
+    for prob in problems:
+        prob.postprocessing()
+else:
+    prob = None
+    for ii in range(len(conf.problems)):
+        prob = calculate(ii, conf, previous=prob)
+        prob.postprocessing()
 
 print 'The calculation is finished!'